@@ -0,0 +1,80 @@
+"""Synthetic inventories for the benchmarks. An inventory of a size holds
+that many hosts and as many tunnels, inside of an app dir with the files
+of the stores and the alias lists of the completion. Every inventory is
+generated once per session and copied for every test that uses it.
+
+The sizes are taken from DSM_BENCH_SIZES, a comma separated list that is
+10,1000,100000 by default. Add 1000000 to measure a million hosts, which
+takes a few minutes.
+"""
+import os
+import pathlib
+import pickle
+import shutil
+from typing import Dict
+
+import pytest
+
+from damnsshmanager import completion
+from damnsshmanager import hosts
+from damnsshmanager import localtunnel as lt
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host, LocalTunnel
+from damnsshmanager.storage import PickleStore
+
+SIZES = [int(s) for s in
+         os.environ.get('DSM_BENCH_SIZES', '10,1000,100000').split(',')]
+
+# tunnels share a block of local ports, like tunnels of different projects
+# that are never served at once
+PORT_BLOCK = range(49152, 49152 + 256)
+
+_inventories: Dict[int, pathlib.Path] = {}
+
+
+def alias(i: int) -> str:
+    return f'host{i:07d}'
+
+
+def write_inventory(app_dir: pathlib.Path, size: int):
+    """Write the stores of an inventory with `size` hosts and tunnels."""
+    all_hosts = [Host(alias=alias(i), addr=f'10.{i >> 16 & 255}.'
+                      f'{i >> 8 & 255}.{i & 255}', username='damn', port=22,
+                      tags=('even' if i % 2 == 0 else 'odd', f'rack{i % 40}'))
+                 for i in range(size)]
+    tunnels = [LocalTunnel(gateway=alias(i), alias=f'tun{i:07d}',
+                           lport=PORT_BLOCK[i % len(PORT_BLOCK)],
+                           destination='localhost', rport=5432)
+               for i in range(size)]
+    with open(app_dir / 'hosts.pickle', 'wb') as f:
+        pickle.dump(all_hosts, f)
+    with open(app_dir / 'localtunnels.pickle', 'wb') as f:
+        pickle.dump(tunnels, f)
+    (app_dir / f'{completion.HOSTS}.aliases').write_text(
+        ''.join(f'{h.alias}\n' for h in all_hosts))
+    (app_dir / f'{completion.TUNNELS}.aliases').write_text(
+        ''.join(f'{t.alias}\n' for t in tunnels))
+
+
+@pytest.fixture
+def app_dir(tmp_path_factory, tmp_path, size) -> pathlib.Path:
+    """Copy of the inventory of `size`, which the test is parametrized
+    with."""
+    if size not in _inventories:
+        template = tmp_path_factory.mktemp(f'inventory-{size}')
+        write_inventory(template, size)
+        _inventories[size] = template
+    app_dir = tmp_path / 'app'
+    shutil.copytree(_inventories[size], app_dir)
+    return app_dir
+
+
+@pytest.fixture
+def stores(app_dir, monkeypatch):
+    """Use the inventory for the stores of hosts and tunnels."""
+    monkeypatch.setattr(Config, '_app_dir', str(app_dir))
+    monkeypatch.setattr(hosts, '_store', hosts._create_store(
+        app_dir / 'hosts.pickle'))
+    monkeypatch.setattr(lt, '_store', PickleStore(
+        app_dir / 'localtunnels.pickle'))
+    return app_dir
@@ -0,0 +1,145 @@
+"""Commands of the cli on synthetic inventories, see `conftest.py` for
+their sizes: rendering of `dsm list` into /dev/null in process, `dsm check`
+against ports that accept connections and ports that drop them, and the
+wall time of `dsm` subcommands in a fresh interpreter, with and without a
+running catalog daemon. Compare the sizes with
+
+    pytest benchmarks/test_cli.py --benchmark-group-by=group,param:size
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+from loguru import logger
+
+from damnsshmanager import catalog, cli, hosts
+from damnsshmanager.model import Host
+
+from benchmarks.conftest import SIZES, alias
+
+# hosts that are checked, every blackholed host costs the timeout
+CHECK_SIZE = 10
+
+COMMANDS = {
+    'list': ['list'],
+    'list-ltun': ['list', '-t', 'ltun'],
+    'list-tag': ['list', '-T', 'rack0'],
+    'list-sorted': ['list', '-s', 'addr', '-f', 'host00*'],
+    'complete': ['--complete', '2', 'dsm', 'c', 'host00'],
+}
+
+
+@pytest.fixture
+def devnull_logger():
+    """Render the log messages of `dsm check` into /dev/null, so their
+    formatting is measured. `dsm list` prints its table to stdout."""
+    with open(os.devnull, 'w') as devnull:
+        handler = logger.add(devnull, format='{message}', level='INFO')
+        yield
+        logger.remove(handler)
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('type_', ['host', 'ltun'])
+@pytest.mark.benchmark(group='cli-list')
+def test_list(benchmark, stores, monkeypatch, size, type_):
+    args = argparse.Namespace(type=type_, tag=None, filter=None, sort=None,
+                              reverse=False, pager=False)
+    with open(os.devnull, 'w') as devnull:
+        monkeypatch.setattr(sys, 'stdout', devnull)
+        benchmark.pedantic(cli.list_objects, args=(args,), rounds=3)
+
+
+@pytest.fixture
+def listening():
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen(CHECK_SIZE)
+        yield server.getsockname()[1]
+
+
+@pytest.fixture
+def blackholed():
+    """A port whose backlog is full, so further connections are dropped
+    instead of refused, like behind a firewall."""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(0)
+    port = server.getsockname()[1]
+    fillers = []
+    while True:
+        conn = socket.socket()
+        conn.settimeout(0.2)
+        fillers.append(conn)
+        try:
+            conn.connect(('127.0.0.1', port))
+        except socket.timeout:
+            break
+    yield port
+    for conn in fillers:
+        conn.close()
+    server.close()
+
+
+@pytest.mark.parametrize('target', ['listening', 'blackholed'])
+@pytest.mark.benchmark(group='cli-check')
+def test_check_hosts(benchmark, request, tmp_path, devnull_logger,
+                     monkeypatch, target):
+    port = request.getfixturevalue(target)
+    store = hosts._create_store(tmp_path / 'hosts.pickle')
+    monkeypatch.setattr(hosts, '_store', store)
+    for i in range(CHECK_SIZE):
+        store.add(Host(alias=alias(i), addr='127.0.0.1', username='damn',
+                       port=port))
+    args = argparse.Namespace(tag=None)
+    benchmark.pedantic(cli.check_hosts, args=(args,), rounds=1)
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('command', list(COMMANDS))
+@pytest.mark.benchmark(group='cli-wall-time')
+def test_wall_time(benchmark, app_dir, size, command):
+    env = dict(os.environ, DSM_APP_DIR=str(app_dir))
+    argv = [sys.executable, '-m', 'damnsshmanager'] + COMMANDS[command]
+    benchmark.pedantic(subprocess.run, args=(argv,),
+                       kwargs=dict(env=env, capture_output=True, check=True),
+                       rounds=3)
+
+
+@pytest.fixture
+def daemon(app_dir):
+    """`dsm daemon` serving the inventory of `app_dir`."""
+    env = dict(os.environ, DSM_APP_DIR=str(app_dir))
+    process = subprocess.Popen([sys.executable, '-m', 'damnsshmanager',
+                                'daemon'], env=env,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    path = app_dir / catalog.SOCKET_NAME
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            catalog.query('ping', path=path)
+            break
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                pytest.fail('dsm daemon did not start')
+            time.sleep(0.05)
+    yield env
+    process.terminate()
+    process.wait()
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('command', [c for c in COMMANDS
+                                     if c != 'complete'])
+@pytest.mark.benchmark(group='cli-wall-time-daemon')
+def test_wall_time_daemon(benchmark, daemon, size, command):
+    argv = [sys.executable, '-m', 'damnsshmanager'] + COMMANDS[command]
+    benchmark.pedantic(subprocess.run, args=(argv,),
+                       kwargs=dict(env=daemon, capture_output=True,
+                                   check=True),
+                       rounds=3)
@@ -0,0 +1,67 @@
+"""Round trip of a keystroke through an echoing peer, as done by the
+interactive loop of `PosixChannel`, with and without recording the
+echoed output. Compare both with
+
+    pytest benchmarks/test_recorder.py --benchmark-group-by=group
+"""
+import os
+import socket
+import threading
+
+import pytest
+
+from damnsshmanager.recorder import SessionRecorder
+from damnsshmanager.ssh.paramiko import IO_BUFFER_SIZE, write_fully
+
+
+@pytest.fixture
+def echo():
+    local, remote = socket.socketpair()
+
+    def serve():
+        with remote:
+            while True:
+                data = remote.recv(IO_BUFFER_SIZE)
+                if not data:
+                    break
+                remote.sendall(data)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    with local:
+        yield local
+    thread.join()
+
+
+@pytest.fixture
+def devnull():
+    fd = os.open(os.devnull, os.O_WRONLY)
+    yield fd
+    os.close(fd)
+
+
+def roundtrip(sock, out_fd, recorder=None):
+    sock.sendall(b'x')
+    data = sock.recv(IO_BUFFER_SIZE)
+    write_fully(out_fd, data)
+    if recorder is not None:
+        recorder.output(data)
+
+
+@pytest.mark.benchmark(group='keystroke-roundtrip')
+def test_roundtrip(benchmark, echo, devnull):
+    benchmark(roundtrip, echo, devnull)
+
+
+@pytest.mark.benchmark(group='keystroke-roundtrip')
+def test_roundtrip_recorded(benchmark, echo, devnull, tmp_path):
+    with SessionRecorder(tmp_path / 'bench.cast.gz') as recorder:
+        benchmark(roundtrip, echo, devnull, recorder)
+    assert not recorder.dropped
+
+
+@pytest.mark.benchmark(group='recorder')
+def test_output(benchmark, tmp_path):
+    with SessionRecorder(tmp_path / 'bench.cast.gz',
+                         capacity=1 << 20) as recorder:
+        benchmark(recorder.output, b'x' * 64)
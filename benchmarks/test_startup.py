@@ -0,0 +1,97 @@
+"""Startup time of the `dsm` entry point per subcommand, measured as wall
+time of a fresh interpreter, and the cumulative import time of the cli
+as reported by `python -X importtime`. Every run uses an empty
+configuration directory. Shell completion is measured against an alias
+list of 10000 hosts.
+
+A run fails if the mean wall time of a subcommand exceeds the budget
+(DSM_STARTUP_BUDGET_MS, 1000 by default) or if a command that does not
+connect to a host imports paramiko.
+
+    pytest benchmarks/test_startup.py
+"""
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from damnsshmanager import completion
+
+BUDGET = int(os.environ.get('DSM_STARTUP_BUDGET_MS', '1000')) / 1000
+HEAVY_MODULES = ('paramiko', 'cryptography')
+
+# runs main and prints the heavy modules that were imported to stderr
+RUN_CLI = ('import sys; sys.argv = ["dsm"] + sys.argv[1:]\n'
+           'from damnsshmanager.cli import main\n'
+           'try:\n'
+           '    main()\n'
+           'except SystemExit:\n'
+           '    pass\n'
+           'print("heavy:", *[m for m in {heavy!r} if m in sys.modules],'
+           ' file=sys.stderr)\n').format(heavy=HEAVY_MODULES)
+
+COMMANDS = {
+    'help': ['--help'],
+    'list': ['list'],
+    'list-ltun': ['list', '-t', 'ltun'],
+    'add': ['add', 'bench', '127.0.0.1'],
+    'tag': ['tag', 'bench', 'db'],
+    'del': ['del', 'bench'],
+}
+
+
+@pytest.fixture
+def env(tmp_path):
+    return dict(os.environ, XDG_CONFIG_HOME=str(tmp_path))
+
+
+def run(env, args) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, '-c', RUN_CLI] + args, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+@pytest.mark.parametrize('command', list(COMMANDS))
+@pytest.mark.benchmark(group='startup')
+def test_startup(benchmark, env, command):
+    result = benchmark.pedantic(run, args=(env, COMMANDS[command]),
+                                rounds=5)
+    heavy = result.stderr.splitlines()[-1].split()[1:]
+    assert not heavy, f'{command} imported {heavy}'
+    assert benchmark.stats.stats.mean < BUDGET
+
+
+@pytest.mark.benchmark(group='importtime')
+def test_importtime(benchmark, env):
+    def importtime() -> int:
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             'import damnsshmanager.cli'],
+            env=env, capture_output=True, text=True, check=True)
+        times = {}
+        for line in result.stderr.splitlines():
+            match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)',
+                             line)
+            if match:
+                times[match.group(2)] = int(match.group(1))
+        return times['damnsshmanager.cli']
+
+    cumulative = benchmark.pedantic(importtime, rounds=5)
+    benchmark.extra_info['cumulative_us'] = cumulative
+
+
+@pytest.mark.benchmark(group='startup')
+def test_complete(benchmark, tmp_path):
+    tmp_path.joinpath(f'{completion.HOSTS}.aliases').write_text(
+        ''.join(f'host{i}\n' for i in range(10000)))
+    tmp_path.joinpath(f'{completion.TUNNELS}.aliases').write_text('')
+    env = dict(os.environ, DSM_APP_DIR=str(tmp_path))
+    argv = [sys.executable, '-m', 'damnsshmanager', '--complete', '2',
+            'dsm', 'c', 'host99']
+    result = benchmark.pedantic(subprocess.run, args=(argv,),
+                                kwargs=dict(env=env, capture_output=True,
+                                            text=True, check=True),
+                                rounds=5)
+    assert len(result.stdout.split()) == 111
+    assert benchmark.stats.stats.mean < BUDGET
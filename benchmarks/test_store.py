@@ -0,0 +1,88 @@
+"""Operations of the stores on synthetic inventories, see `conftest.py`
+for their sizes. Compare the sizes of an operation with
+
+    pytest benchmarks/test_store.py --benchmark-group-by=group,param:size
+"""
+import itertools
+import shutil
+
+import pytest
+
+from damnsshmanager import hosts
+from damnsshmanager import localtunnel as lt
+from damnsshmanager.model import Host
+
+from benchmarks.conftest import SIZES, alias
+
+pytestmark = pytest.mark.parametrize('size', SIZES)
+
+
+def restore(stores, name):
+    """Return a setup function of `benchmark.pedantic`, that resets a
+    store file to the inventory, so every round works on the same size."""
+    original = stores.parent / f'{name}.orig'
+    shutil.copyfile(stores / name, original)
+    return lambda: shutil.copyfile(original, stores / name) and None
+
+
+@pytest.mark.benchmark(group='store-get')
+def test_get(benchmark, stores, size):
+    store = hosts._store
+    result = benchmark(lambda: list(store.get()))
+    assert len(result) == size
+
+
+@pytest.mark.benchmark(group='store-unique')
+def test_unique(benchmark, stores, size):
+    store = hosts._store
+    last = alias(size - 1)
+    result = benchmark(store.unique, key=lambda h: h.alias == last)
+    assert result.alias == last
+
+
+@pytest.mark.benchmark(group='store-add')
+def test_add(benchmark, stores, size):
+    store = hosts._store
+    counter = itertools.count()
+
+    def add():
+        store.add(Host(alias=f'new{next(counter)}', addr='127.0.0.1',
+                       username='damn', port=22), sort=lambda h: h.alias)
+
+    benchmark.pedantic(add, setup=restore(stores, 'hosts.pickle'), rounds=5)
+
+
+@pytest.mark.benchmark(group='store-delete')
+def test_delete(benchmark, stores, size):
+    store = hosts._store
+    first = alias(0)
+    deleted = benchmark.pedantic(store.delete,
+                                 args=(lambda h: h.alias == first,),
+                                 setup=restore(stores, 'hosts.pickle'),
+                                 rounds=5)
+    assert [h.alias for h in deleted] == [first]
+
+
+@pytest.mark.benchmark(group='hosts-get-host')
+def test_get_host(benchmark, stores, size):
+    middle = alias(size // 2)
+    assert benchmark(hosts.get_host, middle).alias == middle
+
+
+@pytest.mark.benchmark(group='hosts-by-tags')
+def test_get_hosts_by_tags(benchmark, stores, size):
+    result = benchmark(hosts.get_hosts_by_tags, ['even', 'rack0'])
+    assert len(result) == (size + 39) // 40
+
+
+@pytest.mark.benchmark(group='localtunnel-add')
+def test_localtunnel_add(benchmark, stores, size):
+    """Adds a tunnel without a local port, so a free one is searched."""
+    counter = itertools.count()
+
+    def add():
+        lt.add(gateway=alias(0), alias=f'new{next(counter)}',
+               remote_port=80, destination='localhost')
+
+    benchmark.pedantic(add, setup=restore(stores, 'localtunnels.pickle'),
+                       rounds=5)
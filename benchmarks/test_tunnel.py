@@ -0,0 +1,157 @@
+"""Throughput of a forwarded connection over a link with latency, with the
+default transport settings of paramiko and with a tuned transport
+profile. The ssh server runs in process behind a proxy that delays every
+chunk by half the round trip time (DSM_BENCH_RTT_MS, 50 by default).
+Compare both with
+
+    pytest benchmarks/test_tunnel.py --benchmark-group-by=group
+"""
+import os
+import queue
+import socket
+import threading
+import time
+
+import paramiko
+import pytest
+
+from damnsshmanager.model import Host, TransportProfile
+from damnsshmanager.ssh.forward import pipe
+from damnsshmanager.ssh.paramiko import connect_client
+
+PAYLOAD_SIZE = 16 * 1024 * 1024
+RTT = int(os.environ.get('DSM_BENCH_RTT_MS', '50')) / 1000
+
+PROFILES = {
+    'default': None,
+    'tuned': TransportProfile(ciphers=('aes128-ctr',),
+                              macs=('hmac-sha2-256',),
+                              window_size=32 * 1024 * 1024,
+                              max_packet_size=256 * 1024),
+}
+
+
+def listen() -> socket.socket:
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    return server
+
+
+def serve(server: socket.socket, handle):
+    def loop():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                break
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def send_payload(conn: socket.socket):
+    chunk = b'x' * 65536
+    with conn:
+        for _ in range(PAYLOAD_SIZE // len(chunk)):
+            conn.sendall(chunk)
+
+
+def delayed_copy(src: socket.socket, dst: socket.socket, delay: float):
+    chunks: 'queue.Queue' = queue.Queue()
+
+    def send():
+        while True:
+            due, data = chunks.get()
+            time.sleep(max(0.0, due - time.monotonic()))
+            if not data:
+                dst.shutdown(socket.SHUT_WR)
+                break
+            dst.sendall(data)
+
+    threading.Thread(target=send, daemon=True).start()
+    while True:
+        try:
+            data = src.recv(65536)
+        except OSError:
+            data = b''
+        chunks.put((time.monotonic() + delay, data))
+        if not data:
+            break
+
+
+class Server(paramiko.ServerInterface):
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        return paramiko.OPEN_SUCCEEDED
+
+
+@pytest.fixture(scope='module')
+def link():
+    """Start the payload source, the ssh server and the delaying proxy.
+    Returns the address of the proxy and of the source."""
+    host_key = paramiko.RSAKey.generate(2048)
+    source, sshd, proxy = listen(), listen(), listen()
+
+    def handle_ssh(conn):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(host_key)
+        transport.start_server(server=Server())
+        while transport.is_active():
+            chan = transport.accept(timeout=1)
+            if chan is None:
+                continue
+            dest = socket.create_connection(source.getsockname())
+
+            def forward(chan=chan, dest=dest):
+                with dest, chan:
+                    pipe(dest, chan)
+            threading.Thread(target=forward, daemon=True).start()
+
+    def handle_proxy(conn):
+        upstream = socket.create_connection(sshd.getsockname())
+        threading.Thread(target=delayed_copy,
+                         args=(upstream, conn, RTT / 2),
+                         daemon=True).start()
+        delayed_copy(conn, upstream, RTT / 2)
+
+    serve(source, send_payload)
+    serve(sshd, handle_ssh)
+    serve(proxy, handle_proxy)
+    yield proxy.getsockname(), source.getsockname()
+    for server in (source, sshd, proxy):
+        server.close()
+
+
+def download(client: paramiko.SSHClient, source) -> int:
+    chan = client.get_transport().open_channel('direct-tcpip', source,
+                                               ('127.0.0.1', 0))
+    received = 0
+    with chan:
+        while True:
+            data = chan.recv(1024 * 1024)
+            if not data:
+                break
+            received += len(data)
+    return received
+
+
+@pytest.mark.parametrize('profile', list(PROFILES))
+@pytest.mark.benchmark(group='tunnel-throughput')
+def test_tunnel_throughput(benchmark, link, profile, tmp_path):
+    (addr, port), source = link
+    host = Host(alias='bench', addr=addr, username='damn', port=port,
+                transport=PROFILES[profile])
+    client = connect_client(host, pkey=paramiko.RSAKey.generate(2048),
+                            known_hosts_path=str(tmp_path / 'known_hosts'))
+    with client:
+        received = benchmark.pedantic(download, args=(client, source),
+                                      rounds=3)
+    assert received == PAYLOAD_SIZE
+    benchmark.extra_info['MiB/s'] = round(
+        PAYLOAD_SIZE / benchmark.stats.stats.mean / 2 ** 20, 1)
@@ -0,0 +1,17 @@
+"""Entry point of `dsm`. Shell completion is answered before the cli and
+its dependencies are imported, see `damnsshmanager.completion`.
+"""
+import sys
+
+
+def main():
+    if sys.argv[1:2] == ['--complete']:
+        from damnsshmanager import completion
+        sys.exit(completion.main(sys.argv[2:]))
+
+    from damnsshmanager import cli
+    cli.main()
+
+
+if __name__ == '__main__':
+    main()
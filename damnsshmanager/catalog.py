@@ -0,0 +1,384 @@
+"""This module keeps the hosts and tunnels decoded in the memory of a
+resident daemon, that answers lookups of `dsm` over a Unix socket in the
+app dir. Commands that only read the stores, like `dsm list` or the search
+of `dsm exec`, ask the daemon first and read the stores themselves if it is
+not running, so they do not decode large stores on every run.
+
+The daemon stats both stores before every request and reads a store again
+once its modification time or size changed, so changes made by other
+commands are seen by the next request.
+
+Every message is a frame of its length as 4 bytes in network byte order
+followed by the payload. Requests are JSON arrays of an operation and its
+arguments, like `["search", "web*", ["prod"]]`, so the daemon never
+unpickles what it receives. Replies are pickled `(ok, value)` tuples. The
+socket is only accessible by its owner.
+
+Sample usage:
+```
+server = catalog.CatalogServer()
+server.serve_forever()
+
+# in another process, raises an OSError if no daemon is running
+lines = catalog.query('list', 'host', ['prod'], 'web*', None, False)
+```
+"""
+import errno
+import json
+import os
+import pathlib
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from damnsshmanager import hosts, table
+from damnsshmanager import localtunnel as lt
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host, LocalTunnel
+
+SOCKET_NAME = 'catalog.sock'
+
+# seconds a client waits for the daemon
+TIMEOUT = 2.0
+
+# bytes of the largest request, requests of dsm are far smaller
+MAX_REQUEST = 64 * 1024
+
+_HEADER = struct.Struct('!I')
+
+_msg = Config.messages
+
+
+def socket_path() -> pathlib.Path:
+    return pathlib.Path(Config.app_dir, SOCKET_NAME)
+
+
+def _send(sock: socket.socket, payload: bytes):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _read(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+
+def _receive(sock: socket.socket,
+             limit: Optional[int] = None) -> Optional[bytes]:
+    """Return the payload of the next frame.
+
+    Raises:
+        ConnectionError: if the frame is incomplete or larger than `limit`
+
+    Returns:
+        Optional[bytes]: None if the connection was closed before a frame
+    """
+    header = _read(sock, _HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        raise ConnectionError(errno.EPROTO, 'incomplete frame')
+    size, = _HEADER.unpack(header)
+    if limit is not None and size > limit:
+        raise ConnectionError(errno.EMSGSIZE, 'frame too large')
+    payload = _read(sock, size)
+    if len(payload) < size:
+        raise ConnectionError(errno.EPROTO, 'incomplete frame')
+    return payload
+
+
+def query(operation: str, *args, path: Optional[pathlib.Path] = None,
+          timeout: float = TIMEOUT) -> Any:
+    """Send one request to the daemon and return its answer.
+
+    Args:
+        operation (str): one of the operations of `Catalog.answer`
+        args: arguments of the operation, must be serializable as JSON
+        path (Optional[pathlib.Path]): socket, `socket_path()` by default
+        timeout (float): seconds to wait for the daemon
+
+    Raises:
+        OSError: if no daemon is running or it did not answer
+        KeyError: if the daemon could not answer the request
+
+    Returns:
+        Any: the answer of the operation
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path or socket_path()))
+        _send(sock, json.dumps([operation, *args]).encode())
+        payload = _receive(sock)
+    if payload is None:
+        raise ConnectionError(errno.ECONNRESET, 'no answer of the daemon')
+    try:
+        ok, value = pickle.loads(payload)
+    except (pickle.UnpicklingError, AttributeError, TypeError, ValueError):
+        # a daemon of another version, the stores are read instead
+        raise ConnectionError(errno.EPROTO, 'invalid answer of the daemon')
+    if not ok:
+        raise KeyError(value)
+    return value
+
+
+# modification time and size of a store
+Fingerprint = Optional[Tuple[int, int]]
+
+
+class Catalog:
+    """Hosts and tunnels of the stores, that are decoded once and read
+    again when a store changed.
+
+    Arguments:
+        hosts_file (Optional[pathlib.Path]): store of the hosts, the one of
+        `hosts` by default
+        tunnels_file (Optional[pathlib.Path]): store of the tunnels, the one
+        of `localtunnel` by default
+    """
+
+    def __init__(self, hosts_file: Optional[pathlib.Path] = None,
+                 tunnels_file: Optional[pathlib.Path] = None):
+        self.hosts_file = hosts_file or hosts.store_file()
+        self.tunnels_file = tunnels_file or lt.store_file()
+        self.hosts: List[Host] = []
+        self.tunnels: List[LocalTunnel] = []
+        self._hosts_by_alias: Dict[str, Host] = {}
+        self._tunnels_by_alias: Dict[str, LocalTunnel] = {}
+        self._tags: Dict[str, Set[str]] = {}
+        self._fingerprints: Dict[pathlib.Path, Fingerprint] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path: pathlib.Path) -> Optional[list]:
+        """Return the objects of a store, None if it did not change or could
+        not be read. A store that is being written is read by the next
+        request."""
+        try:
+            info = os.stat(path)
+            current: Fingerprint = (info.st_mtime_ns, info.st_size)
+        except FileNotFoundError:
+            current = None
+        if path in self._fingerprints and \
+                self._fingerprints[path] == current:
+            return None
+        objs: list = []
+        if current is not None:
+            try:
+                with open(path, 'rb') as f:
+                    objs = list(pickle.load(f) or [])
+            except (OSError, EOFError, pickle.UnpicklingError):
+                return None
+        self._fingerprints[path] = current
+        return objs
+
+    def refresh(self) -> bool:
+        """Read the stores that changed since they were read last.
+
+        Returns:
+            bool: True if any store was read
+        """
+        all_hosts = self._load(self.hosts_file)
+        if all_hosts is not None:
+            tags: Dict[str, Set[str]] = {}
+            for host in all_hosts:
+                for tag in host.tags:
+                    tags.setdefault(tag, set()).add(host.alias)
+            self.hosts = all_hosts
+            self._hosts_by_alias = {h.alias: h for h in all_hosts}
+            self._tags = tags
+        tunnels = self._load(self.tunnels_file)
+        if tunnels is not None:
+            self.tunnels = tunnels
+            self._tunnels_by_alias = {t.alias: t for t in tunnels}
+        return all_hosts is not None or tunnels is not None
+
+    def host(self, alias: str) -> Optional[Host]:
+        return self._hosts_by_alias.get(alias)
+
+    def tunnel(self, alias: str) -> Optional[LocalTunnel]:
+        return self._tunnels_by_alias.get(alias)
+
+    def search(self, pattern: Optional[str] = None,
+               tags: Sequence[str] = ()) -> List[Host]:
+        """Return the hosts whose alias matches a shell style pattern and
+        that are tagged with every given tag, in the order of the store."""
+        rows = self.hosts
+        if tags:
+            aliases = set.intersection(*(self._tags.get(t, set())
+                                         for t in tags))
+            rows = [h for h in rows if h.alias in aliases]
+        return table.select(rows, pattern)
+
+    def jump_chain(self, alias: str) -> List[Host]:
+        """Return the jump hosts of a host, see `hosts.get_jump_chain`.
+
+        Raises:
+            KeyError: if the host or one of its jump hosts does not exist
+        """
+        host = self.host(alias)
+        if host is None:
+            raise KeyError(_msg.get('err.msg.no.host.alias', alias))
+        return hosts.get_jump_chain(host, lookup=self.host)
+
+    def list(self, kind: str = 'host', tags: Sequence[str] = (),
+             pattern: Optional[str] = None, sort: Optional[str] = None,
+             reverse: bool = False) -> List[str]:
+        """Return the lines of the table of `dsm list`.
+
+        Args:
+            kind (str): `host` or `ltun`
+            tags (Sequence[str]): tags every host must have
+            pattern (Optional[str]): shell style pattern of the aliases
+            sort (Optional[str]): field the rows are sorted by
+            reverse (bool): sort descending, or reverse the order
+
+        Raises:
+            KeyError: if the rows have no field `sort`
+        """
+        if kind == 'ltun':
+            columns, rows = table.TUNNEL_COLUMNS, self.tunnels
+        else:
+            columns, rows = table.HOST_COLUMNS, self.search(tags=tags)
+        fields = [c.field for c in columns]
+        if sort and sort not in fields:
+            raise KeyError(_msg.get('err.msg.sort.column', sort,
+                                     ', '.join(fields)))
+        return table.render(columns, table.select(rows, pattern, sort,
+                                                  reverse))
+
+    def answer(self, request) -> Tuple[bool, Any]:
+        """Answer a decoded request after reading the stores that changed.
+
+        Args:
+            request: list of the operation and its arguments
+
+        Returns:
+            Tuple[bool, Any]: True and the answer, or False and the reason
+            the request failed
+        """
+        operations = {
+            'ping': os.getpid, 'host': self.host, 'tunnel': self.tunnel,
+            'search': self.search, 'jump': self.jump_chain, 'list': self.list,
+        }
+        if not isinstance(request, list) or not request or \
+                request[0] not in operations:
+            return False, _msg.get('err.msg.catalog.request', request)
+        with self._lock:
+            try:
+                self.refresh()
+                return True, operations[request[0]](*request[1:])
+            except KeyError as err:
+                return False, err.args[0] if err.args else str(err)
+            except (AttributeError, TypeError, ValueError):
+                return False, _msg.get('err.msg.catalog.request', request)
+
+
+class CatalogServer:
+    """Daemon that answers the requests of `query` from a `Catalog`. A
+    socket left by a daemon that died is replaced.
+
+    Arguments:
+        path (Optional[pathlib.Path]): socket, `socket_path()` by default
+        catalog (Optional[Catalog]): answers the requests, the catalog of
+        the stores of the app dir by default
+
+    Raises:
+        OSError: if another daemon answers on the socket or it could not be
+        bound
+    """
+
+    def __init__(self, path: Optional[pathlib.Path] = None,
+                 catalog: Optional[Catalog] = None):
+        self.path = path or socket_path()
+        self.catalog = catalog or Catalog()
+        self._closed = threading.Event()
+        self._serving = False
+        self._remove_stale()
+        umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(
+                str(self.path), self._handler_class())
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+
+    def _remove_stale(self):
+        try:
+            query('ping', path=self.path)
+        except OSError:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        raise OSError(errno.EADDRINUSE, os.strerror(errno.EADDRINUSE),
+                      str(self.path))
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+
+            def handle(self):
+                # a client may send any number of requests
+                while True:
+                    try:
+                        payload = _receive(self.request, limit=MAX_REQUEST)
+                    except OSError:
+                        return
+                    if payload is None:
+                        return
+                    try:
+                        request = json.loads(payload)
+                    except ValueError:
+                        request = None
+                    if request == ['stop']:
+                        self.reply((True, None))
+                        threading.Thread(target=server.close).start()
+                        return
+                    self.reply(server.catalog.answer(request))
+
+            def reply(self, answer: Tuple[bool, Any]):
+                try:
+                    _send(self.request,
+                          pickle.dumps(answer, pickle.HIGHEST_PROTOCOL))
+                except OSError:
+                    pass
+
+        return Handler
+
+    def serve_forever(self):
+        """Answer requests until `close` is called or a client sends
+        `stop`. The socket is removed afterwards."""
+        self._serving = True
+        try:
+            if not self._closed.is_set():
+                self._server.serve_forever()
+        finally:
+            # also after an interrupt, `close` has nothing left to stop
+            self._closed.set()
+            self._server.server_close()
+            self._unlink()
+
+    def close(self):
+        """Stop `serve_forever`, or remove the socket if it never ran."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._serving:
+            self._server.shutdown()
+        else:
+            self._server.server_close()
+            self._unlink()
+
+    def _unlink(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
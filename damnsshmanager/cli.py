@@ -1,15 +1,24 @@
 import argparse
+import pathlib
+import shlex
 import sys
-from typing import Optional
+import time
+from typing import TYPE_CHECKING, List, Optional
 
 from loguru import logger
 
-from damnsshmanager import hosts
+from damnsshmanager import catalog, completion, hosts
 from damnsshmanager import localtunnel as lt
+from damnsshmanager import inventory, profiling, table, timings
 from damnsshmanager.config import Config
 from damnsshmanager.connect import connector_strategy_types, open_shell
 from damnsshmanager.ssh.provider import create_channel, provider
-from damnsshmanager.ssh.test import test_connection
+
+if TYPE_CHECKING:
+    from damnsshmanager.ssh import execute, transfer
+
+# modules of damnsshmanager.ssh that depend on paramiko are imported inside
+# of the commands that use them, to keep the startup of all others fast
 
 __msg = Config.messages
 
@@ -52,54 +61,340 @@ def delete(args):
         mod.delete(args.alias)
 
 
-def check_hosts():
-    objs = hosts.get_all_hosts()
-    if objs is None:
+def check_hosts(args=None):
+    from damnsshmanager import metrics
+
+    tags = getattr(args, 'tag', None)
+
+    def find_hosts():
+        return hosts.get_hosts_by_tags(tags) if tags else \
+            hosts.get_all_hosts()
+
+    metrics_file = getattr(args, 'metrics_file', None)
+    if getattr(args, 'listen', None):
+        __serve_metrics(find_hosts, args.listen, args.interval, metrics_file)
+        return
+
+    objs = find_hosts()
+    if not objs:
         logger.error(__msg.get('no.hosts'))
         return
 
     __log_heading(__msg.get('available.hosts'))
-    for obj in objs:
-        try:
-            test_connection(obj)
-            __log_host_info(obj, __msg.get('up'),
+    results = metrics.check(objs)
+    for result in results:
+        if result.up:
+            __log_host_info(result.host, __msg.get('up'),
                             status_color='\x1b[6;30;42m')
-        except OSError:
-            __log_host_info(obj, __msg.get('down'),
+        else:
+            __log_host_info(result.host, __msg.get('down'),
                             status_color='\x1b[0;30;41m')
+    if metrics_file:
+        try:
+            metrics.write(results, metrics_file)
+            logger.info(__msg.get('metrics.saved', metrics_file))
+        except OSError:
+            logger.error(__msg.get('err.msg.dump.error', metrics_file))
+
+
+def __serve_metrics(find_hosts, listen, interval: float,
+                    metrics_file: Optional[str]):
+    from damnsshmanager import metrics
+
+    def log_results(results):
+        up = sum(1 for r in results if r.up)
+        logger.info(__msg.get('metrics.checked', up, len(results)))
+
+    bind_addr, port = listen
+    try:
+        server = metrics.MetricsServer(find_hosts, bind_addr=bind_addr,
+                                       port=port, interval=interval,
+                                       metrics_file=metrics_file)
+    except OSError as err:
+        logger.error(__msg.get('err.msg.listen', f'{bind_addr}:{port}', err))
+        return
+    host, port = server.address[:2]
+    logger.info(__msg.get('metrics.serving', f'http://{host}:{port}/metrics'))
+    try:
+        server.serve_forever(on_refresh=log_results)
+    except KeyboardInterrupt:
+        logger.info(__msg.get('err.msg.interrupted'))
+    finally:
+        server.close()
 
 
 def open_connection(args):
     _type = args.type
+    kwargs = {}
+    if args.record:
+        if args.provider != 'application':
+            logger.error(__msg.get('err.msg.record.provider', 'application'))
+            return
+        kwargs['record'] = True
+    if args.exec:
+        if args.provider != 'system':
+            logger.error(__msg.get('err.msg.exec.provider', 'system'))
+            return
+        if args.timings:
+            logger.error(__msg.get('err.msg.exec.timings'))
+            return
+        kwargs['replace'] = True
+    if args.timings:
+        timings.start(args.alias, args.provider)
     try:
-        channel = create_channel(args.provider)
+        channel = create_channel(args.provider, **kwargs)
         open_shell(channel, args.alias, _type)
     except KeyboardInterrupt:
         logger.info(__msg.get('err.msg.interrupted'))
+    finally:
+        result = timings.stop()
+        if result is not None and result.phases:
+            __log_timings(result)
+
+
+def tag_host(args):
+    hosts.tag(args.alias, args.tags, remove=args.remove)
+
+
+def tune_host(args):
+    settings = vars(args)
+    try:
+        hosts.tune(settings.pop('alias'), reset=settings.pop('reset'),
+                   **settings)
+    except KeyError as err:
+        logger.error(err)
+
+
+def manage_sources(args):
+    if args.name is None:
+        sources = inventory.get_all_sources()
+        if not sources:
+            logger.info(__msg.get('no.sources'))
+            return
+        table.show(table.render(table.SOURCE_COLUMNS, sources))
+    elif args.remove:
+        inventory.delete(args.name)
+    else:
+        try:
+            inventory.add(name=args.name, location=args.location,
+                          kind='command' if args.command else 'file',
+                          ttl=args.ttl)
+        except KeyError as err:
+            logger.error(err)
+            return
+        sync_sources(argparse.Namespace(name=[args.name], force=True))
+
+
+def sync_sources(args):
+    for source, result in inventory.sync_all(args.name, force=args.force):
+        if result is None:
+            logger.info(__msg.get('source.up.to.date', source.name))
+            continue
+        logger.info(__msg.get('synced.source', source.name,
+                              len(result.added), len(result.updated),
+                              len(result.removed)))
+        for alias in result.conflicts:
+            logger.warning(__msg.get('err.msg.source.conflict', alias,
+                                     source.name))
+
+
+def print_completion(args):
+    sys.stdout.write(completion.script(args.shell))
+
+
+def serve_tunnels(args):
+    from damnsshmanager.ssh.forward import TunnelServer
+
+    if args.alias:
+        tunnels = [lt.get_tunnel(alias) for alias in args.alias]
+        missing = [a for a, t in zip(args.alias, tunnels) if t is None]
+        if missing:
+            for alias in missing:
+                logger.error(__msg.get('err.msg.no.tun.alias', alias))
+            return
+    else:
+        tunnels = list(lt.get_all_tunnels())
+
+    server = TunnelServer(idle_timeout=args.idle_timeout,
+                          bind_addr=args.bind, keepalive=args.keepalive)
+    try:
+        for tunnel in tunnels:
+            gateway = hosts.get_host(tunnel.gateway)
+            if gateway is None:
+                logger.error(__msg.get('err.msg.no.host.alias',
+                                       tunnel.gateway))
+                continue
+            server.add(tunnel, gateway, jump=hosts.get_jump_chain(gateway))
+        server.serve_forever()
+    except KeyError as err:
+        logger.error(err)
+    except KeyboardInterrupt:
+        logger.info(__msg.get('err.msg.interrupted'))
+    finally:
+        server.close()
+
+
+def run_command(args):
+    from damnsshmanager.ssh import execute
+
+    command = args.command
+    if not command:
+        logger.error(__msg.get('err.msg.no.command'))
+        return
+
+    matches = __find_hosts(args.pattern, args.tag)
+    if not matches:
+        logger.error(__msg.get('err.msg.no.item', args.pattern))
+        return
+
+    try:
+        results = execute.run(matches, shlex.join(command),
+                              max_workers=args.workers,
+                              jump_fn=__jump_chain)
+    except KeyboardInterrupt:
+        logger.info(__msg.get('err.msg.interrupted'))
+        return
+
+    __log_heading(__msg.get('exec.summary'))
+    for result in results:
+        __log_exec_result(result)
+
+
+def copy_files(args):
+    from damnsshmanager.ssh import transfer
+
+    pattern, sep, remote_path = args.target.partition(':')
+    if not sep or not pattern:
+        logger.error(__msg.get('err.msg.cp.target', args.target))
+        return
+    sources = [pathlib.Path(src) for src in args.source]
+    missing = [str(src) for src in sources if not src.is_file()]
+    if missing:
+        logger.error(__msg.get('err.msg.cp.source', ', '.join(missing)))
+        return
+
+    matches = __find_hosts(pattern, args.tag)
+    if not matches:
+        logger.error(__msg.get('err.msg.no.item', pattern))
+        return
+
+    started = time.monotonic()
+    try:
+        results = transfer.run(matches, sources, remote_path or '.',
+                               max_workers=args.workers,
+                               streams=args.streams, resume=args.resume,
+                               jump_fn=__jump_chain)
+    except KeyboardInterrupt:
+        logger.info(__msg.get('err.msg.interrupted'))
+        return
+    elapsed = time.monotonic() - started
+
+    __log_heading(__msg.get('cp.summary'))
+    for result in results:
+        __log_transfer_result(result)
+    total = sum(r.size for r in results)
+    logger.info(__msg.get('cp.total', transfer.format_size(total),
+                          elapsed,
+                          transfer.format_size(total / max(elapsed, 1e-9))))
 
 
 def list_objects(args):
-    _type = args.type
-    if _type == 'host':
-        all_hosts = hosts.get_all_hosts() or []
-        header = __msg.get('fmt.host.header', 'Alias', 'Username', 'Address',
-                           'Port')
-        logger.info(header)
-        logger.info(__divider(header))
-        for host in all_hosts:
-            logger.info(__msg.get('fmt.host', host=host))
-    elif _type == 'ltun':
-        tunnels = lt.get_all_tunnels() or []
-        header = __msg.get('fmt.tunnel.header', 'Alias', 'Gateway',
-                           'Local Port', 'Destination', 'Remote Port')
-        logger.info(header)
-        logger.info(__divider(header))
-        for _type in tunnels:
-            logger.info(__msg.get('fmt.tunnel', tunnel=_type))
+    columns = table.TUNNEL_COLUMNS if args.type == 'ltun' \
+        else table.HOST_COLUMNS
+    if args.sort and args.sort not in {c.field for c in columns}:
+        logger.error(__msg.get('err.msg.sort.column', args.sort,
+                               ', '.join(c.field for c in columns)))
+        return
+    try:
+        lines = catalog.query('list', args.type, args.tag or [],
+                              args.filter, args.sort, args.reverse)
+    except OSError:
+        if args.type == 'ltun':
+            rows = list(lt.get_all_tunnels() or [])
+        elif args.tag:
+            rows = hosts.get_hosts_by_tags(args.tag)
+        else:
+            rows = hosts.get_all_hosts()
+        lines = table.render(columns, table.select(rows, args.filter,
+                                                   args.sort, args.reverse))
+    table.show(lines, pager=args.pager)
 
 
-def __divider(value):
-    return '-'.join(['' for _ in range(len(value))])
+def run_daemon(args):
+    if args.stop:
+        try:
+            catalog.query('stop')
+            logger.info(__msg.get('catalog.stopped'))
+        except OSError:
+            logger.error(__msg.get('err.msg.catalog.not.running'))
+        return
+    path = catalog.socket_path()
+    try:
+        server = catalog.CatalogServer(path)
+    except OSError as err:
+        logger.error(__msg.get('err.msg.listen', str(path), err))
+        return
+    server.catalog.refresh()
+    logger.info(__msg.get('catalog.serving', len(server.catalog.hosts),
+                          len(server.catalog.tunnels), str(path)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(__msg.get('err.msg.interrupted'))
+    finally:
+        server.close()
+
+
+def __find_hosts(pattern: str,
+                 tags: Optional[List[str]]) -> List[hosts.Host]:
+    """Return the hosts matching a pattern and all tags, answered by the
+    catalog daemon if it is running."""
+    try:
+        return catalog.query('search', pattern, tags or [])
+    except OSError:
+        pass
+    matches = hosts.find_hosts(pattern)
+    if tags:
+        tagged = {h.alias for h in hosts.get_hosts_by_tags(tags)}
+        matches = [h for h in matches if h.alias in tagged]
+    return matches
+
+
+def __jump_chain(host: hosts.Host) -> List[hosts.Host]:
+    try:
+        return catalog.query('jump', host.alias)
+    except OSError:
+        return hosts.get_jump_chain(host)
+
+
+def __add_transport_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--ciphers', type=str,
+                        help=__msg.get('ciphers.help'))
+    parser.add_argument('--macs', type=str, help=__msg.get('macs.help'))
+    parser.add_argument('--compression', type=__yes_no,
+                        help=__msg.get('compression.help'))
+    parser.add_argument('--window-size', type=int,
+                        help=__msg.get('window.size.help'))
+    parser.add_argument('--max-packet-size', type=int,
+                        help=__msg.get('max.packet.size.help'))
+    parser.add_argument('--keepalive', type=int,
+                        help=__msg.get('keepalive.help'))
+
+
+def __yes_no(value: str) -> bool:
+    if value.lower() in ('yes', 'on', 'true'):
+        return True
+    if value.lower() in ('no', 'off', 'false'):
+        return False
+    raise argparse.ArgumentTypeError(__msg.get('err.msg.yes.no', value))
+
+
+def __address(value: str):
+    bind_addr, _, port = value.rpartition(':')
+    try:
+        return bind_addr or '127.0.0.1', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(__msg.get('err.msg.address', value))
 
 
 def __log_host_info(host: hosts.Host, status: Optional[str], status_color=None):
@@ -120,15 +415,79 @@ def __log_host_info(host: hosts.Host, status: Optional[str], status_color=None):
                            port=host.port))
 
 
+def __log_exec_result(result: 'execute.ExecResult'):
+    if result.error is not None:
+        status, color = __msg.get('error'), '\x1b[0;30;41m'
+        detail = result.error
+    elif result.status == 0:
+        status, color = __msg.get('ok'), '\x1b[6;30;42m'
+        detail = __msg.get('exit.status', result.status)
+    else:
+        status, color = __msg.get('failed'), '\x1b[0;30;41m'
+        detail = __msg.get('exit.status', result.status)
+    logger.info(f'[{color}{status:^10s}\x1b[0m] {result.alias:>15s}'
+                f' => {detail} ({result.elapsed:.2f}s)')
+
+
+def __log_transfer_result(result: 'transfer.TransferResult'):
+    from damnsshmanager.ssh import transfer
+
+    if result.error is not None:
+        status, color = __msg.get('error'), '\x1b[0;30;41m'
+        detail = result.error
+    else:
+        status, color = __msg.get('ok'), '\x1b[6;30;42m'
+        rate = result.size / max(result.elapsed, 1e-9)
+        detail = __msg.get('cp.throughput',
+                           transfer.format_size(result.size),
+                           result.elapsed, transfer.format_size(rate))
+    logger.info(f'[{color}{status:^10s}\x1b[0m] {result.alias:>15s}'
+                f' => {detail}')
+
+
+def __log_timings(result: timings.Timings):
+    __log_heading(__msg.get('timings.heading', result.alias))
+    for line in result.report():
+        logger.info(line)
+    path = timings.log_path()
+    try:
+        timings.append(result, path)
+        logger.info(__msg.get('timings.saved', str(path)))
+    except OSError:
+        logger.error(__msg.get('err.msg.dump.error', str(path)))
+
+
+def __run_profiled(args):
+    result = profiling.Profile(args.func.__name__)
+    try:
+        with result:
+            args.func(args)
+    finally:
+        # interrupted commands, like serve, are reported as well
+        __log_profile(result)
+
+
+def __log_profile(result: profiling.Profile):
+    __log_heading(__msg.get('profile.heading', result.name))
+    for line in result.report():
+        logger.info(line)
+    try:
+        path = result.save()
+        logger.info(__msg.get('profile.saved', str(path)))
+    except OSError:
+        logger.error(__msg.get('err.msg.dump.error', str(result.directory)))
+
+
 def __log_heading(heading: Optional[str]):
     logger.info(''.join(['-' for _ in range(79)]))
     logger.info(f' {heading:<s}')
     logger.info(''.join(['-' for _ in range(79)]))
 
 
-def main():
-    configure_logging()
+def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description=__msg.get('app.desc'))
+    parser.add_argument('--profile', action='store_true',
+                        help=__msg.get('profile.help'))
 
     sub_parsers = parser.add_subparsers()
 
@@ -140,6 +499,13 @@ def main():
                             help=__msg.get('username.help'))
     add_parser.add_argument('-p', '--port', type=int, default=22,
                             help=__msg.get('port.help'))
+    add_parser.add_argument('-J', '--jump', type=str,
+                            help=__msg.get('jump.help'))
+    add_parser.add_argument('-T', '--tags', type=str,
+                            help=__msg.get('tags.help'))
+    add_parser.add_argument('-i', '--identity', type=str,
+                            help=__msg.get('identity.help'))
+    __add_transport_arguments(add_parser)
     add_parser.set_defaults(func=add, module=hosts)
 
     ltun_parser = sub_parsers.add_parser('ltun', help=__msg.get('ltun.help'))
@@ -164,8 +530,46 @@ def main():
     list_parser.add_argument('-t', '--type', choices=['host', 'ltun'],
                              default='host',
                              help=__msg.get('list.type.help'))
+    list_parser.add_argument('-T', '--tag', type=str, action='append',
+                             help=__msg.get('tag.filter.help'))
+    list_parser.add_argument('-f', '--filter', type=str,
+                             help=__msg.get('list.filter.help'))
+    list_parser.add_argument('-s', '--sort', type=str,
+                             help=__msg.get('list.sort.help'))
+    list_parser.add_argument('-r', '--reverse', action='store_true',
+                             help=__msg.get('list.reverse.help'))
+    list_parser.add_argument('--no-pager', dest='pager',
+                             action='store_false',
+                             help=__msg.get('list.no.pager.help'))
     list_parser.set_defaults(func=list_objects)
 
+    tag_parser = sub_parsers.add_parser('tag', help=__msg.get('tag.help'))
+    tag_parser.add_argument('alias', type=str, help=__msg.get('alias.help'))
+    tag_parser.add_argument('tags', type=str, nargs='+',
+                            help=__msg.get('tags.help'))
+    tag_parser.add_argument('-r', '--remove', action='store_true',
+                            help=__msg.get('tag.remove.help'))
+    tag_parser.set_defaults(func=tag_host)
+
+    tune_parser = sub_parsers.add_parser('tune', help=__msg.get('tune.help'))
+    tune_parser.add_argument('alias', type=str, help=__msg.get('alias.help'))
+    tune_parser.add_argument('--reset', action='store_true',
+                             help=__msg.get('tune.reset.help'))
+    __add_transport_arguments(tune_parser)
+    tune_parser.set_defaults(func=tune_host)
+
+    check_parser = sub_parsers.add_parser('check',
+                                          help=__msg.get('check.help'))
+    check_parser.add_argument('-T', '--tag', type=str, action='append',
+                              help=__msg.get('tag.filter.help'))
+    check_parser.add_argument('--metrics-file', type=str,
+                              help=__msg.get('metrics.file.help'))
+    check_parser.add_argument('--listen', type=__address,
+                              help=__msg.get('metrics.listen.help'))
+    check_parser.add_argument('--interval', type=float, default=60,
+                              help=__msg.get('metrics.interval.help'))
+    check_parser.set_defaults(func=check_hosts)
+
     connect_parser = sub_parsers.add_parser('c',
                                             help=__msg.get('connect.help'))
     connect_parser.add_argument('alias', type=str,
@@ -178,13 +582,119 @@ def main():
                                 choices=provider_names,
                                 default=provider_names[0],
                                 help=__msg.get('provider.type.help'))
+    connect_parser.add_argument('-r', '--record', action='store_true',
+                                help=__msg.get('record.help'))
+    connect_parser.add_argument('--timings', action='store_true',
+                                help=__msg.get('timings.help'))
+    connect_parser.add_argument('--exec', action='store_true',
+                                help=__msg.get('connect.exec.help'))
     connect_parser.set_defaults(func=open_connection)
 
-    args = parser.parse_args()
-    num_args = len(vars(args).keys())
-    if num_args == 0:
+    exec_parser = sub_parsers.add_parser('exec', help=__msg.get('exec.help'))
+    exec_parser.add_argument('pattern', type=str,
+                             help=__msg.get('exec.pattern.help'))
+    exec_parser.add_argument('-w', '--workers', type=int, default=16,
+                             help=__msg.get('exec.workers.help'))
+    exec_parser.add_argument('-T', '--tag', type=str, action='append',
+                             help=__msg.get('tag.filter.help'))
+    exec_parser.add_argument('command', nargs='*',
+                             help=__msg.get('exec.command.help'))
+    exec_parser.set_defaults(func=run_command)
+
+    cp_parser = sub_parsers.add_parser('cp', help=__msg.get('cp.help'))
+    cp_parser.add_argument('source', type=str, nargs='+',
+                           help=__msg.get('cp.source.help'))
+    cp_parser.add_argument('target', type=str,
+                           help=__msg.get('cp.target.help'))
+    cp_parser.add_argument('-T', '--tag', type=str, action='append',
+                           help=__msg.get('tag.filter.help'))
+    cp_parser.add_argument('-w', '--workers', type=int, default=8,
+                           help=__msg.get('cp.workers.help'))
+    cp_parser.add_argument('-s', '--streams', type=int, default=4,
+                           help=__msg.get('cp.streams.help'))
+    cp_parser.add_argument('-r', '--resume', action='store_true',
+                           help=__msg.get('cp.resume.help'))
+    cp_parser.set_defaults(func=copy_files)
+
+    serve_parser = sub_parsers.add_parser('serve',
+                                          help=__msg.get('serve.help'))
+    serve_parser.add_argument('alias', type=str, nargs='*',
+                              help=__msg.get('serve.alias.help'))
+    serve_parser.add_argument('-i', '--idle-timeout', type=float, default=300,
+                              help=__msg.get('idle.timeout.help'))
+    serve_parser.add_argument('-b', '--bind', type=str, default='127.0.0.1',
+                              help=__msg.get('bind.addr.help'))
+    serve_parser.add_argument('-k', '--keepalive', type=float, default=30,
+                              help=__msg.get('serve.keepalive.help'))
+    serve_parser.set_defaults(func=serve_tunnels)
+
+    source_parser = sub_parsers.add_parser('source',
+                                           help=__msg.get('source.help'))
+    source_parser.add_argument('name', type=str, nargs='?',
+                               help=__msg.get('source.name.help'))
+    source_parser.add_argument('location', type=str, nargs='?',
+                               help=__msg.get('source.location.help'))
+    source_parser.add_argument('-c', '--command', action='store_true',
+                               help=__msg.get('source.command.help'))
+    source_parser.add_argument('--ttl', type=int,
+                               default=inventory.DEFAULT_TTL,
+                               help=__msg.get('source.ttl.help'))
+    source_parser.add_argument('--remove', action='store_true',
+                               help=__msg.get('source.remove.help'))
+    source_parser.set_defaults(func=manage_sources)
+
+    sync_parser = sub_parsers.add_parser('sync', help=__msg.get('sync.help'))
+    sync_parser.add_argument('name', type=str, nargs='*',
+                             help=__msg.get('sync.name.help'))
+    sync_parser.add_argument('-f', '--force', action='store_true',
+                             help=__msg.get('sync.force.help'))
+    sync_parser.set_defaults(func=sync_sources)
+
+    daemon_parser = sub_parsers.add_parser('daemon',
+                                           help=__msg.get('daemon.help'))
+    daemon_parser.add_argument('--stop', action='store_true',
+                               help=__msg.get('daemon.stop.help'))
+    daemon_parser.set_defaults(func=run_daemon)
+
+    completion_parser = sub_parsers.add_parser(
+        'completion', help=__msg.get('completion.help'))
+    completion_parser.add_argument('shell', choices=completion.SHELLS,
+                                   help=__msg.get('completion.shell.help'))
+    completion_parser.set_defaults(func=print_completion)
+    return parser
+
+
+def parse_args(parser: argparse.ArgumentParser,
+               argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line. Everything after the first `--` is the
+    command of `dsm exec`, so its options are never taken for options of
+    dsm and the options of dsm can be given anywhere before it."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    remote: List[str] = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, remote = argv[:index], argv[index + 1:]
+    args = parser.parse_args(argv)
+    if remote:
+        if 'command' not in args:
+            parser.error(__msg.get('err.msg.unrecognized.args',
+                                   ' '.join(remote)))
+        args.command = args.command + remote
+    return args
+
+
+def main():
+    configure_logging()
+    parser = create_parser()
+    args = parse_args(parser)
+    if 'func' not in args:
         parser.print_help()
-        check_hosts()
+        args.func = check_hosts
+    if args.func not in (manage_sources, sync_sources, print_completion):
+        # stale inventory sources are synced in the background
+        inventory.refresh_stale()
+    if profiling.requested(args.profile):
+        __run_profiled(args)
     else:
         args.func(args)
 
@@ -0,0 +1,243 @@
+"""This module answers the shell completion of `dsm`. Completion runs on
+every key press, so it only depends on the standard library and the app
+dir of the configuration. The aliases are read from plain text files next
+to the stores, that `hosts` and `localtunnel` rewrite whenever they change.
+The stores themselves are only read if an alias file is missing.
+
+Sample usage:
+
+    # ~/.bashrc
+    eval "$(dsm completion bash)"
+
+    # completion of `dsm c db<TAB>`, as called by the generated scripts
+    dsm --complete 2 dsm c db
+"""
+import os
+import sys
+from collections import namedtuple
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from damnsshmanager.config import Config
+
+HOSTS = 'hosts'
+TUNNELS = 'localtunnels'
+SHELLS = ('bash', 'zsh', 'fish')
+
+# options of dsm itself, given before the command
+FLAGS = ('--profile',)
+
+Source = Optional[Callable[[], Iterable[str]]]
+
+# `args` completes the positional arguments of a command by position, the
+# last one is repeated if `repeat` is set. `options` are all options that
+# take a value, `flags` those that do not.
+Command = namedtuple('Command', 'args options flags repeat',
+                     defaults=((), {}, (), False))
+
+
+def alias_file(kind: str) -> str:
+    return os.path.join(Config.app_dir, f'{kind}.aliases')
+
+
+def write_aliases(kind: str, aliases: Iterable[str]):
+    """Replace the alias file of given store. Failures are ignored, the
+    file is rebuilt from the store on the next completion.
+
+    Args:
+        kind (str): `HOSTS` or `TUNNELS`
+        aliases (Iterable[str]): all aliases of the store
+    """
+    path = alias_file(kind)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.writelines(f'{alias}\n' for alias in aliases)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def read_aliases(kind: str) -> List[str]:
+    """Return the aliases of given store from its alias file. The files
+    of both stores are rebuilt if the file does not exist yet.
+    """
+    try:
+        with open(alias_file(kind), encoding='utf-8') as f:
+            return f.read().split()
+    except FileNotFoundError:
+        pass
+    from damnsshmanager import hosts
+    from damnsshmanager import localtunnel as lt
+
+    aliases = {HOSTS: [h.alias for h in hosts.get_all_hosts()],
+               TUNNELS: [t.alias for t in lt.get_all_tunnels() or []]}
+    for name, values in aliases.items():
+        write_aliases(name, values)
+    return aliases[kind]
+
+
+def _aliases(*kinds: str) -> Source:
+    return lambda: [a for kind in kinds for a in read_aliases(kind)]
+
+
+def _choices(*values: str) -> Source:
+    return lambda: values
+
+
+_TRANSPORT_OPTIONS = {
+    '--ciphers': None, '--macs': None,
+    '--compression': _choices('yes', 'no'),
+    '--window-size': None, '--max-packet-size': None, '--keepalive': None,
+}
+_TAG_OPTIONS = {'-T': None, '--tag': None}
+_SORT_FIELDS = ('alias', 'username', 'addr', 'port', 'gateway', 'lport',
+                'destination', 'rport')
+
+COMMANDS = {
+    'add': Command(args=(None, None), options={
+        '-u': None, '--username': None, '-p': None, '--port': None,
+        '-J': _aliases(HOSTS), '--jump': _aliases(HOSTS),
+        '-T': None, '--tags': None, '-i': None, '--identity': None,
+        **_TRANSPORT_OPTIONS}),
+    'ltun': Command(args=(None, _aliases(HOSTS), None), options={
+        '--local_port': None, '--destination': None}),
+    'del': Command(args=(_aliases(HOSTS, TUNNELS),), options={
+        '-t': _choices('host', 'ltun'), '--type': _choices('host', 'ltun')}),
+    'list': Command(options={
+        '-t': _choices('host', 'ltun'), '--type': _choices('host', 'ltun'),
+        '-f': _aliases(HOSTS, TUNNELS), '--filter': _aliases(HOSTS, TUNNELS),
+        '-s': _choices(*_SORT_FIELDS), '--sort': _choices(*_SORT_FIELDS),
+        **_TAG_OPTIONS}, flags=('-r', '--reverse', '--no-pager')),
+    'tag': Command(args=(_aliases(HOSTS), None), repeat=True,
+                   flags=('-r', '--remove')),
+    'tune': Command(args=(_aliases(HOSTS),), options=_TRANSPORT_OPTIONS,
+                    flags=('--reset',)),
+    'check': Command(options={
+        '--metrics-file': None, '--listen': None, '--interval': None,
+        **_TAG_OPTIONS}),
+    'c': Command(args=(_aliases(HOSTS, TUNNELS),), options={
+        '-t': _choices('host', 'ltun'), '--type': _choices('host', 'ltun'),
+        '-p': _choices('system', 'application'),
+        '--provider': _choices('system', 'application')},
+        flags=('-r', '--record', '--timings', '--exec')),
+    'exec': Command(args=(_aliases(HOSTS), None), repeat=True, options={
+        '-w': None, '--workers': None, **_TAG_OPTIONS}),
+    'cp': Command(args=(None,), repeat=True, options={
+        '-w': None, '--workers': None, '-s': None, '--streams': None,
+        **_TAG_OPTIONS}, flags=('-r', '--resume')),
+    'serve': Command(args=(_aliases(TUNNELS),), repeat=True, options={
+        '-i': None, '--idle-timeout': None, '-b': None, '--bind': None,
+        '-k': None, '--keepalive': None}),
+    'source': Command(args=(None, None), options={'--ttl': None},
+                      flags=('-c', '--command', '--remove')),
+    'sync': Command(flags=('-f', '--force')),
+    'daemon': Command(flags=('--stop',)),
+    'completion': Command(args=(_choices(*SHELLS),)),
+}
+
+
+def complete(words: Sequence[str], index: int) -> List[str]:
+    """Return the candidates for a word of a `dsm` command line.
+
+    Args:
+        words (Sequence[str]): the command line, starting with `dsm`
+        index (int): position of the word that is completed
+
+    Returns:
+        List[str]: candidates starting with the word
+    """
+    current = words[index] if index < len(words) else ''
+    start = 1
+    while start < index and words[start].startswith('-'):
+        start += 1
+    if index > start:
+        candidates: Iterable[str] = _command_candidates(
+            words[start], words[start + 1:index], current)
+    elif current.startswith('-'):
+        candidates = ['-h', '--help', *FLAGS]
+    else:
+        candidates = COMMANDS
+    return [c for c in candidates if c.startswith(current)]
+
+
+def _command_candidates(name: str, previous: Sequence[str],
+                        current: str) -> Iterable[str]:
+    command = COMMANDS.get(name)
+    if command is None:
+        return ()
+    position = 0
+    value_of = None
+    for word in previous:
+        if value_of is not None:
+            value_of = None
+        elif word == '--':
+            return ()
+        elif word in command.options:
+            value_of = word
+        elif not word.startswith('-'):
+            position += 1
+
+    if value_of is not None:
+        source = command.options[value_of]
+    elif current.startswith('-'):
+        return ['-h', '--help', *command.options, *command.flags]
+    elif position < len(command.args):
+        source = command.args[position]
+    elif command.repeat and command.args:
+        source = command.args[-1]
+    else:
+        source = None
+    return source() if source is not None else ()
+
+
+_SCRIPTS = {
+    'bash': '''\
+_dsm() {
+    local IFS=$'\\n'
+    COMPREPLY=($(dsm --complete "$COMP_CWORD" "${COMP_WORDS[@]}" 2>/dev/null))
+}
+complete -o default -F _dsm dsm
+''',
+    'zsh': '''\
+#compdef dsm
+_dsm() {
+    local -a candidates
+    candidates=(${(f)"$(dsm --complete $((CURRENT - 1)) "${words[@]}" 2>/dev/null)"})
+    if (( ${#candidates} )); then
+        compadd -a candidates
+    else
+        _files
+    fi
+}
+compdef _dsm dsm
+''',
+    'fish': '''\
+function __dsm_complete
+    set -l words (commandline -opc) (commandline -ct)
+    set -l candidates (dsm --complete (math (count $words) - 1) $words 2>/dev/null)
+    if set -q candidates[1]
+        printf '%s\\n' $candidates
+    else
+        __fish_complete_path (commandline -ct)
+    end
+end
+complete -c dsm -f -a '(__dsm_complete)'
+''',
+}
+
+
+def script(shell: str) -> str:
+    """Return the completion script of given shell."""
+    return _SCRIPTS[shell]
+
+
+def main(argv: Sequence[str]) -> int:
+    """Print the candidates of `dsm --complete <index> <words ...>`, one
+    per line."""
+    try:
+        index = int(argv[0])
+    except (IndexError, ValueError):
+        return 1
+    for candidate in complete(argv[1:], index):
+        sys.stdout.write(f'{candidate}\n')
+    return 0
@@ -1,22 +1,46 @@
 import os
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
 
 from appdirs import user_config_dir
 
-from damnsshmanager import messages
+if TYPE_CHECKING:
+    from damnsshmanager.messages import Messages
 
+APP_DIR_ENV = 'DSM_APP_DIR'
 
-@dataclass
-class __Config:
 
-    app_dir: str = ''
+class __Config:
+    """Configuration of the application. Nothing is read or created until
+    it is used for the first time. The app dir is taken from the
+    environment variable `DSM_APP_DIR` if it is set, otherwise from the
+    config dir of the user. Use `configure` to set it before the first use,
+    e.g. when embedding the library or for isolated tests.
+    """
 
     def __init__(self):
-
-        self.app_dir = user_config_dir('damnsshmanager')
-        if not os.path.exists(self.app_dir):
-            os.mkdir(self.app_dir, mode=0o755)
-        self.messages = messages.Messages()
+        self._app_dir: Optional[str] = None
+        self._messages: Optional['Messages'] = None
+
+    @property
+    def app_dir(self) -> str:
+        if self._app_dir is None:
+            self.configure(os.environ.get(APP_DIR_ENV) or
+                           user_config_dir('damnsshmanager'))
+        return self._app_dir
+
+    @property
+    def messages(self) -> 'Messages':
+        if self._messages is None:
+            # loguru is imported by the messages, which completion and
+            # other users of the app dir alone do not need
+            from damnsshmanager.messages import Messages
+            self._messages = Messages()
+        return self._messages
+
+    def configure(self, app_dir: str):
+        """Use given app dir, which is created if it does not exist."""
+        os.makedirs(app_dir, mode=0o755, exist_ok=True)
+        self._app_dir = app_dir
 
 
 Config = __Config()
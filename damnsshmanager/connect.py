@@ -14,55 +14,72 @@ from loguru import logger
 
 from damnsshmanager import hosts
 from damnsshmanager import localtunnel as lt
+from damnsshmanager import timings
 from damnsshmanager.config import Config
-from damnsshmanager.model import Host, LocalTunnel
-from damnsshmanager.ssh.provider import SSHChannel
+from damnsshmanager.ssh.channel import SSHChannel
 from damnsshmanager.storage import UniqueException
 
 __msg = Config.messages
 
 
 def host_connector_fn(channel: SSHChannel, alias: str):
-    host = hosts.get_host(alias)
+    with timings.phase('store'):
+        host = hosts.get_host(alias)
     if host is None:
         logger.error(__msg.get('err.msg.no.host.alias', alias))
         return
-    channel.open(host)
+    try:
+        with timings.phase('store'):
+            jump = hosts.get_jump_chain(host)
+    except KeyError as err:
+        logger.error(err)
+        return
+    channel.open(host, jump=jump)
 
 
 def ltun_connector_fn(channel: SSHChannel, alias: str):
-    ltun = lt.get_tunnel(alias)
+    with timings.phase('store'):
+        ltun = lt.get_tunnel(alias)
     if ltun is None:
         logger.error(__msg.get('err.msg.no.tun.alias', alias))
         return
 
-    host = hosts.get_host(ltun.gateway)
+    with timings.phase('store'):
+        host = hosts.get_host(ltun.gateway)
     if host is None:
         logger.error(__msg.get('err.msg.no.host.alias', alias))
         return
 
-    channel.open(host, ltun=ltun)
+    try:
+        with timings.phase('store'):
+            jump = hosts.get_jump_chain(host)
+    except KeyError as err:
+        logger.error(err)
+        return
+    channel.open(host, ltun=ltun, jump=jump)
 
 
 def default_connector_strategy(channel: SSHChannel, alias: str):
     try:
-        host = hosts.get_host(alias)
-        ltun = lt.get_tunnel(alias)
+        with timings.phase('store'):
+            host = hosts.get_host(alias)
+            ltun = lt.get_tunnel(alias)
         items = [_ for _ in [host, ltun] if _ is not None]
         if len(items) > 1:
             logger.error(__msg.get('err.msg.multi', alias))
         elif len(items) == 0:
             logger.error(__msg.get('err.msg.no.item', alias))
         else:
-            strategy = _connector_strategies.get(items[0].__doc__)
+            strategy_type = 'host' if host is not None else 'ltun'
+            strategy = _connector_strategies.get(strategy_type)
             strategy(channel, alias)
     except UniqueException as err:
         logger.error(err)
 
 
 _connector_strategies = {
-    Host.__doc__: host_connector_fn,
-    LocalTunnel.__doc__: ltun_connector_fn
+    'host': host_connector_fn,
+    'ltun': ltun_connector_fn
 }
 
 
@@ -1,15 +1,34 @@
+import fnmatch
 import os
 import pathlib
 import pwd
-from typing import Optional
+from typing import Callable, Iterable, List, Optional, Tuple
 
 from loguru import logger
 
+from damnsshmanager import completion
 from damnsshmanager.config import Config
-from damnsshmanager.model import Host
+from damnsshmanager.model import Host, SyncResult, TransportProfile
 from damnsshmanager.storage import PickleStore
 
-_store = PickleStore(pathlib.Path(Config.app_dir, 'hosts.pickle'))
+
+def _create_store(object_file: pathlib.Path) -> PickleStore:
+    """Create the store of hosts, that keeps an index of the aliases of
+    all hosts per tag."""
+    return PickleStore(object_file, index=lambda h: h.tags,
+                       ident=lambda h: h.alias)
+
+
+# created on first use, see __store
+_store: Optional[PickleStore] = None
+
+
+def __store() -> PickleStore:
+    global _store
+    if _store is None:
+        _store = _create_store(pathlib.Path(Config.app_dir, 'hosts.pickle'))
+    return _store
+
 
 __msg = Config.messages
 
@@ -24,6 +43,48 @@ def __test_host_args(**kwargs):
     host = get_host(kwargs['alias'])
     if host is not None:
         return __msg.get('alias.present', host.alias)
+    for jump_alias in __jump_aliases(kwargs.get('jump')):
+        if jump_alias == kwargs['alias']:
+            return __msg.get('err.msg.jump.cycle', jump_alias)
+        if get_host(jump_alias) is None:
+            return __msg.get('jump.with.alias.required', jump_alias)
+    return None
+
+
+def __split(values) -> Tuple[str, ...]:
+    if not values:
+        return ()
+    if isinstance(values, str):
+        values = values.split(',')
+    return tuple(v.strip() for v in values if v.strip())
+
+
+def __jump_aliases(jump) -> Tuple[str, ...]:
+    return __split(jump)
+
+
+def __transport_profile(settings: dict,
+                        profile: Optional[TransportProfile] = None
+                        ) -> Optional[TransportProfile]:
+    values = {k: settings[k] for k in TransportProfile._fields
+              if settings.get(k) is not None}
+    for name in ('ciphers', 'macs'):
+        if name in values:
+            values[name] = __split(values[name])
+    for name in ('window_size', 'max_packet_size', 'keepalive'):
+        if name in values and int(values[name]) <= 0:
+            raise KeyError(__msg.get('err.msg.transport.value', name,
+                                     values[name]))
+    if not values:
+        return profile
+    return (profile or TransportProfile())._replace(**values)
+
+
+def default_username() -> Optional[str]:
+    """Return the name of the local user, used if a host has none."""
+    pwuid = pwd.getpwuid((os.getuid()))
+    if len(pwuid) > 0:
+        return pwuid[0]
     return None
 
 
@@ -36,36 +97,208 @@ def add(**kwargs):
     # get arguments (defaults)
     alias = kwargs['alias']
     addr = kwargs['addr']
-    pwuid = pwd.getpwuid((os.getuid()))
-    pw_name = None
-    if len(pwuid) > 0:
-        pw_name = pwuid[0]
     username = kwargs.get('username')
     if not username:
-        username = pw_name
+        username = default_username()
     port = kwargs.get('port', 22)
+    jump = __jump_aliases(kwargs.get('jump'))
+    tags = tuple(sorted(set(__split(kwargs.get('tags')))))
+    identity = kwargs.get('identity')
+    if identity:
+        identity = os.path.abspath(os.path.expanduser(identity))
+
+    transport = __transport_profile(kwargs)
 
-    host = Host(alias=alias, addr=addr, username=username, port=port)
+    host = Host(alias=alias, addr=addr, username=username, port=port,
+                jump=jump, tags=tags, identity=identity, transport=transport)
     try:
-        _store.add(host, sort=lambda h: h.alias)
+        __store().add(host, sort=lambda h: h.alias)
+        __write_aliases()
         logger.info(__msg.get('added.host', host=host))
     except IOError:
-        logger.error(__msg.get('err.msg.dump.error', _store.object_file))
+        logger.error(__msg.get('err.msg.dump.error', __store().object_file))
 
 
 def delete(alias: str):
 
-    deleted = _store.delete(lambda h: h.alias == alias)
+    deleted = __store().delete(lambda h: h.alias == alias)
     if deleted is not None:
+        __write_aliases()
         for h in deleted:
             logger.info(__msg.get('deleted', str(h)))
     else:
         logger.info(__msg.get('err.msg.no.item', alias))
 
 
+def __write_aliases():
+    completion.write_aliases(completion.HOSTS,
+                             (h.alias for h in __store().get()))
+
+
+def store_file() -> pathlib.Path:
+    return __store().object_file
+
+
 def get_host(alias: str) -> Optional[Host]:
-    return _store.unique(key=lambda h: h.alias == alias)
+    return __store().unique(key=lambda h: h.alias == alias)
 
 
 def get_all_hosts() -> list:
-    return list(_store.get())
+    return list(__store().get())
+
+
+def find_hosts(pattern: str) -> List[Host]:
+    """Return all hosts whose alias matches given shell style pattern.
+
+    Args:
+        pattern (str): pattern like `web*` or `db-[12]`
+
+    Returns:
+        List[Host]: matching hosts sorted by alias
+    """
+    return list(__store().get(key=lambda h: fnmatch.fnmatchcase(h.alias,
+                                                             pattern)))
+
+
+def get_hosts_by_tags(tags: Iterable[str]) -> List[Host]:
+    """Return all hosts that are tagged with every given tag. The aliases
+    are resolved through the tag index of the store.
+
+    Args:
+        tags (Iterable[str]): tags a host must have
+
+    Returns:
+        List[Host]: matching hosts sorted by alias
+    """
+    aliases = None
+    for tag in tags:
+        tagged = set(__store().lookup(tag))
+        aliases = tagged if aliases is None else aliases & tagged
+        if not aliases:
+            return []
+    if aliases is None:
+        return get_all_hosts()
+    return list(__store().get(key=lambda h: h.alias in aliases))
+
+
+def get_tags() -> List[str]:
+    return __store().terms()
+
+
+def tag(alias: str, tags: Iterable[str] = (), remove: bool = False):
+    """Add tags to or remove tags from an existing host.
+
+    Args:
+        alias (str): alias of the host
+        tags (Iterable[str]): tags to add or remove
+        remove (bool): remove the tags instead of adding them
+    """
+    tags = set(__split(tags))
+
+    def retag(host: Host) -> Host:
+        new_tags = set(host.tags) - tags if remove else set(host.tags) | tags
+        return host._replace(tags=tuple(sorted(new_tags)))
+
+    updated = __store().update(lambda h: h.alias == alias, retag)
+    if not updated:
+        logger.info(__msg.get('err.msg.no.item', alias))
+    for host in updated:
+        logger.info(__msg.get('tagged.host', host.alias,
+                              ', '.join(host.tags) or '-'))
+
+
+def tune(alias: str, reset: bool = False, **settings):
+    """Change the transport settings of an existing host. Settings that
+    are not given are kept.
+
+    Args:
+        alias (str): alias of the host
+        reset (bool): drop all settings before applying the given ones
+        settings: fields of `TransportProfile`
+    """
+    # validate before the store is touched
+    __transport_profile(settings)
+
+    def retune(host: Host) -> Host:
+        profile = None if reset else host.transport
+        return host._replace(transport=__transport_profile(settings,
+                                                           profile))
+
+    updated = __store().update(lambda h: h.alias == alias, retune)
+    if not updated:
+        logger.info(__msg.get('err.msg.no.item', alias))
+    for host in updated:
+        logger.info(__msg.get('tuned.host', host.alias,
+                              str(host.transport) if host.transport else '-'))
+
+
+def sync(source: str, entries: Iterable[Host]) -> SyncResult:
+    """Make the hosts of an inventory source equal to given entries.
+    Hosts of the source that are not part of the entries are deleted, new
+    ones are added and changed ones replaced. The store is only written
+    if anything changed. Entries whose alias is used by a host that was
+    added by hand or by another source are skipped.
+
+    Args:
+        source (str): name of the inventory source
+        entries (Iterable[Host]): all hosts of the source
+
+    Returns:
+        SyncResult: added, updated and removed hosts and skipped aliases
+    """
+    entries = {h.alias: h._replace(source=source) for h in entries}
+    objs, updated, removed, conflicts = [], [], [], []
+    for host in __store().get():
+        entry = entries.pop(host.alias, None)
+        if host.source != source:
+            objs.append(host)
+            if entry is not None:
+                conflicts.append(entry.alias)
+        elif entry is None:
+            removed.append(host)
+        else:
+            if entry != host:
+                updated.append(entry)
+            objs.append(entry)
+    added = list(entries.values())
+    if added or updated or removed:
+        __store().replace(objs + added, sort=lambda h: h.alias)
+        __write_aliases()
+    return SyncResult(added, updated, removed, conflicts)
+
+
+def get_jump_chain(host: Host,
+                   lookup: Callable[[str], Optional[Host]] = get_host
+                   ) -> List[Host]:
+    """Resolve the jump hosts that must be passed to reach given host.
+    The jump chain of the first jump host is resolved as well, so a
+    bastion that is itself only reachable through another host has to
+    be configured once.
+
+    Args:
+        host (Host): target host
+        lookup (Callable[[str], Optional[Host]]): returns the host of an
+        alias, `get_host` by default
+
+    Raises:
+        KeyError: if a jump host does not exist or the chain contains a cycle
+
+    Returns:
+        List[Host]: jump hosts in the order they are connected to
+    """
+    chain: List[Host] = []
+    visited = {host.alias}
+    current = host
+    while current.jump:
+        hops = []
+        for alias in current.jump:
+            if alias in visited:
+                raise KeyError(__msg.get('err.msg.jump.cycle', alias))
+            visited.add(alias)
+            hop = lookup(alias)
+            if hop is None:
+                raise KeyError(__msg.get('jump.with.alias.required', alias))
+            hops.append(hop)
+        chain = hops + chain
+        current = hops[0]
+    return chain
@@ -0,0 +1,312 @@
+"""This module syncs hosts from external inventory sources into the store
+of hosts. A source is either a JSON or YAML file or a command that prints
+JSON. Both contain a list of hosts, or an object with such a list under
+`hosts`:
+
+```
+[{"alias": "web", "addr": "10.0.0.1", "username": "deploy", "port": 22,
+  "jump": ["bastion"], "tags": ["prod"], "identity": "~/.ssh/id_web"}]
+```
+
+Only the differences to the current hosts of a source are written. The
+state of every source is kept in the app dir: files are only read again
+if their modification time or size changed, commands are only run again
+after their time to live. Normal commands never wait for a source, stale
+sources are synced by a `dsm sync` in the background.
+
+Sample usage:
+```
+inventory.add(name='cmdb', kind='command', location='cmdb-export --json')
+for source, result in inventory.sync_all():
+    print(source.name, len(result.added))
+```
+"""
+import fcntl
+import json
+import os
+import pathlib
+import pickle
+import shlex
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from damnsshmanager import hosts
+from damnsshmanager.config import APP_DIR_ENV, Config
+from damnsshmanager.model import (Host, InventorySource, SyncResult,
+                                  TransportProfile)
+from damnsshmanager.storage import PickleStore
+
+KINDS = ('file', 'command')
+DEFAULT_TTL = 300
+
+# seconds a command may take to print its inventory
+COMMAND_TIMEOUT = 60
+
+# created on first use, see __store
+_store: Optional[PickleStore] = None
+__msg = Config.messages
+
+# name of a source to (fingerprint, time of the last sync)
+State = Dict[str, Tuple[Optional[tuple], float]]
+
+
+def __store() -> PickleStore:
+    global _store
+    if _store is None:
+        _store = PickleStore(pathlib.Path(Config.app_dir,
+                                           'inventories.pickle'))
+    return _store
+
+
+def state_file() -> pathlib.Path:
+    return pathlib.Path(Config.app_dir, 'inventories.state')
+
+
+def add(**kwargs):
+    """Add an inventory source, see `InventorySource`."""
+    name = kwargs.get('name')
+    if not name:
+        raise KeyError(__msg.get('alias.required'))
+    if not kwargs.get('location'):
+        raise KeyError(__msg.get('source.location.required'))
+    kind = kwargs.get('kind') or 'file'
+    if kind not in KINDS:
+        raise KeyError(__msg.get('err.msg.source.kind', kind,
+                                 ', '.join(KINDS)))
+    if get_source(name) is not None:
+        raise KeyError(__msg.get('alias.present', name))
+    location = kwargs['location']
+    if kind == 'file':
+        location = os.path.abspath(os.path.expanduser(location))
+    source = InventorySource(name=name, kind=kind, location=location,
+                             ttl=kwargs.get('ttl') or DEFAULT_TTL)
+    __store().add(source, sort=lambda s: s.name)
+    logger.info(__msg.get('added.source', source=source))
+
+
+def delete(name: str):
+    """Delete an inventory source and all hosts that were synced from it."""
+    deleted = __store().delete(lambda s: s.name == name)
+    if not deleted:
+        logger.info(__msg.get('err.msg.no.item', name))
+        return
+    hosts.sync(name, [])
+    state = _read_state()
+    if state.pop(name, None) is not None:
+        _write_state(state)
+    for source in deleted:
+        logger.info(__msg.get('deleted', str(source)))
+
+
+def get_source(name: str) -> Optional[InventorySource]:
+    return __store().unique(key=lambda s: s.name == name)
+
+
+def get_all_sources() -> List[InventorySource]:
+    return list(__store().get())
+
+
+def load_file(path: str) -> object:
+    """Parse a JSON file, or a YAML file if the extension is .yaml or .yml.
+    YAML files require PyYAML."""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise KeyError(__msg.get('err.msg.source.yaml', path))
+            try:
+                return yaml.safe_load(f)
+            except yaml.YAMLError as err:
+                raise ValueError(str(err))
+        return json.load(f)
+
+
+def run_command(command: str, timeout: float = COMMAND_TIMEOUT) -> object:
+    """Run a command without a shell and parse the JSON it prints."""
+    result = subprocess.run(shlex.split(command), capture_output=True,
+                            check=True, timeout=timeout)
+    return json.loads(result.stdout)
+
+
+def parse_hosts(data, source: str) -> List[Host]:
+    """Create the hosts of a parsed inventory.
+
+    Args:
+        data: list of hosts, or an object with the list under `hosts`
+        source (str): name of the source the hosts are assigned to
+
+    Raises:
+        KeyError: if an entry is not a valid host
+
+    Returns:
+        List[Host]: the hosts of the inventory
+    """
+    if isinstance(data, dict):
+        data = data.get('hosts', [])
+    if not isinstance(data, list):
+        raise KeyError(__msg.get('err.msg.source.entry', source, data))
+
+    def split(values) -> Tuple[str, ...]:
+        if isinstance(values, str):
+            values = values.split(',')
+        return tuple(v.strip() for v in values or () if v.strip())
+
+    entries = []
+    for entry in data:
+        try:
+            identity = entry.get('identity')
+            transport = entry.get('transport')
+            entries.append(Host(
+                alias=str(entry['alias']), addr=str(entry['addr']),
+                username=entry.get('username') or hosts.default_username(),
+                port=int(entry.get('port', 22)),
+                jump=split(entry.get('jump')),
+                tags=tuple(sorted(set(split(entry.get('tags'))))),
+                identity=os.path.abspath(os.path.expanduser(identity))
+                if identity else None,
+                transport=TransportProfile(**transport) if transport
+                else None,
+                source=source))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise KeyError(__msg.get('err.msg.source.entry', source, entry))
+    return entries
+
+
+def fingerprint(source: InventorySource) -> Optional[tuple]:
+    """Return what identifies the current content of a file source, its
+    modification time and size. Commands have no fingerprint."""
+    if source.kind != 'file':
+        return None
+    try:
+        info = os.stat(source.location)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def is_stale(source: InventorySource, state: State,
+             now: Optional[float] = None) -> bool:
+    """Return if a source must be synced, because it was never synced, its
+    file changed or the time to live of its command expired."""
+    if source.name not in state:
+        return True
+    synced_fingerprint, synced_at = state[source.name]
+    if source.kind == 'file':
+        return fingerprint(source) != synced_fingerprint
+    now = time.time() if now is None else now
+    return now - synced_at >= source.ttl
+
+
+def load(source: InventorySource) -> List[Host]:
+    """Read the hosts of a source.
+
+    Raises:
+        KeyError: if the source could not be read or is invalid
+    """
+    try:
+        if source.kind == 'command':
+            data = run_command(source.location)
+        else:
+            data = load_file(source.location)
+    except (OSError, ValueError, subprocess.SubprocessError) as err:
+        raise KeyError(__msg.get('err.msg.source.load', source.name, err))
+    return parse_hosts(data, source.name)
+
+
+def sync(source: InventorySource, state: State,
+         force: bool = False) -> Optional[SyncResult]:
+    """Sync the hosts of a source into the store, if it is stale or
+    `force` is set. The state of the source is updated in place.
+
+    Raises:
+        KeyError: if the source could not be read or is invalid
+
+    Returns:
+        Optional[SyncResult]: None if the source was up to date
+    """
+    if not force and not is_stale(source, state):
+        return None
+    current = fingerprint(source)
+    result = hosts.sync(source.name, load(source))
+    state[source.name] = (current, time.time())
+    return result
+
+
+def sync_all(names: Iterable[str] = (), force: bool = False
+             ) -> Iterable[Tuple[InventorySource, Optional[SyncResult]]]:
+    """Sync all or the named sources. Only one process syncs at a time,
+    nothing is synced if another one holds the lock.
+
+    Yields:
+        Tuple[InventorySource, Optional[SyncResult]]: the result per
+        source, an error is logged and the source is skipped
+    """
+    names = set(names)
+    sources = [s for s in get_all_sources() if not names or s.name in names]
+    if not sources:
+        return
+    with open(pathlib.Path(Config.app_dir, 'inventories.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.info(__msg.get('sync.running'))
+            return
+        state = _read_state()
+        try:
+            for source in sources:
+                try:
+                    yield source, sync(source, state, force=force)
+                except KeyError as err:
+                    logger.error(err)
+                    # a broken source is retried once it changed or its
+                    # time to live expired, not by every command
+                    state[source.name] = (fingerprint(source), time.time())
+        finally:
+            _write_state(state)
+
+
+def refresh_stale() -> bool:
+    """Start `dsm sync` in the background if any source is stale. The
+    caller does not wait for it, the synced hosts are used by the next
+    command.
+
+    Returns:
+        bool: True if a sync was started
+    """
+    if not os.path.exists(pathlib.Path(Config.app_dir,
+                                       'inventories.pickle')):
+        return False
+    state = _read_state()
+    if not any(is_stale(s, state) for s in get_all_sources()):
+        return False
+    env = dict(os.environ)
+    env[APP_DIR_ENV] = Config.app_dir
+    subprocess.Popen([sys.executable, '-m', 'damnsshmanager', 'sync'],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, env=env,
+                     start_new_session=True)
+    return True
+
+
+def _read_state() -> State:
+    try:
+        with open(state_file(), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {}
+
+
+def _write_state(state: State):
+    path = state_file()
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp, path)
+    except OSError:
+        logger.error(__msg.get('err.msg.dump.error', str(path)))
@@ -5,15 +5,24 @@ from typing import Iterable, Optional
 
 from loguru import logger
 
-from damnsshmanager import hosts
+from damnsshmanager import completion, hosts
 from damnsshmanager.config import Config
 from damnsshmanager.model import LocalTunnel
 from damnsshmanager.storage import PickleStore
 
-_store = PickleStore(pathlib.Path(Config.app_dir, 'localtunnels.pickle'))
+# created on first use, see __store
+_store: Optional[PickleStore] = None
 __msg = Config.messages
 
 
+def __store() -> PickleStore:
+    global _store
+    if _store is None:
+        _store = PickleStore(pathlib.Path(Config.app_dir,
+                                           'localtunnels.pickle'))
+    return _store
+
+
 def __validate_ltun_args(**kwargs):
 
     # argument validation
@@ -75,24 +84,35 @@ def add(**kwargs):
     tun = LocalTunnel(gateway=gateway, alias=alias, lport=lport,
                       destination=destination, rport=rport)
     try:
-        _store.add(tun, sort=lambda t: t.alias)
+        __store().add(tun, sort=lambda t: t.alias)
+        __write_aliases()
         logger.info(__msg.get('added.ltun', tunnel=tun))
     except IOError:
-        logger.error(__msg.get('err.msg.dump.error', _store.object_file))
+        logger.error(__msg.get('err.msg.dump.error', __store().object_file))
+
+
+def __write_aliases():
+    completion.write_aliases(completion.TUNNELS,
+                             (t.alias for t in __store().get()))
+
+
+def store_file() -> pathlib.Path:
+    return __store().object_file
 
 
 def get_all_tunnels() -> Iterable:
-    return _store.get()
+    return __store().get()
 
 
 def get_tunnel(alias: str) -> Optional[LocalTunnel]:
-    return _store.unique(key=lambda t: t.alias == alias)
+    return __store().unique(key=lambda t: t.alias == alias)
 
 
 def delete(alias: str):
 
-    deleted = _store.delete(lambda t: t.alias == alias)
+    deleted = __store().delete(lambda t: t.alias == alias)
     if deleted is not None:
+        __write_aliases()
         for d in deleted:
             logger.info(__msg.get('deleted', str(d)))
     else:
@@ -1,32 +1,140 @@
-import configparser
+"""This module contains the catalog of all messages shown to the user.
+The messages are kept in `damnfiles/messages.ini`, which is only parsed
+if it changed since the last run. Otherwise the catalog is read from a
+marshalled dict inside the `cache` dir of the app dir, so it follows
+`DSM_APP_DIR` and `Config.configure` like all other files of dsm.
+"""
+import marshal
+import os
+import pathlib
 from dataclasses import dataclass, field
-from typing import Union
-from pkg_resources import resource_string
+from typing import Dict, Optional, Set, Tuple, Union
+
 from loguru import logger
 
+from damnsshmanager.config import Config
+
+# version of the cached catalog, raise it if the stored form changes
+CATALOG_VERSION = 1
+
+Catalog = Dict[str, Dict[str, str]]
+
+
+def catalog_source():
+    """Return the messages file of the package."""
+    try:
+        from importlib.resources import files
+    except ImportError:  # python 3.8
+        return pathlib.Path(__file__).parent / 'damnfiles' / 'messages.ini'
+    return files(__package__) / 'damnfiles' / 'messages.ini'
+
+
+def compile_catalog(content: str) -> Catalog:
+    """Parse the content of a messages file into a dict per section.
+    Every section contains the keys of the DEFAULT section as well.
+    """
+    import configparser
+
+    config = configparser.ConfigParser()
+    config.read_string(content)
+    return {section: dict(config[section]) for section in config}
+
+
+def catalog_cache_dir() -> str:
+    return os.path.join(Config.app_dir, 'cache')
+
+
+def _cache_key(source) -> Optional[Tuple[str, int, int]]:
+    if not isinstance(source, pathlib.Path):
+        return None
+    try:
+        info = source.stat()
+    except OSError:
+        return None
+    return str(source), info.st_mtime_ns, info.st_size
+
+
+def load_catalog(source=None,
+                 cache_dir: Optional[str] = None) -> Catalog:
+    """Load the compiled catalog from the cache dir, or parse the messages
+    file and store the compiled catalog if it changed. Catalogs that are
+    not files on disk, e.g. inside a zip, are parsed every time.
+
+    Args:
+        source: messages file, by default the one of the package
+        cache_dir (Optional[str]): directory the compiled catalog is
+        stored in, `catalog_cache_dir()` by default
+
+    Returns:
+        Catalog: messages by key per section
+    """
+    source = catalog_source() if source is None else source
+    key = _cache_key(source)
+    cache_file = None
+    if key is not None:
+        cache_dir = cache_dir or catalog_cache_dir()
+        cache_file = os.path.join(cache_dir, 'messages.marshal')
+        try:
+            with open(cache_file, 'rb') as f:
+                version, cached_key, catalog = marshal.load(f)
+            if version == CATALOG_VERSION and tuple(cached_key) == key:
+                return catalog
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    catalog = compile_catalog(source.read_text(encoding='utf-8'))
+    if cache_file is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{cache_file}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                marshal.dump((CATALOG_VERSION, key, catalog), f)
+            os.replace(tmp, cache_file)
+        except OSError:
+            pass
+    return catalog
+
 
 @dataclass
 class Messages(object):
+    """Messages of a catalog. The catalog of the package is loaded when
+    the first message is requested."""
 
-    config: configparser.ConfigParser = field(init=False)
+    _catalog: Optional[Catalog] = field(init=False)
+    # keys per section whose message contains replacement fields
+    _templates: Dict[str, Set[str]] = field(init=False)
 
-    def __init__(self):
-        content = resource_string(__name__, 'damnfiles/messages.ini')
-        content = content.decode('utf-8')
+    def __init__(self, catalog: Optional[Catalog] = None):
+        self._catalog = None
+        self._templates = {}
+        if catalog is not None:
+            self._use(catalog)
 
-        self.config = configparser.ConfigParser()
-        self.config.read_string(content)
+    @property
+    def catalog(self) -> Catalog:
+        if self._catalog is None:
+            self._use(load_catalog())
+        return self._catalog
+
+    def _use(self, catalog: Catalog):
+        self._templates = {
+            section: {k for k, v in messages.items() if '{' in v or '}' in v}
+            for section, messages in catalog.items()}
+        self._catalog = catalog
 
     def get(self, key, *args, section='DEFAULT', **kwargs) -> Union[str, None]:
         """Loads given key of a section inside the messages catalogue
         """
-        if section not in self.config:
-            logger.error('Section %s does not exist' % section)
-            return
-
-        if key not in self.config[section]:
-            logger.error('Key %s not found in section %s' % (key, section))
+        try:
+            msg = self.catalog[section][key]
+        except KeyError:
+            if section not in self.catalog:
+                logger.error('Section %s does not exist' % section)
+            else:
+                logger.error('Key %s not found in section %s' % (key,
+                                                                 section))
             return None
 
-        msg = self.config[section][key]
-        return msg.format(*args, **kwargs)
+        if key in self._templates[section]:
+            return msg.format(*args, **kwargs)
+        return msg
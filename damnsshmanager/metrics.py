@@ -0,0 +1,213 @@
+"""This module exports the reachability of hosts in the OpenMetrics text
+format, which Prometheus scrapes and the text file collector of the
+node exporter reads. Per alias the exporter reports if the ssh port is up,
+the seconds it took to connect and the time of the last check.
+
+The results are either written atomically into a file, or kept in memory
+by a `MetricsServer` that checks all hosts in an interval and answers
+scrapes from the latest results, so a scrape never waits for a check.
+
+Sample usage:
+```
+results = metrics.check(hosts.get_all_hosts())
+metrics.write(results, '/var/lib/node_exporter/dsm.prom')
+
+server = metrics.MetricsServer(hosts.get_all_hosts, port=9911)
+server.serve_forever()
+```
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from loguru import logger
+
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host
+from damnsshmanager.ssh.test import test_connection
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# result of checking one host, the latency is None if it is down
+CheckResult = namedtuple('CheckResult', 'host up latency timestamp')
+
+_msg = Config.messages
+
+
+def check(all_hosts: Iterable[Host], max_workers: int = 16,
+          test_fn: Callable[[Host], float] = test_connection
+          ) -> List[CheckResult]:
+    """Test the ssh port of all hosts, up to `max_workers` at once.
+
+    Args:
+        all_hosts (Iterable[Host]): hosts to check
+        max_workers (int): number of hosts that are checked at once
+        test_fn (Callable[[Host], float]): returns the seconds to connect
+        to a host, or raises an `OSError` or a `ValueError` for an address
+        that can not be resolved, e.g. `a..b`
+
+    Returns:
+        List[CheckResult]: results in the order of the hosts
+    """
+    def check_one(host: Host) -> CheckResult:
+        try:
+            latency = test_fn(host)
+            return CheckResult(host, True, latency, time.time())
+        except (OSError, ValueError):
+            return CheckResult(host, False, None, time.time())
+
+    all_hosts = list(all_hosts)
+    if not all_hosts:
+        return []
+    workers = max(1, min(max_workers, len(all_hosts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(check_one, all_hosts))
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def render(results: Sequence[CheckResult]) -> str:
+    """Return the results in the OpenMetrics text format."""
+    families = (
+        ('dsm_host_up', 'Whether the ssh port of the host accepted a '
+         'connection', lambda r: int(r.up)),
+        ('dsm_host_connect_seconds', 'Seconds it took to connect to the '
+         'ssh port', lambda r: r.latency),
+        ('dsm_host_last_check_timestamp_seconds', 'Unix time of the last '
+         'check of the host', lambda r: r.timestamp),
+    )
+    lines = []
+    for name, help_text, value_of in families:
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'# HELP {name} {help_text}')
+        for result in results:
+            value = value_of(result)
+            if value is None:
+                continue
+            host = result.host
+            lines.append(f'{name}{{alias="{_label(host.alias)}",'
+                         f'addr="{_label(host.addr)}",'
+                         f'port="{host.port:d}"}} {value}')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def write(results: Sequence[CheckResult], path: str):
+    """Write the results into a file. The file is replaced atomically, so
+    a collector never reads a partial file."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(render(results))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class MetricsServer:
+    """HTTP server that answers scrapes of `/metrics` with the latest
+    results. The hosts are checked in a fixed interval by `serve_forever`.
+
+    Arguments:
+        hosts_fn (Callable[[], Iterable[Host]]): returns the hosts to check,
+        called before every check so changes of the store are picked up
+        bind_addr (str): address the server is bound to
+        port (int): port of the server, 0 for any free port
+        interval (float): seconds between two checks
+        metrics_file (Optional[str]): file the results are written to as
+        well after every check
+        check_fn (Callable): checks the hosts and returns the results
+    """
+
+    def __init__(self, hosts_fn: Callable[[], Iterable[Host]],
+                 bind_addr: str = '127.0.0.1', port: int = 9911,
+                 interval: float = 60, metrics_file: Optional[str] = None,
+                 check_fn: Callable[[Iterable[Host]],
+                                    List[CheckResult]] = check):
+        self.hosts_fn = hosts_fn
+        self.interval = interval
+        self.metrics_file = metrics_file
+        self.check_fn = check_fn
+        self.results: List[CheckResult] = []
+        self._body = render([]).encode()
+        self._closed = threading.Event()
+        self._serving = False
+        self._httpd = ThreadingHTTPServer((bind_addr, port),
+                                          self._handler_class())
+        self._httpd.daemon_threads = True
+
+    @property
+    def address(self):
+        return self._httpd.server_address
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server._body
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def refresh(self) -> List[CheckResult]:
+        """Check all hosts and publish the results."""
+        results = self.check_fn(self.hosts_fn())
+        self.results = results
+        self._body = render(results).encode()
+        if self.metrics_file:
+            write(results, self.metrics_file)
+        return results
+
+    def serve_forever(self, on_refresh: Optional[
+            Callable[[List[CheckResult]], None]] = None):
+        """Serve scrapes and check the hosts until `close` is called. A
+        failed refresh, e.g. of an unwritable metrics file, is logged and
+        retried after the interval.
+
+        Args:
+            on_refresh (Optional[Callable]): called with the results of
+            every check
+        """
+        self._serving = True
+        thread = threading.Thread(target=self._httpd.serve_forever,
+                                  daemon=True)
+        thread.start()
+        try:
+            while not self._closed.is_set():
+                try:
+                    results = self.refresh()
+                    if on_refresh is not None:
+                        on_refresh(results)
+                except Exception as err:
+                    logger.error(_msg.get('err.msg.metrics.refresh', err))
+                self._closed.wait(self.interval)
+        finally:
+            self._httpd.shutdown()
+            thread.join()
+            self._httpd.server_close()
+
+    def close(self):
+        """Stop `serve_forever`, the socket is closed once it returned."""
+        self._closed.set()
+        if not self._serving:
+            self._httpd.server_close()
@@ -1,5 +1,14 @@
 from collections import namedtuple
 
-Host = namedtuple('Host', 'alias addr username port')
+# source is the name of the inventory source a host was synced from
+Host = namedtuple('Host', 'alias addr username port jump tags identity '
+                  'transport source', defaults=((), (), None, None, None))
+TransportProfile = namedtuple(
+    'TransportProfile',
+    'ciphers macs compression window_size max_packet_size keepalive',
+    defaults=((), (), None, None, None, None))
 LocalTunnel = namedtuple(
     'LocalTunnel', 'gateway alias lport destination rport')
+# kind is either file (JSON or YAML) or command (prints JSON)
+InventorySource = namedtuple('InventorySource', 'name kind location ttl')
+SyncResult = namedtuple('SyncResult', 'added updated removed conflicts')
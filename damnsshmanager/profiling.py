@@ -0,0 +1,89 @@
+"""This module profiles a command of the cli with cProfile. The profile is
+written into the `profiles` directory of the app dir, where it can be
+inspected with `python -m pstats` or tools like snakeviz, and the functions
+that took the most time are reported.
+
+Sample usage:
+```
+result = profiling.Profile('list_objects')
+with result:
+    list_objects(args)
+for line in result.report():
+    print(line)
+path = result.save()
+```
+"""
+import cProfile
+import os
+import pathlib
+import pstats
+import time
+from typing import List, Optional
+
+from damnsshmanager.config import Config
+
+PROFILE_ENV = 'DSM_PROFILE'
+
+# number of functions that are reported
+TOP = 20
+
+
+def requested(flag: bool = False) -> bool:
+    """Return if profiling was requested by a flag or by the environment
+    variable `DSM_PROFILE`, which is set to anything but 0."""
+    return flag or os.environ.get(PROFILE_ENV, '0') not in ('', '0')
+
+
+def profile_dir() -> pathlib.Path:
+    return pathlib.Path(Config.app_dir, 'profiles')
+
+
+class Profile:
+    """Profile of one command, that is taken while the profile is entered
+    as a context manager.
+
+    Arguments:
+        name (str): name of the command, used in the file name
+        directory (Optional[pathlib.Path]): directory of the profile, the
+        `profiles` directory of the app dir by default
+    """
+
+    def __init__(self, name: str, directory: Optional[pathlib.Path] = None):
+        self.name = name
+        self.directory = directory or profile_dir()
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self) -> 'Profile':
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        self.profiler.disable()
+
+    def save(self) -> pathlib.Path:
+        """Dump the statistics in the format of `pstats`.
+
+        Raises:
+            OSError: if the file could not be written
+
+        Returns:
+            pathlib.Path: the written file
+        """
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = self.directory / f'{self.name}-{stamp}-{os.getpid()}.prof'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(str(path))
+        return path
+
+    def report(self, top: int = TOP) -> List[str]:
+        """Return the functions with the highest own time, one per line,
+        with the number of calls, the own and the cumulative seconds."""
+        stats = pstats.Stats(self.profiler).stats  # type: ignore
+        entries = sorted(stats.items(), key=lambda e: e[1][2],
+                         reverse=True)[:top]
+        lines = [f'{"calls":>9s} {"own s":>8s} {"cum s":>8s}  function']
+        for (filename, line, func), (_, calls, own, cum, _) in entries:
+            location = func if filename == '~' \
+                else f'{func} ({filename}:{line:d})'
+            lines.append(f'{calls:9d} {own:8.3f} {cum:8.3f}  {location}')
+        return lines
@@ -0,0 +1,149 @@
+"""This module contains the recording of interactive sessions into
+gzip compressed asciicast v2 files
+(https://docs.asciinema.org/manual/asciicast/v2/), that can be replayed
+with `zcat <file> | asciinema play -`.
+
+Output chunks are only appended to a bounded ring buffer by the
+interactive loop. A background thread drains the buffer and writes the
+events in batches into a gzip compressed file, so recording does not
+add file I/O to the echo of a keystroke.
+
+Sample usage:
+```
+with SessionRecorder(recording_path('alias'), width=80, height=24) as rec:
+    rec.output(b'some bytes written to the terminal')
+```
+"""
+import codecs
+import collections
+import gzip
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Deque, Optional, Tuple
+
+from loguru import logger
+
+from damnsshmanager.config import Config
+
+_msg = Config.messages
+
+
+def recording_path(alias: str) -> pathlib.Path:
+    """Return the path of a new recording of a session to given alias
+    inside the recordings directory of the app dir.
+
+    Args:
+        alias (str): alias of the host the session is opened to
+
+    Returns:
+        pathlib.Path: path of the recording
+    """
+    directory = pathlib.Path(Config.app_dir, 'recordings')
+    directory.mkdir(mode=0o700, exist_ok=True)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    return directory.joinpath(f'{alias}-{timestamp}.cast.gz')
+
+
+class SessionRecorder:
+    """A session recorder writes all output chunks of a session into an
+    asciicast v2 file.
+
+    Arguments:
+        path (pathlib.Path): file the recording is written to
+        width (int): number of columns of the terminal
+        height (int): number of lines of the terminal
+        term (Optional[str]): value of TERM of the session
+        capacity (int): number of chunks the ring buffer holds. The writer
+        is woken up early once it is half full. If the writer still can not
+        keep up, the oldest chunks are dropped.
+        flush_interval (float): seconds between two batches of the writer
+    """
+
+    def __init__(self, path: pathlib.Path, width: int = 80, height: int = 24,
+                 term: Optional[str] = None, capacity: int = 8192,
+                 flush_interval: float = 0.5):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.term = term
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer: Deque[Tuple[float, bytes]] = collections.deque(
+            maxlen=capacity)
+        self._capacity = capacity
+        self._started = 0.0
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        self.close()
+
+    def start(self):
+        self._started = time.monotonic()
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._write_loop,
+                                        name='session-recorder',
+                                        daemon=True)
+        self._writer.start()
+
+    def output(self, data: bytes):
+        """Record data that was written to the terminal. This is called
+        from the interactive loop and must be as cheap as possible.
+
+        Args:
+            data (bytes): raw bytes written to the terminal
+        """
+        size = len(self._buffer)
+        if size == self._capacity:
+            self.dropped += 1
+        elif size == self._capacity // 2:
+            self._wakeup.set()
+        self._buffer.append((time.monotonic() - self._started, data))
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._writer.join()
+        self._writer = None
+        if self.dropped:
+            logger.warning(_msg.get('err.msg.record.dropped',
+                                     self.dropped, str(self.path)))
+
+    def _header(self) -> dict:
+        header = {'version': 2, 'width': self.width, 'height': self.height,
+                  'timestamp': int(time.time())}
+        if self.term:
+            header['env'] = {'TERM': self.term}
+        return header
+
+    def _write_loop(self):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as raw, \
+                gzip.open(raw, 'wt', encoding='utf-8') as cast:
+            cast.write(json.dumps(self._header()))
+            cast.write('\n')
+            stopped = False
+            while not stopped:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                stopped = self._stop.is_set()
+                lines = []
+                while self._buffer:
+                    offset, data = self._buffer.popleft()
+                    text = decoder.decode(data)
+                    if text:
+                        lines.append(json.dumps([round(offset, 6), 'o', text]))
+                if lines:
+                    lines.append('')
+                    cast.write('\n'.join(lines))
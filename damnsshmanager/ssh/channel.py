@@ -1,4 +1,4 @@
-from typing import Optional, Protocol
+from typing import Optional, Protocol, Sequence
 
 from damnsshmanager.model import LocalTunnel, Host
 
@@ -8,7 +8,8 @@ class SSHChannel(Protocol):
     shell should be opened to a remote host.
     """
 
-    def open(self, host: Host, ltun: Optional[LocalTunnel] = None) -> None:
+    def open(self, host: Host, ltun: Optional[LocalTunnel] = None,
+             jump: Sequence[Host] = ()) -> None:
         """Open a new channel to target host opening an optional
         local tunnel.
 
@@ -16,4 +17,6 @@ class SSHChannel(Protocol):
             host (Host): Host where the channel should be opened to
             ltun (Optional[LocalTunnel]): Optional local tunnel for port
             forwarding
+            jump (Sequence[Host]): Hosts that are jumped through in the
+            given order to reach the host
         """
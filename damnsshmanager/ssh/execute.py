@@ -0,0 +1,126 @@
+"""This module contains the execution of one command on many hosts at
+once. Every host is connected to on a thread of a bounded pool, the
+command is run with `exec_command` and its output is streamed back line
+by line, prefixed with the alias of the host.
+
+Sample usage:
+```
+results = execute.run(hosts.find_hosts('web*'), 'uptime')
+```
+"""
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, TextIO
+
+import paramiko
+
+from damnsshmanager.model import Host
+from damnsshmanager.ssh.paramiko import IO_BUFFER_SIZE, connect_client
+
+ExecResult = namedtuple('ExecResult', 'alias status error elapsed')
+
+
+class PrefixWriter:
+    """Writes complete lines of many hosts to one output. Every line is
+    prefixed with the alias of the host it belongs to.
+
+    Arguments:
+        output (TextIO): output all lines are written to
+        width (int): width the aliases are padded to
+    """
+
+    def __init__(self, output: TextIO = sys.stdout, width: int = 0):
+        self.output = output
+        self.width = width
+        self._lock = threading.Lock()
+
+    def write(self, alias: str, lines: Sequence[str]):
+        prefix = f'{alias:<{self.width}s} | '
+        text = ''.join(f'{prefix}{line}\n' for line in lines)
+        with self._lock:
+            self.output.write(text)
+            self.output.flush()
+
+
+def stream_lines(chan: paramiko.Channel, alias: str, writer: PrefixWriter):
+    """Read all output of given channel and pass every complete line to
+    the writer. A last line without line break is passed once the channel
+    is closed.
+    """
+    pending = b''
+    while True:
+        data = chan.recv(IO_BUFFER_SIZE)
+        if not data:
+            break
+        *lines, pending = (pending + data).split(b'\n')
+        if lines:
+            writer.write(alias, [line.decode('utf-8', 'replace')
+                                 for line in lines])
+    if pending:
+        writer.write(alias, [pending.decode('utf-8', 'replace')])
+
+
+def run_on_host(host: Host, command: str, writer: PrefixWriter,
+                connect: Callable[..., paramiko.SSHClient] = connect_client,
+                jump_fn: Optional[Callable[[Host], Sequence[Host]]] = None
+                ) -> ExecResult:
+    """Run the command on one host and stream its output to the writer.
+    Output of stderr is merged into stdout.
+
+    Returns:
+        ExecResult: exit status of the command or the error that
+        prevented it from running
+    """
+    started = time.monotonic()
+    try:
+        jump = jump_fn(host) if jump_fn else ()
+        client = connect(host, jump=jump)
+        with client:
+            chan = client.get_transport().open_session()
+            chan.set_combine_stderr(True)
+            chan.exec_command(command)
+            stream_lines(chan, host.alias, writer)
+            status = chan.recv_exit_status()
+        return ExecResult(host.alias, status, None,
+                          time.monotonic() - started)
+    except (paramiko.SSHException, OSError, KeyError) as err:
+        if isinstance(err, KeyError) and err.args:
+            error = str(err.args[0])
+        else:
+            error = str(err) or type(err).__name__
+        return ExecResult(host.alias, None, error,
+                          time.monotonic() - started)
+
+
+def run(hosts: Sequence[Host], command: str, max_workers: int = 16,
+        output: TextIO = sys.stdout,
+        connect: Callable[..., paramiko.SSHClient] = connect_client,
+        jump_fn: Optional[Callable[[Host], Sequence[Host]]] = None
+        ) -> List[ExecResult]:
+    """Run a command on all given hosts in parallel.
+
+    Args:
+        hosts (Sequence[Host]): hosts to run the command on
+        command (str): command line passed to the remote shell
+        max_workers (int): maximum number of hosts connected at once
+        output (TextIO): output the prefixed lines are written to
+        connect (Callable): function that returns a connected
+        `paramiko.SSHClient` for a host and `jump` keyword argument
+        jump_fn (Optional[Callable]): function that returns the jump
+        chain of a host
+
+    Returns:
+        List[ExecResult]: results in the order of the hosts
+    """
+    if not hosts:
+        return []
+    writer = PrefixWriter(output, width=max(len(h.alias) for h in hosts))
+    workers = max(1, min(max_workers, len(hosts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_on_host, host, command, writer, connect,
+                               jump_fn)
+                   for host in hosts]
+        return [f.result() for f in futures]
@@ -0,0 +1,388 @@
+"""This module contains local port forwarding on top of paramiko
+transports. A `TunnelServer` only listens on the local port of every
+registered `LocalTunnel`. The ssh connection to the gateway of a tunnel is
+made by its `GatewaySession` when the first client connects and is closed
+again after the session was idle for a while.
+
+Connections are probed with keepalive requests. A connection that does
+not answer is dropped and made again with a jittered exponential backoff,
+while the listeners stay bound. Clients only see a stall instead of a
+refused connection when the gateway is restarted or NAT state expires.
+
+Sample usage:
+```
+server = forward.TunnelServer(idle_timeout=300)
+server.add(ltun, hosts.get_host(ltun.gateway))
+server.serve_forever()
+```
+"""
+import random
+import select
+import selectors
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import paramiko
+from loguru import logger
+
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host, LocalTunnel
+from damnsshmanager.ssh.paramiko import connect_client
+
+_msg = Config.messages
+
+BUFFER_SIZE = 32768
+KEEPALIVE_REQUEST = 'keepalive@openssh.com'
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0,
+                  rand: Callable[[], float] = random.random) -> float:
+    """Return the delay before reconnect attempt `attempt`, a random value
+    up to `base * 2 ** attempt`, but at most `cap` ("full jitter").
+    """
+    return rand() * min(cap, base * 2 ** attempt)
+
+
+@dataclass
+class GatewaySession:
+    """A gateway session holds the lazily created ssh connection to one
+    gateway host. Every forwarded client holds a reference on the session,
+    the connection is closed by `reap` once no client used it for
+    `idle_timeout` seconds.
+
+    Arguments:
+        host (Host): gateway host the connection is made to
+        connect (Callable): function that returns a connected
+        `paramiko.SSHClient` for given host and `jump` keyword argument
+        idle_timeout (float): seconds without any client after which the
+        connection is closed
+        jump (Sequence[Host]): hosts that are jumped through to reach the
+        gateway
+        keepalive (float): seconds between two liveness probes of the
+        connection, 0 disables probing
+        probe_timeout (float): seconds a probe waits for an answer
+        reconnect_timeout (float): seconds reconnects are retried before
+        the waiting clients are given up
+        max_backoff (float): maximum delay between two reconnects
+        sleep (Callable[[float], None]): function that waits between two
+        reconnects
+    """
+
+    host: Host
+    connect: Callable[..., paramiko.SSHClient] = connect_client
+    idle_timeout: float = 300.0
+    jump: Sequence[Host] = ()
+    keepalive: float = 30.0
+    probe_timeout: float = 10.0
+    reconnect_timeout: float = 30.0
+    max_backoff: float = 10.0
+    sleep: Callable[[float], None] = field(default=time.sleep, repr=False)
+    _client: Optional[paramiko.SSHClient] = field(init=False, default=None)
+    _clients: int = field(init=False, default=0)
+    _idle_since: float = field(init=False, default_factory=time.monotonic)
+    _last_probe: float = field(init=False, default_factory=time.monotonic)
+    _probing: bool = field(init=False, default=False)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+    _connect_lock: threading.Lock = field(init=False,
+                                          default_factory=threading.Lock)
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    def open_channel(self, destination: str, rport: int,
+                     src_addr: Tuple[str, int]) -> paramiko.Channel:
+        """Open a new `direct-tcpip` channel to the destination, connecting
+        to the gateway first if required. Every opened channel must be
+        followed by a call to `release`.
+
+        Args:
+            destination (str): host the gateway connects to
+            rport (int): port on the destination
+            src_addr (Tuple[str, int]): address of the local client
+
+        Returns:
+            paramiko.Channel: channel forwarding to the destination
+        """
+        with self._lock:
+            self._clients += 1
+        try:
+            transport = self._transport()
+            return transport.open_channel('direct-tcpip',
+                                          (destination, rport), src_addr)
+        except Exception:
+            self.release()
+            raise
+
+    def _transport(self) -> paramiko.Transport:
+        # only one client reconnects, all others wait for it
+        with self._connect_lock:
+            with self._lock:
+                client = self._client
+            transport = client.get_transport() if client else None
+            if transport is not None and transport.is_active():
+                return transport
+            if client is not None:
+                client.close()
+            logger.info(_msg.get('lazy.connect', self.host.alias))
+            client = self._reconnect()
+            with self._lock:
+                self._client = client
+                self._last_probe = time.monotonic()
+            return client.get_transport()
+
+    def _reconnect(self) -> paramiko.SSHClient:
+        deadline = time.monotonic() + self.reconnect_timeout
+        attempt = 0
+        while True:
+            try:
+                return self.connect(self.host, jump=self.jump)
+            except (paramiko.AuthenticationException,
+                    paramiko.BadHostKeyException):
+                raise
+            except (paramiko.SSHException, OSError) as err:
+                delay = backoff_delay(attempt, cap=self.max_backoff)
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.warning(_msg.get('lazy.reconnect', self.host.alias,
+                                        str(err), delay))
+                self.sleep(delay)
+                attempt += 1
+
+    def probe(self) -> bool:
+        """Send a keepalive request over the connection and wait up to
+        `probe_timeout` seconds for any answer. A connection that does not
+        answer is closed, which ends all channels on it. The next client
+        makes a new connection.
+
+        Returns:
+            bool: True if the connection answered
+        """
+        with self._lock:
+            client = self._client
+        transport = client.get_transport() if client else None
+        if transport is None:
+            return False
+        answered = threading.Event()
+        if not transport.is_active():
+            timeout = 0.0
+        else:
+            timeout = self.probe_timeout
+
+            def request():
+                transport.global_request(KEEPALIVE_REQUEST, wait=True)
+                if transport.is_active():
+                    answered.set()
+
+            threading.Thread(target=request, daemon=True).start()
+        alive = answered.wait(timeout)
+        if not alive:
+            with self._lock:
+                if self._client is client:
+                    self._client = None
+            logger.warning(_msg.get('lazy.dead', self.host.alias))
+            client.close()
+        return alive
+
+    def check(self, now: Optional[float] = None):
+        """Start a probe in the background if the last one is older than
+        `keepalive` seconds."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._client is None or self._probing or not self.keepalive:
+                return
+            if now - self._last_probe < self.keepalive:
+                return
+            self._probing = True
+            self._last_probe = now
+
+        def run():
+            try:
+                self.probe()
+            finally:
+                with self._lock:
+                    self._probing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def release(self):
+        with self._lock:
+            self._clients -= 1
+            if self._clients == 0:
+                self._idle_since = time.monotonic()
+
+    def reap(self, now: Optional[float] = None) -> bool:
+        """Close the connection if the session was idle for too long.
+
+        Args:
+            now (Optional[float]): current value of `time.monotonic`
+
+        Returns:
+            bool: True if the connection was closed
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._client is None or self._clients > 0:
+                return False
+            if now - self._idle_since < self.idle_timeout:
+                return False
+            logger.info(_msg.get('lazy.teardown', self.host.alias))
+            self._client.close()
+            self._client = None
+            return True
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+def pipe(sock: socket.socket, chan: paramiko.Channel):
+    """Copy data between a local socket and a channel until one side
+    closes the connection.
+
+    Args:
+        sock (socket.socket): socket of the local client
+        chan (paramiko.Channel): channel to the remote destination
+    """
+    while True:
+        r_list, _, _ = select.select([sock, chan], [], [])
+        if sock in r_list:
+            data = sock.recv(BUFFER_SIZE)
+            if not data:
+                break
+            chan.sendall(data)
+        if chan in r_list:
+            data = chan.recv(BUFFER_SIZE)
+            if not data:
+                break
+            sock.sendall(data)
+
+
+class TunnelServer:
+    """A tunnel server listens on the local ports of all added tunnels.
+    Incoming clients are forwarded through the `GatewaySession` of the
+    gateway of the tunnel. Sessions are shared between all tunnels that
+    use the same gateway.
+
+    Arguments:
+        idle_timeout (float): seconds after which unused gateway
+        connections are closed
+        connect (Callable): function that returns a connected
+        `paramiko.SSHClient` for given host and `jump` keyword argument
+        bind_addr (str): local address the listeners are bound to
+        keepalive (float): seconds between two liveness probes of a
+        gateway connection, unless the gateway has its own keepalive
+        setting. 0 disables probing.
+    """
+
+    def __init__(self, idle_timeout: float = 300.0,
+                 connect: Callable[..., paramiko.SSHClient] = connect_client,
+                 bind_addr: str = '127.0.0.1', keepalive: float = 30.0):
+        self.idle_timeout = idle_timeout
+        self.bind_addr = bind_addr
+        self.keepalive = keepalive
+        self._connect = connect
+        self._sessions: Dict[str, GatewaySession] = {}
+        self._listeners: List[socket.socket] = []
+        self._selector = selectors.DefaultSelector()
+        self._stop = threading.Event()
+
+    @property
+    def sessions(self) -> List[GatewaySession]:
+        return list(self._sessions.values())
+
+    def add(self, ltun: LocalTunnel, gateway: Host,
+            jump: Sequence[Host] = ()):
+        """Start listening on the local port of given tunnel.
+
+        Args:
+            ltun (LocalTunnel): tunnel to listen for
+            gateway (Host): gateway host of the tunnel
+            jump (Sequence[Host]): hosts that are jumped through to reach
+            the gateway
+        """
+        session = self._sessions.get(gateway.alias)
+        if session is None:
+            keepalive = self.keepalive
+            if gateway.transport is not None and gateway.transport.keepalive:
+                keepalive = gateway.transport.keepalive
+            session = GatewaySession(gateway, connect=self._connect,
+                                     idle_timeout=self.idle_timeout,
+                                     jump=jump, keepalive=keepalive)
+            self._sessions[gateway.alias] = session
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((self.bind_addr, ltun.lport))
+            sock.listen()
+        except OSError:
+            sock.close()
+            raise
+        sock.setblocking(False)
+        self._listeners.append(sock)
+        self._selector.register(sock, selectors.EVENT_READ, (ltun, session))
+        logger.info(_msg.get('lazy.listen', tunnel=ltun))
+
+    def serve_forever(self, poll_interval: float = 1.0):
+        """Accept clients until `shutdown` is called. Idle gateway sessions
+        are closed and liveness probes are started every `poll_interval`
+        seconds.
+        """
+        self._stop.clear()
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=poll_interval):
+                ltun, session = key.data
+                self._accept(key.fileobj, ltun, session)
+            now = time.monotonic()
+            for session in self.sessions:
+                if not session.reap(now):
+                    session.check(now)
+
+    def shutdown(self):
+        self._stop.set()
+
+    def close(self):
+        for sock in self._listeners:
+            self._selector.unregister(sock)
+            sock.close()
+        self._listeners = []
+        for session in self.sessions:
+            session.close()
+        self._selector.close()
+
+    def _accept(self, sock: socket.socket, ltun: LocalTunnel,
+                session: GatewaySession):
+        try:
+            client, addr = sock.accept()
+        except BlockingIOError:
+            return
+        client.setblocking(True)
+        worker = threading.Thread(target=self._forward,
+                                  args=(client, addr, ltun, session),
+                                  daemon=True)
+        worker.start()
+
+    @staticmethod
+    def _forward(client: socket.socket, addr: Tuple[str, int],
+                 ltun: LocalTunnel, session: GatewaySession):
+        try:
+            chan = session.open_channel(ltun.destination, ltun.rport, addr)
+        except (paramiko.SSHException, OSError) as err:
+            logger.error(_msg.get('err.msg.forward', ltun.alias, str(err)))
+            client.close()
+            return
+
+        try:
+            pipe(client, chan)
+        except OSError as err:
+            logger.error(_msg.get('err.msg.forward', ltun.alias, str(err)))
+        finally:
+            chan.close()
+            client.close()
+            session.release()
@@ -0,0 +1,180 @@
+"""This module contains the private keys used for authentication with
+the paramiko provider. Keys are read and decrypted once per process and
+kept in memory, so connecting to many hosts does not repeat the file I/O
+and the key derivation of an encrypted key for every connection.
+
+The keys offered to a host are its own identity file, the keys of a
+running ssh-agent and the default identities inside ~/.ssh, in that
+order. Keys are only loaded once they are needed.
+
+Sample usage:
+```
+client = keys.KeyAuthClient(keys.key_cache.identities(host))
+client.connect(host.addr, port=host.port, username=host.username)
+```
+"""
+import getpass
+import io
+import os
+import threading
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+import paramiko
+from loguru import logger
+from paramiko import PKey
+
+from damnsshmanager import timings
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host
+
+_msg = Config.messages
+
+DEFAULT_IDENTITIES = ('~/.ssh/id_ed25519', '~/.ssh/id_ecdsa', '~/.ssh/id_rsa',
+                      '~/.ssh/id_dsa')
+KEY_CLASSES = (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey,
+               paramiko.DSSKey)
+
+
+def ask_passphrase(path: str) -> str:
+    return getpass.getpass(_msg.get('key.passphrase', path) + ' ')
+
+
+def read_key(path: str, passphrase: Callable[[str], str]) -> PKey:
+    """Read a private key file of any supported type. The passphrase is
+    only asked for if the key is encrypted.
+
+    Raises:
+        paramiko.SSHException: if the file contains no valid key or the
+        passphrase is wrong
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = f.read()
+    password = None
+    error: Optional[paramiko.SSHException] = None
+    for key_class in KEY_CLASSES:
+        try:
+            return key_class.from_private_key(io.StringIO(data), password)
+        except paramiko.PasswordRequiredException:
+            password = passphrase(path)
+            try:
+                return key_class.from_private_key(io.StringIO(data), password)
+            except paramiko.SSHException as err:
+                error = err
+        except paramiko.SSHException as err:
+            error = err
+    raise error or paramiko.SSHException(path)
+
+
+class SharedAgent(paramiko.Agent):
+    """Connection to the ssh-agent that may be shared by threads. The
+    requests of the agent protocol are answered in order, so one request is
+    sent at a time."""
+
+    def __init__(self):
+        self._request_lock = threading.Lock()
+        super().__init__()
+
+    def _send_message(self, msg):
+        with self._request_lock:
+            return super()._send_message(msg)
+
+
+class KeyCache:
+    """In memory cache of private keys and the keys of the ssh-agent.
+
+    Arguments:
+        passphrase (Callable[[str], str]): function that returns the
+        passphrase of an encrypted key file
+        use_agent (bool): offer the keys of a running ssh-agent
+        default_identities (Sequence[str]): key files offered to every host
+    """
+
+    def __init__(self, passphrase: Callable[[str], str] = ask_passphrase,
+                 use_agent: bool = True,
+                 default_identities: Sequence[str] = DEFAULT_IDENTITIES):
+        self.passphrase = passphrase
+        self.use_agent = use_agent
+        self.default_identities = default_identities
+        self._keys: Dict[str, Optional[PKey]] = {}
+        self._agent: Optional[SharedAgent] = None
+        self._lock = threading.Lock()
+
+    def load(self, path: str) -> Optional[PKey]:
+        """Return the key of given file. A file that can not be read is
+        only tried once.
+
+        Args:
+            path (str): path of the private key file
+
+        Returns:
+            Optional[PKey]: the key or None if it could not be read
+        """
+        path = os.path.expanduser(path)
+        with self._lock:
+            if path not in self._keys:
+                try:
+                    self._keys[path] = read_key(path, self.passphrase)
+                except (OSError, paramiko.SSHException) as err:
+                    logger.error(_msg.get('err.msg.key.load', path, str(err)))
+                    self._keys[path] = None
+            return self._keys[path]
+
+    def agent_keys(self) -> Sequence[PKey]:
+        """Return the keys of the ssh-agent. One connection to the agent is
+        opened per cache, its keys sign through it until `clear`."""
+        if not self.use_agent:
+            return ()
+        with self._lock:
+            if self._agent is None:
+                self._agent = SharedAgent()
+            return self._agent.get_keys()
+
+    def identities(self, host: Host) -> Iterator[PKey]:
+        """Yield all keys offered to given host."""
+        if host.identity:
+            key = self.load(host.identity)
+            if key is not None:
+                yield key
+        yield from self.agent_keys()
+        for path in self.default_identities:
+            if os.path.exists(os.path.expanduser(path)):
+                key = self.load(path)
+                if key is not None:
+                    yield key
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            if self._agent is not None:
+                self._agent.close()
+                self._agent = None
+
+
+key_cache = KeyCache()
+
+
+class KeyAuthClient(paramiko.SSHClient):
+    """Client that authenticates with given keys only, instead of looking
+    for keys on every connection.
+
+    Arguments:
+        keys (Iterable[PKey]): keys offered to the server in order
+    """
+
+    def __init__(self, keys: Iterable[PKey]):
+        super().__init__()
+        self.keys = keys
+
+    def _auth(self, username, *args, **kwargs):
+        transport = self.get_transport()
+        error: Optional[Exception] = None
+        with timings.phase('auth'):
+            for key in self.keys:
+                try:
+                    if not transport.auth_publickey(username, key):
+                        return
+                except paramiko.SSHException as err:
+                    error = err
+        if error is not None:
+            raise error
+        raise paramiko.SSHException('No authentication methods available')
@@ -0,0 +1,211 @@
+"""This module contains a cache of known hosts files. Instead of parsing
+every line and every key of the known hosts files on each connection, an
+index from hostnames to their keys is built once and stored inside the
+app dir. The index is rebuilt whenever the modification time or size of
+one of the files changes.
+
+Hashed entries can not be indexed by hostname. The salted hashes are
+kept in a list, that is only searched for hostnames that are not found
+in the index. The result of the search is stored with the index as well.
+
+Sample usage:
+```
+cache = knownhosts.get_cache(['~/.ssh/known_hosts'])
+keys = cache.lookup(knownhosts.host_key_name('example.com', 22))
+```
+"""
+import base64
+import hashlib
+import hmac
+import os
+import pathlib
+import pickle
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import paramiko
+from loguru import logger
+from paramiko.hostkeys import HostKeyEntry
+
+from damnsshmanager.config import Config
+
+_msg = Config.messages
+
+# (keytype, base64 encoded key) as written inside known hosts files
+KeyEntry = Tuple[str, str]
+
+
+def host_key_name(hostname: str, port: int) -> str:
+    """Return the name host keys of given host are stored with."""
+    if port == 22:
+        return hostname
+    return f'[{hostname}]:{port:d}'
+
+
+class KnownHostsCache:
+    """Index of the host keys of one or more known hosts files. New keys
+    are appended to the first file.
+
+    Arguments:
+        paths (Sequence[str]): known hosts files, the first is written to
+        cache_file (pathlib.Path): file the index is stored in
+    """
+
+    def __init__(self, paths: Sequence[str], cache_file: pathlib.Path):
+        self.paths = [os.path.expanduser(p) for p in paths]
+        self.cache_file = cache_file
+        self._sources: List[Tuple[str, int, int]] = []
+        self._plain: Dict[str, List[KeyEntry]] = {}
+        self._hashed: List[Tuple[bytes, bytes, KeyEntry]] = []
+        self._resolved: Dict[str, List[KeyEntry]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, hostname: str) -> Dict[str, paramiko.PKey]:
+        """Return all known keys of given host.
+
+        Args:
+            hostname (str): name of the host as returned by `host_key_name`
+
+        Returns:
+            Dict[str, paramiko.PKey]: keys by their key type
+        """
+        with self._lock:
+            self._load()
+            entries = self._plain.get(hostname)
+            if entries is None:
+                entries = self._resolved.get(hostname)
+            if entries is None:
+                entries = self._search_hashed(hostname)
+                self._resolved[hostname] = entries
+                self._store()
+        keys = {}
+        for keytype, key in entries:
+            entry = HostKeyEntry.from_line(f'{hostname} {keytype} {key}')
+            if entry is not None and entry.key is not None:
+                keys[keytype] = entry.key
+        return keys
+
+    def add(self, hostname: str, key: paramiko.PKey):
+        """Append the key of a host to the first known hosts file."""
+        entry = (key.get_name(), key.get_base64())
+        with self._lock:
+            self._load()
+            path = self.paths[0]
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f'{hostname} {entry[0]} {entry[1]}\n')
+            self._plain.setdefault(hostname, []).append(entry)
+            self._resolved.pop(hostname, None)
+            self._sources = self._stat_sources()
+            self._store()
+
+    def _stat_sources(self) -> List[Tuple[str, int, int]]:
+        sources = []
+        for path in self.paths:
+            try:
+                info = os.stat(path)
+                sources.append((path, info.st_mtime_ns, info.st_size))
+            except OSError:
+                sources.append((path, 0, -1))
+        return sources
+
+    def _load(self):
+        sources = self._stat_sources()
+        if sources == self._sources:
+            return
+        try:
+            with open(self.cache_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached['sources'] == sources:
+                self._sources = sources
+                self._plain = cached['plain']
+                self._hashed = cached['hashed']
+                self._resolved = cached['resolved']
+                return
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+            pass
+        self._build(sources)
+
+    def _build(self, sources: List[Tuple[str, int, int]]):
+        self._plain, self._hashed, self._resolved = {}, [], {}
+        for path, _, size in sources:
+            if size < 0:
+                logger.debug(_msg.get('err.msg.io.known_hosts', path))
+                continue
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    self._parse(line)
+        self._sources = sources
+        self._store()
+
+    def _parse(self, line: str):
+        fields = line.split()
+        if len(fields) < 3 or fields[0].startswith(('#', '@')):
+            return
+        names, entry = fields[0], (fields[1], fields[2])
+        for name in names.split(','):
+            if name.startswith('|1|'):
+                try:
+                    salt, digest = name[3:].split('|')
+                    self._hashed.append((base64.b64decode(salt),
+                                         base64.b64decode(digest), entry))
+                except ValueError:
+                    continue
+            else:
+                self._plain.setdefault(name, []).append(entry)
+
+    def _search_hashed(self, hostname: str) -> List[KeyEntry]:
+        name = hostname.encode()
+        return [entry for salt, digest, entry in self._hashed
+                if hmac.compare_digest(
+                    hmac.new(salt, name, hashlib.sha1).digest(), digest)]
+
+    def _store(self):
+        tmp = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump({'sources': self._sources, 'plain': self._plain,
+                             'hashed': self._hashed,
+                             'resolved': self._resolved}, f)
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            logger.debug(_msg.get('err.msg.dump.error', str(self.cache_file)))
+
+
+class CachedAutoAddPolicy(paramiko.MissingHostKeyPolicy):
+    """Adds unknown host keys to the client and appends them to the
+    known hosts file of the cache."""
+
+    def __init__(self, cache: KnownHostsCache):
+        self.cache = cache
+
+    def missing_host_key(self, client, hostname, key):
+        client.get_host_keys().add(hostname, key.get_name(), key)
+        self.cache.add(hostname, key)
+
+
+_caches: Dict[Tuple[str, ...], KnownHostsCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(paths: Sequence[str],
+              cache_file: Optional[pathlib.Path] = None) -> KnownHostsCache:
+    """Return the cache of given known hosts files, that is shared by all
+    connections of this process.
+
+    Args:
+        paths (Sequence[str]): known hosts files, the first is written to
+        cache_file (Optional[pathlib.Path]): file the index is stored in,
+        by default a file inside the app dir that is unique per paths
+    """
+    paths = tuple(dict.fromkeys(os.path.expanduser(p) for p in paths))
+    with _caches_lock:
+        cache = _caches.get(paths)
+        if cache is None:
+            if cache_file is None:
+                digest = hashlib.sha1('\0'.join(paths).encode()).hexdigest()
+                cache_file = pathlib.Path(Config.app_dir,
+                                          f'known_hosts.{digest[:12]}.cache')
+            cache = KnownHostsCache(paths, cache_file)
+            _caches[paths] = cache
+        return cache
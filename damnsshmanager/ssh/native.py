@@ -1,16 +1,67 @@
+import os
 import subprocess
+import sys
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import List, Optional, Sequence
 
 from loguru import logger
 
-from damnsshmanager.model import Host, LocalTunnel
+from damnsshmanager import timings
+from damnsshmanager.model import Host, LocalTunnel, TransportProfile
 from damnsshmanager.ssh.channel import SSHChannel
 
 
+def ssh_options(profile: TransportProfile) -> List[str]:
+    """Return the `-o` options of ssh for a transport profile. OpenSSH has
+    no options for the window and packet sizes, so these are only used by
+    the application provider."""
+    options = []
+    if profile.ciphers:
+        options += ['-o', 'Ciphers=' + ','.join(profile.ciphers)]
+    if profile.macs:
+        options += ['-o', 'MACs=' + ','.join(profile.macs)]
+    if profile.compression is not None:
+        options += ['-o', 'Compression=' +
+                    ('yes' if profile.compression else 'no')]
+    if profile.keepalive:
+        options += ['-o', f'ServerAliveInterval={profile.keepalive:d}']
+    return options
+
+
+def ssh_command(host: Host, ltun: Optional[LocalTunnel] = None,
+                jump: Sequence[Host] = ()) -> List[str]:
+    """Return the argument vector of ssh to open a shell on a host,
+    forwarding the port of an optional local tunnel.
+
+    Args:
+        host (Host): target host
+        ltun (Optional[LocalTunnel]): tunnel whose local port is forwarded
+        jump (Sequence[Host]): hosts that are jumped through
+
+    Returns:
+        List[str]: arguments, starting with `ssh`
+    """
+    argv = ['ssh', '-p', f'{host.port:d}']
+    if host.identity:
+        argv += ['-i', host.identity]
+    if host.transport is not None:
+        argv += ssh_options(host.transport)
+    if jump:
+        argv += ['-J', ','.join(f'{h.username}@{h.addr}:{h.port:d}'
+                                for h in jump)]
+    if ltun is not None and isinstance(ltun, LocalTunnel):
+        argv += ['-L', f'{ltun.lport:d}:{ltun.destination}:{ltun.rport:d}']
+    # the destination is never read as an option, whatever it starts with
+    argv += ['--', f'{host.username}@{host.addr}']
+    return argv
+
+
 @dataclass
 class NativeChannel(SSHChannel):
+    """Opens the shell with the ssh client of the system. With `replace`
+    the process of dsm is replaced by ssh instead of waiting for it."""
 
+    replace: bool = False
     _host: Host = field(init=False)
     _completed_process: subprocess.CompletedProcess = field(init=False)
     _proc_error: subprocess.CalledProcessError = field(init=False)
@@ -27,21 +78,18 @@ class NativeChannel(SSHChannel):
                 f'An error communicating with {self._host}'
                 f': {self._proc_error}')
 
-    def open(self, host: Host, ltun: Optional[LocalTunnel] = None) -> None:
+    def open(self, host: Host, ltun: Optional[LocalTunnel] = None,
+             jump: Sequence[Host] = ()) -> None:
         self._host = host
-        cmd = 'ssh -p {port:d}'
-        cmd = cmd.format(port=host.port)
-
-        if ltun is not None and isinstance(ltun, LocalTunnel):
-            cmd = ' '.join([cmd, '-L {lport:d}:{destination}:{rport:d}'])
-            cmd = cmd.format(lport=ltun.lport, destination=ltun.destination,
-                             rport=ltun.rport)
-
-        cmd = ' '.join([cmd, '{user}@{hostname}'])
-        cmd = cmd.format(user=host.username, hostname=host.addr)
+        argv = ssh_command(host, ltun, jump)
+        if self.replace:
+            # ssh takes over the terminal, the signals and the pid of dsm
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.execvp(argv[0], argv)
         try:
-            self._completed_process = subprocess.run(cmd,
-                                                     shell=True,
-                                                     check=True)
+            # the phases of the connection happen inside of ssh itself
+            with timings.phase('ssh'):
+                self._completed_process = subprocess.run(argv, check=True)
         except subprocess.CalledProcessError as err:
             self._proc_error = err
@@ -1,24 +1,208 @@
 """This module contains classes to open a ssh connection
 with the paramiko library"""
+import math
 import os
+import selectors
+import shutil
 import socket
 import sys
 import threading
 from dataclasses import dataclass, field
-from typing import Any, Optional, TextIO
+from functools import partial
+from typing import (Any, Callable, Dict, List, Optional, Sequence, TextIO,
+                    Tuple)
 
 import paramiko
-import sshtunnel
 from loguru import logger
 from paramiko import PKey
-from paramiko.py3compat import u as to_unicode
 
+from damnsshmanager import timings
 from damnsshmanager.config import Config
-from damnsshmanager.model import LocalTunnel, Host
+from damnsshmanager.model import LocalTunnel, Host, TransportProfile
+from damnsshmanager.recorder import SessionRecorder, recording_path
+from damnsshmanager.ssh import knownhosts
+from damnsshmanager.ssh.keys import KeyAuthClient, key_cache
 from damnsshmanager.ssh.channel import SSHChannel
 
 _msg = Config.messages
 
+# maximum number of bytes moved between the terminal and a channel at once
+IO_BUFFER_SIZE = 65536
+
+
+class JumpCache:
+    """Cache of connected clients to jump hosts. Every client is keyed by
+    the aliases of the hops that lead to it, so all connections behind the
+    same bastion share one connection to it instead of doing a full
+    handshake per hop.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, ...], paramiko.SSHClient] = {}
+        self._locks: Dict[Tuple[str, ...], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def open_channel(self, jump: Sequence[Host], target: Host,
+                     connect: Callable[..., paramiko.SSHClient]
+                     ) -> paramiko.Channel:
+        """Open a `direct-tcpip` channel to the target through the last
+        host of the jump chain. Missing or inactive clients of the chain
+        are connected on the fly.
+
+        Args:
+            jump (Sequence[Host]): jump hosts in the order they are
+            connected to
+            target (Host): host the channel is opened to
+            connect (Callable): function that connects a client to a host
+            using an optional `sock` keyword argument
+
+        Returns:
+            paramiko.Channel: channel that can be used as socket to the
+            target
+        """
+        client = self._client(tuple(jump), connect)
+        return client.get_transport().open_channel(
+            'direct-tcpip', (target.addr, target.port), ('', 0))
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def _client(self, hops: Tuple[Host, ...],
+                connect: Callable[..., paramiko.SSHClient]
+                ) -> paramiko.SSHClient:
+        key = tuple(h.alias for h in hops)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            client = self._clients.get(key)
+            transport = client.get_transport() if client else None
+            if transport is not None and transport.is_active():
+                return client
+
+            sock = None
+            if len(hops) > 1:
+                sock = self.open_channel(hops[:-1], hops[-1], connect)
+            client = connect(hops[-1], sock=sock)
+            with self._lock:
+                self._clients[key] = client
+            return client
+
+
+jump_cache = JumpCache()
+
+
+def connect_client(host: Host, pkey: Optional[PKey] = None,
+                   known_hosts_path: str = os.path.expanduser(
+                       "~/.ssh/known_hosts"),
+                   jump: Sequence[Host] = (),
+                   sock: Any = None) -> paramiko.SSHClient:
+    """Connect a new `paramiko.SSHClient` to given host. Host keys are
+    taken from the known hosts cache and unknown host keys are added
+    automatically.
+
+    Args:
+        host (Host): target host to connect to
+        pkey (Optional[PKey]): optional private key used for authentication.
+        Without it the identity of the host, the keys of the ssh-agent and
+        the default identities are taken from `key_cache`.
+        known_hosts_path (str): known hosts file that new host keys are
+        added to. It is searched in addition to ~/.ssh/known_hosts.
+        jump (Sequence[Host]): hosts that are jumped through to reach the
+        target host. Connections to these are taken from `jump_cache`.
+        sock (Any): optional socket like object used for the connection,
+        e.g. a channel of another connection
+
+    Returns:
+        paramiko.SSHClient: the connected client, which must be closed by
+        the caller
+    """
+    if jump and sock is None:
+        with timings.phase('jump'):
+            sock = jump_cache.open_channel(
+                jump, host, partial(connect_client, pkey=pkey,
+                                    known_hosts_path=known_hosts_path))
+    elif sock is None:
+        sock = open_socket(host.addr, host.port)
+
+    # only the keys of the target host are taken from the shared cache.
+    # No host keys file is set on the client, so new keys are appended by
+    # the policy instead of rewriting the whole file.
+    with timings.phase('known_hosts'):
+        known_hosts = knownhosts.get_cache(
+            [known_hosts_path, "~/.ssh/known_hosts"])
+        host_key_name = knownhosts.host_key_name(host.addr, host.port)
+        known_keys = known_hosts.lookup(host_key_name)
+    keys = [pkey] if pkey is not None else key_cache.identities(host)
+    client = KeyAuthClient(keys)
+    host_keys = client.get_host_keys()
+    for keytype, key in known_keys.items():
+        host_keys.add(host_key_name, keytype, key)
+    client.set_missing_host_key_policy(
+        knownhosts.CachedAutoAddPolicy(known_hosts))
+    profile = host.transport or TransportProfile()
+    try:
+        with timings.phase('handshake'):
+            client.connect(host.addr, port=host.port,
+                           username=host.username,
+                           sock=sock,
+                           allow_agent=False,
+                           look_for_keys=False,
+                           compress=bool(profile.compression),
+                           disabled_algorithms=disabled_algorithms(profile))
+    except (paramiko.SSHException, socket.error):
+        client.close()
+        sock.close()
+        raise
+    tune_transport(client.get_transport(), profile)
+    return client
+
+
+def disabled_algorithms(profile: TransportProfile) -> Dict[str, List[str]]:
+    """Return the algorithms paramiko must not offer, so only the ciphers
+    and MACs of the profile are negotiated."""
+    disabled = {}
+    supported = {'ciphers': paramiko.Transport._preferred_ciphers,
+                 'macs': paramiko.Transport._preferred_macs}
+    for kind, wanted in (('ciphers', profile.ciphers),
+                         ('macs', profile.macs)):
+        if wanted:
+            disabled[kind] = [a for a in supported[kind] if a not in wanted]
+    return disabled
+
+
+def tune_transport(transport: paramiko.Transport, profile: TransportProfile):
+    """Apply window size, maximum packet size and keepalive of the
+    profile to a connected transport. The sizes are used by all channels
+    opened afterwards, including the shell and forwarded connections."""
+    if profile.window_size:
+        transport.default_window_size = profile.window_size
+    if profile.max_packet_size:
+        transport.default_max_packet_size = profile.max_packet_size
+    if profile.keepalive:
+        transport.set_keepalive(profile.keepalive)
+
+
+def open_socket(addr: str, port: int) -> socket.socket:
+    """Resolve the address and connect a TCP socket to the first of its
+    addresses that accepts the connection."""
+    with timings.phase('dns'):
+        infos = socket.getaddrinfo(addr, port, 0, socket.SOCK_STREAM)
+    with timings.phase('tcp'):
+        error: Optional[OSError] = None
+        for family, kind, proto, _, sockaddr in infos:
+            sock = socket.socket(family, kind, proto)
+            try:
+                sock.connect(sockaddr)
+                return sock
+            except OSError as err:
+                sock.close()
+                error = err
+        raise error or OSError(f'{addr}:{port:d}')
+
 
 @dataclass
 class ParamikoChannel(SSHChannel):
@@ -30,8 +214,10 @@ class ParamikoChannel(SSHChannel):
     input_src: TextIO = sys.stdin
     pkey: Optional[PKey] = None
     known_hosts_path: str = os.path.expanduser("~/.ssh/known_hosts")
+    record: bool = False
 
-    def open(self, host: Host, ltun: Optional[LocalTunnel] = None) -> None:
+    def open(self, host: Host, ltun: Optional[LocalTunnel] = None,
+             jump: Sequence[Host] = ()) -> None:
         """Open a new ssh connection to the remote host using an
         optional local ssh tunnel.
 
@@ -39,57 +225,92 @@ class ParamikoChannel(SSHChannel):
             host (Host): target host to connect to
             ltun (Optional[LocalTunnel]): optional local tunnel that is
             used on the connection.
+            jump (Sequence[Host]): hosts that are jumped through to reach
+            the target host
         """
-        with paramiko.SSHClient() as client:
-
-            try:
-                client.load_host_keys(self.known_hosts_path)
-            except IOError:
-                logger.error(
-                    _msg.get("err.msg.io.known_hosts", self.known_hosts_path))
-
-            client.load_system_host_keys()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            try:
-                client.connect(host.addr, port=host.port,
-                               pkey=self.pkey,
-                               username=host.username)
-
-                tun = None
-                if ltun is not None and isinstance(ltun, LocalTunnel):
-                    tun = sshtunnel.open_tunnel((host.addr, host.port),
-                                                ssh_username=host.username,
-                                                remote_bind_address=(
-                                                    ltun.destination, ltun.rport),
-                                                local_bind_address=('', ltun.lport))
-                logger.info(_msg.get("new.interactive.shell"))
-                self.channel = client.invoke_shell()
+        try:
+            client = connect_client(host, pkey=self.pkey,
+                                    known_hosts_path=self.known_hosts_path,
+                                    jump=jump)
+        except paramiko.BadHostKeyException:
+            logger.error(
+                _msg.get("err.msg.invalid.server.host.key",
+                         self.known_hosts_path))
+            raise
+        except paramiko.AuthenticationException:
+            logger.error(_msg.get("err.msg.ssh.auth", host.addr))
+            raise
+        except socket.error:
+            logger.error(_msg.get("err.msg.socket"))
+            raise
+
+        with client:
+            tun = None
+            if ltun is not None and isinstance(ltun, LocalTunnel):
+                tun, tun_thread = self.open_tunnel(client, host, ltun, jump)
+            logger.info(_msg.get("new.interactive.shell"))
+            width, height = terminal_size(self.input_src)
+            term = os.environ.get('TERM', 'vt100')
+            with timings.phase('shell'):
+                self.channel = client.invoke_shell(term=term, width=width,
+                                                   height=height)
+            if self.record:
+                path = recording_path(host.alias)
+                with SessionRecorder(path, width=width, height=height,
+                                     term=term) as recorder:
+                    self.open_interactive_shell(self.channel, recorder)
+                logger.info(_msg.get("record.saved", str(path)))
+            else:
                 self.open_interactive_shell(self.channel)
-                if tun:
-                    tun.close()
-            except paramiko.BadHostKeyException:
-                logger.error(
-                    _msg.get("err.msg.invalid.server.host.key",
-                             self.known_hosts_path))
-                raise
-            except paramiko.AuthenticationException:
-                logger.error(_msg.get("err.msg.ssh.auth", host.addr))
-                raise
-            except socket.error:
-                logger.error(_msg.get("err.msg.socket"))
-                raise
-
-    def open_interactive_shell(self, channel: paramiko.Channel):
+            if tun:
+                tun.shutdown()
+                tun_thread.join()
+                tun.close()
+
+    def open_tunnel(self, client: paramiko.SSHClient, host: Host,
+                    ltun: LocalTunnel, jump: Sequence[Host] = ()):
+        """Forward the local port of the tunnel over the connection of the
+        shell in a background thread. The connection is only made again
+        if it is lost, so the tunnel survives a restart of the gateway
+        while the local port stays bound.
+
+        Returns:
+            Tuple[TunnelServer, threading.Thread]: the running server and
+            its thread. The server must be shut down and closed by the
+            caller.
+        """
+        # imported here, forward itself depends on this module
+        from damnsshmanager.ssh.forward import TunnelServer
+
+        shell_clients = [client]
+
+        def connect(gateway: Host, **kwargs) -> paramiko.SSHClient:
+            if shell_clients:
+                return shell_clients.pop()
+            return connect_client(gateway, pkey=self.pkey,
+                                  known_hosts_path=self.known_hosts_path,
+                                  **kwargs)
+
+        server = TunnelServer(idle_timeout=math.inf, connect=connect)
+        server.add(ltun, host, jump=jump)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server, thread
+
+    def open_interactive_shell(self, channel: paramiko.Channel,
+                               recorder: Optional[SessionRecorder] = None):
         """Opens an interactive shell based on the current OS.
 
         Args:
             channel (paramiko.Channel): channel that is used to read from
             and write into
+            recorder (Optional[SessionRecorder]): optional recorder of the
+            output of the session
         """
-        if sys.platform.startswith('linux'):
-            chan = PosixChannel(channel, self.input_src)
+        if os.name == 'posix':
+            chan = PosixChannel(channel, self.input_src, recorder=recorder)
         else:
-            chan = DefaultChannel(channel)
+            chan = DefaultChannel(channel, self.input_src, recorder=recorder)
 
         chan.open()
 
@@ -99,13 +320,24 @@ class PosixChannel:
     """A posix channel is able to read and write data from posix terminals.
     This channel can for example be used on linux or mac os systems.
 
+    Data is moved as raw bytes between the file descriptors of the terminal
+    and the channel, without any decoding. Everything that is available on
+    stdin is sent at once, so pasted text is not split into single
+    character packets.
+
     Arguments:
         ssh_channel (paramiko.Channel): channel which is used to send
         bytes into and read from
+        input_src (TextIO): terminal that is read from
+        output_dst (TextIO): terminal that is written to
+        recorder (Optional[SessionRecorder]): optional recorder that gets
+        all output of the channel
     """
 
     ssh_channel: paramiko.Channel
     input_src: TextIO = sys.stdin
+    output_dst: TextIO = sys.stdout
+    recorder: Optional[SessionRecorder] = None
     _saved_tty_attrs: Any = field(init=False)
 
     def __enter__(self):
@@ -124,84 +356,244 @@ class PosixChannel:
 
     def open(self):
         """Open a interactive channel that constantly reads and writes
-        character from the terminals. Data from the remote site is written
-        to local stdout.
+        bytes from the terminals. Data from the remote site is written
+        to local stdout. Size changes of the local terminal are forwarded
+        to the remote pty.
         """
-        import select
+        # anything written through the text layer must appear before
+        # the output of the channel
+        self.output_dst.flush()
 
-        with self:
+        with self, selectors.DefaultSelector() as selector:
 
             self.ssh_channel.settimeout(0.0)
+            selector.register(self.ssh_channel, selectors.EVENT_READ,
+                              self._read_channel)
+            selector.register(self.input_src, selectors.EVENT_READ,
+                              self._read_input)
+
+            with _ResizeWatcher(selector, self._resize):
+                running = True
+                while running:
+                    for key, _ in selector.select():
+                        running = key.data(key.fileobj) and running
+
+    def _read_channel(self, chan: paramiko.Channel) -> bool:
+        try:
+            data = chan.recv(IO_BUFFER_SIZE)
+        except socket.timeout:
+            logger.error(_msg.get("err.msg.socket.timeout"))
+            return True
+
+        running = bool(data)
+        if not running:
+            data = _msg.get("bye.bye").encode()
+        write_fully(self.output_dst.fileno(), data)
+        if self.recorder is not None:
+            self.recorder.output(data)
+        return running
+
+    def _read_input(self, input_src: TextIO) -> bool:
+        data = os.read(input_src.fileno(), IO_BUFFER_SIZE)
+        if not data:
+            return False
+        self.ssh_channel.sendall(data)
+        return True
+
+    def _resize(self, pipe_fd: int) -> bool:
+        # drain all pending notifications, only the current size matters
+        try:
+            while os.read(pipe_fd, 1024):
+                pass
+        except BlockingIOError:
+            pass
+        width, height = terminal_size(self.input_src)
+        self.ssh_channel.resize_pty(width=width, height=height)
+        return True
+
+
+class _ResizeWatcher:
+    """Registers the read end of a self pipe at the selector, which
+    becomes readable whenever the terminal window was resized (SIGWINCH).
+    Nothing is registered if the signal is not available on this
+    platform or no handler can be installed from this thread.
+    """
 
-            stop = False
-            while not stop:
-                r_list, _, _ = select.select(
-                    [self.ssh_channel, self.input_src], [], [])
-                if self.ssh_channel in r_list:
-                    try:
-                        input_data = to_unicode(self.ssh_channel.recv(1024))
-                        if not input_data:
-                            input_data = _msg.get("bye.bye")
-                            stop = True
-
-                        if input_data:
-                            sys.stdout.write(input_data)
-                            sys.stdout.flush()
-                    except socket.timeout:
-                        logger.error(_msg.get("err.msg.socket.timeout"))
-
-                if self.input_src in r_list:
-                    input_data = self.input_src.read(1)
-                    logger.debug(f'read {input_data!r} from stdin,'
-                                 ' type of char {type(input_char)!r}')
-                    if not input_data:
-                        stop = True
-                    else:
-                        self.ssh_channel.send(input_data.encode())
+    def __init__(self, selector: selectors.BaseSelector,
+                 callback: Callable[[int], bool]):
+        self._selector = selector
+        self._callback = callback
+        self._pipe: Optional[Tuple[int, int]] = None
+        self._prev_handler: Any = None
+
+    def __enter__(self):
+        import signal
+
+        sigwinch = getattr(signal, 'SIGWINCH', None)
+        if sigwinch is None \
+                or threading.current_thread() is not threading.main_thread():
+            return self
+
+        self._pipe = os.pipe()
+        for fd in self._pipe:
+            os.set_blocking(fd, False)
+        self._prev_handler = signal.signal(sigwinch, self._notify)
+        self._selector.register(self._pipe[0], selectors.EVENT_READ,
+                                self._callback)
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        import signal
+
+        if self._pipe is None:
+            return
+        signal.signal(signal.SIGWINCH, self._prev_handler)
+        self._selector.unregister(self._pipe[0])
+        for fd in self._pipe:
+            os.close(fd)
+        self._pipe = None
+
+    def _notify(self, signum, frame):
+        try:
+            os.write(self._pipe[1], b'\0')
+        except (BlockingIOError, TypeError):
+            pass
+
+
+def terminal_size(terminal: TextIO) -> Tuple[int, int]:
+    """Return the size of given terminal, falling back to the size of
+    the terminal of this process or 80x24.
+
+    Args:
+        terminal (TextIO): terminal to get the size of
+
+    Returns:
+        Tuple[int, int]: number of columns and lines
+    """
+    try:
+        size = os.get_terminal_size(terminal.fileno())
+    except (OSError, ValueError, AttributeError):
+        size = shutil.get_terminal_size()
+    return size.columns, size.lines
+
+
+def write_fully(fd: int, data: bytes):
+    """Write all bytes to given file descriptor, which may take multiple
+    calls of `os.write`.
+
+    Args:
+        fd (int): file descriptor to write to
+        data (bytes): data to write
+    """
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
 
 
 @dataclass
 class DefaultChannel:
+    """A default channel is used on terminals that can not be waited on
+    together with the channel, like the windows console. The channel and
+    the terminal are polled alternately in a single loop, that ends as
+    soon as the channel is closed. If the end of the input is reached,
+    the write side of the channel is shut down, so the remote shell can
+    exit on its own.
+
+    Arguments:
+        chan (paramiko.Channel): channel which is used to send
+        bytes into and read from
+        input_src (TextIO): terminal that is read from
+        output_dst (TextIO): terminal that is written to
+        recorder (Optional[SessionRecorder]): optional recorder that gets
+        all output of the channel
+        poll_interval (float): seconds the channel is waited on for data
+        before the terminal is polled
+    """
 
     chan: paramiko.Channel
+    input_src: TextIO = sys.stdin
+    output_dst: TextIO = sys.stdout
+    recorder: Optional[SessionRecorder] = None
+    poll_interval: float = 0.02
 
     def open(self):
 
         data = _msg.get("default.chan.open.msg")
         if data:
-            sys.stdout.write(data)
-        writer = threading.Thread(target=DefaultChannel.writeloop,
-                                  args=(self.chan,))
-        writer.start()
-
-        try:
-            while True:
-                stdin_char = sys.stdin.read(1)
-                if not stdin_char:
-                    break
-                self.chan.send(stdin_char.encode(encoding='utf-8'))
-        except EOFError:
-            # user hit ^Z or F6
-            logger.info(_msg.get("user.closed.connection"))
+            self.output_dst.write(data)
+            self.output_dst.flush()
 
-    @staticmethod
-    def writeloop(chan):
-        """The write loop reads input from given channel
-        and writes received data to standard out.
+        out = getattr(self.output_dst, 'buffer', self.output_dst)
+        poll_input = _console_poller() or _fd_poller(self.input_src)
+        self.chan.settimeout(self.poll_interval)
 
-        Args:
-            chan (paramiko.Channel): channel to read from
-        """
-        stop = False
-        while not stop:
-            data = to_unicode(chan.recv(256))
+        input_open = True
+        while True:
+            try:
+                data = self.chan.recv(IO_BUFFER_SIZE)
+                if not data:
+                    out.write(_msg.get("bye.bye").encode())
+                    out.flush()
+                    break
+                out.write(data)
+                out.flush()
+                if self.recorder is not None:
+                    self.recorder.output(data)
+            except socket.timeout:
+                pass
+
+            if input_open:
+                data = poll_input()
+                if data is None:
+                    # user hit ^Z or F6
+                    logger.info(_msg.get("user.closed.connection"))
+                    self.chan.shutdown_write()
+                    input_open = False
+                elif data:
+                    self.chan.sendall(data)
+
+
+def _console_poller() -> Optional[Callable[[], Optional[bytes]]]:
+    """Return a function that reads all keys that were hit on the windows
+    console without blocking. None is returned by the poller once ^Z or F6
+    was hit.
+    """
+    try:
+        import msvcrt
+    except ImportError:
+        return None
+
+    def poll() -> Optional[bytes]:
+        chars = []
+        while msvcrt.kbhit():
+            char = msvcrt.getwch()
+            if char in ('\x00', '\xe0'):
+                # function and arrow keys are sent as two characters
+                if msvcrt.getwch() == '@' and char == '\x00':
+                    return None
+                continue
+            if char == '\x1a':
+                return None
+            chars.append(char)
+        return ''.join(chars).encode('utf-8')
+
+    return poll
+
+
+def _fd_poller(input_src: TextIO) -> Callable[[], Optional[bytes]]:
+    """Return a function that reads all data available on the file
+    descriptor of given input without blocking. None is returned by the
+    poller once the end of the input was reached.
+    """
+    import select
 
-            if not data:
-                data = _msg.get("bye.bye")
-                stop = True
+    fd = input_src.fileno()
 
-            if not data:
-                data = 'Missing message "bye.bye"'
+    def poll() -> Optional[bytes]:
+        r_list, _, _ = select.select([fd], [], [], 0)
+        if not r_list:
+            return b''
+        return os.read(fd, IO_BUFFER_SIZE) or None
 
-            sys.stdout.write(data)
-            sys.stdout.flush()
+    return poll
@@ -1,15 +1,18 @@
+"""This module contains the registry of providers that open ssh channels.
+Providers are registered by the path of their class and only imported
+when a channel is created, so commands that never connect to a host do
+not pay for importing paramiko and the cryptography stack.
+"""
+import importlib
 from typing import List
 
 from damnsshmanager.config import Config
-from damnsshmanager.ssh.native import NativeChannel
-from damnsshmanager.ssh.paramiko import ParamikoChannel
-
 from damnsshmanager.ssh.channel import SSHChannel
 
 _msg = Config.messages
 _provider = {
-    'system': NativeChannel,
-    'application': ParamikoChannel
+    'system': 'damnsshmanager.ssh.native:NativeChannel',
+    'application': 'damnsshmanager.ssh.paramiko:ParamikoChannel'
 }
 
 
@@ -17,8 +20,10 @@ def provider() -> List[str]:
     return list(_provider)
 
 
-def create_channel(provider_name: str) -> SSHChannel:
-    creator_fn = _provider.get(provider_name)
-    if creator_fn is None:
+def create_channel(provider_name: str, **kwargs) -> SSHChannel:
+    path = _provider.get(provider_name)
+    if path is None:
         raise ValueError(_msg.get('err.msg.unknown.connector', provider_name))
-    return creator_fn()
+    module_name, class_name = path.split(':')
+    creator_fn = getattr(importlib.import_module(module_name), class_name)
+    return creator_fn(**kwargs)
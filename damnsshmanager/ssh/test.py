@@ -1,30 +1,40 @@
 import socket
+import time
 
 from damnsshmanager.hosts import Host
 
 
-def test_connection(host: Host):
+def test_connection(host: Host, timeout: float = 1) -> float:
+    """Test if the ssh port of a host accepts connections. Every address
+    of the host is tried until one accepts the connection.
+
+    Args:
+        host (Host): host to test
+        timeout (float): seconds to wait for the connection per address
+
+    Raises:
+        OSError: if no address accepted the connection
+
+    Returns:
+        float: seconds it took to connect
+    """
     errors = []
-    # number of successful created sockets
-    num_sockets = 0
     for res in socket.getaddrinfo(host.addr, host.port, socket.AF_UNSPEC,
                                   socket.SOCK_STREAM):
         af, socktype, proto, canonname, sa = res
         try:
             s = socket.socket(af, socktype, proto)
-            s.settimeout(1)
-            num_sockets += 1
         except OSError as msg:
             errors.append(msg)
-            s = None
-        if s is not None:
+            continue
+        with s:
+            s.settimeout(timeout)
+            started = time.monotonic()
             try:
                 s.connect(sa)
+                return time.monotonic() - started
             except OSError as msg:
                 errors.append(msg)
-                s.close()
-    # a connection could not be established if an error was created for
-    # each created socket
-    if len(errors) >= num_sockets:
-        raise OSError({'msg': 'could not open socket',
-                       'errors': errors})
+    # a connection could not be established with any address
+    raise OSError({'msg': 'could not open socket',
+                   'errors': errors})
@@ -0,0 +1,281 @@
+"""This module contains the upload of files to many hosts at once over
+SFTP. Every file is split into segments that are sent over several SFTP
+channels of one connection in parallel. Writes inside a segment are
+pipelined, so the transfer does not wait for the acknowledgement of
+every single write request.
+
+Segments that were written completely are kept in a journal inside the
+app dir, so an interrupted transfer can be resumed without sending them
+again.
+
+Sample usage:
+```
+results = transfer.run(hosts.find_hosts('web*'), [pathlib.Path('app.tar')],
+                       '/tmp/')
+```
+"""
+import hashlib
+import json
+import os
+import pathlib
+import posixpath
+import queue
+import stat
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+
+import paramiko
+
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host
+from damnsshmanager.ssh.paramiko import connect_client
+
+SEGMENT_SIZE = 8 * 1024 * 1024
+# paramiko splits writes into requests of at most 32 KiB anyway
+CHUNK_SIZE = 32768
+
+TransferResult = namedtuple('TransferResult', 'alias files size elapsed error')
+
+
+class Journal:
+    """A journal keeps the offsets of all segments of one file that were
+    completely written to a host. It is only valid for the local file
+    with the size and modification time it was created for.
+
+    Arguments:
+        path (pathlib.Path): file the journal is stored in
+        size (int): size of the local file
+        mtime (float): modification time of the local file
+    """
+
+    def __init__(self, path: pathlib.Path, size: int, mtime: float):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.done: Set[int] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: pathlib.Path, size: int, mtime: float) -> 'Journal':
+        journal = cls(path, size, mtime)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+            if content.get('size') == size and content.get('mtime') == mtime:
+                journal.done = set(content.get('done', ()))
+        except (OSError, ValueError):
+            pass
+        return journal
+
+    def add(self, offset: int):
+        with self._lock:
+            self.done.add(offset)
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'size': self.size, 'mtime': self.mtime,
+                           'done': sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        with self._lock:
+            self.done = set()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def journal_path(alias: str, remote_path: str) -> pathlib.Path:
+    directory = pathlib.Path(Config.app_dir, 'transfers')
+    directory.mkdir(mode=0o700, exist_ok=True)
+    digest = hashlib.sha1(f'{alias}:{remote_path}'.encode()).hexdigest()
+    return directory.joinpath(f'{digest}.json')
+
+
+@dataclass
+class FileJob:
+    """Upload of one local file to one remote path"""
+
+    local_path: pathlib.Path
+    remote_path: str
+    size: int
+    journal: Journal
+    segments: List[int] = field(default_factory=list)
+
+
+def remote_targets(sftp: paramiko.SFTPClient, sources: Sequence[pathlib.Path],
+                   remote_path: str) -> List[Tuple[pathlib.Path, str]]:
+    """Return the remote path of every source. The sources are copied into
+    the remote path if it is an existing directory, ends with a slash or
+    more than one source is given.
+    """
+    into_dir = len(sources) > 1 or remote_path.endswith('/')
+    if not into_dir:
+        try:
+            into_dir = stat.S_ISDIR(sftp.stat(remote_path).st_mode or 0)
+        except IOError:
+            into_dir = False
+    if into_dir:
+        return [(src, posixpath.join(remote_path, src.name))
+                for src in sources]
+    return [(sources[0], remote_path)]
+
+
+def prepare(sftp: paramiko.SFTPClient, alias: str, local_path: pathlib.Path,
+            remote_path: str, resume: bool = False,
+            segment_size: int = SEGMENT_SIZE) -> FileJob:
+    """Plan the segments of a file that must be sent. On resume, only the
+    segments in a journal of the current local file are skipped. Segments
+    are written by parallel streams, so the size of the remote file says
+    nothing about which of them are complete. In every other case the
+    remote file is created or truncated and all segments are sent.
+    """
+    info = local_path.stat()
+    journal = Journal.load(journal_path(alias, remote_path), info.st_size,
+                           info.st_mtime)
+    offsets = list(range(0, info.st_size, segment_size))
+    job = FileJob(local_path, remote_path, info.st_size, journal)
+
+    if resume and journal.done:
+        try:
+            remote_size: Optional[int] = sftp.stat(remote_path).st_size
+        except IOError:
+            remote_size = None
+        if remote_size is not None and remote_size <= info.st_size:
+            job.segments = [o for o in offsets if o not in journal.done]
+            return job
+
+    journal.clear()
+    sftp.open(remote_path, 'w').close()
+    job.segments = offsets
+    return job
+
+
+def send_segments(open_sftp: Callable[[], paramiko.SFTPClient],
+                  segments: 'queue.Queue[Tuple[FileJob, int]]',
+                  segment_size: int = SEGMENT_SIZE) -> int:
+    """Send segments from the queue until it is empty over one SFTP
+    channel. Every segment is written with pipelined requests and recorded
+    in the journal of its file once the remote file was closed.
+
+    Returns:
+        int: number of bytes sent
+    """
+    sent = 0
+    with open_sftp() as sftp:
+        while True:
+            try:
+                job, offset = segments.get_nowait()
+            except queue.Empty:
+                break
+            length = min(segment_size, job.size - offset)
+            with open(job.local_path, 'rb') as local, \
+                    sftp.open(job.remote_path, 'r+') as remote:
+                remote.set_pipelined(True)
+                local.seek(offset)
+                remote.seek(offset)
+                remaining = length
+                while remaining > 0:
+                    data = local.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    remote.write(data)
+                    remaining -= len(data)
+            job.journal.add(offset)
+            sent += length - remaining
+    return sent
+
+
+def push(client: paramiko.SSHClient, alias: str,
+         sources: Sequence[pathlib.Path], remote_path: str, streams: int = 4,
+         resume: bool = False, segment_size: int = SEGMENT_SIZE) -> int:
+    """Upload all sources over one connection, using `streams` SFTP
+    channels in parallel.
+
+    Returns:
+        int: number of bytes sent
+    """
+    transport = client.get_transport()
+
+    def open_sftp() -> paramiko.SFTPClient:
+        return paramiko.SFTPClient.from_transport(transport)
+
+    with open_sftp() as sftp:
+        jobs = [prepare(sftp, alias, src, dst, resume, segment_size)
+                for src, dst in remote_targets(sftp, sources, remote_path)]
+
+    segments: 'queue.Queue[Tuple[FileJob, int]]' = queue.Queue()
+    for job in jobs:
+        for offset in job.segments:
+            segments.put((job, offset))
+
+    workers = max(1, min(streams, segments.qsize()))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(send_segments, open_sftp, segments,
+                               segment_size)
+                   for _ in range(workers)]
+        sent = sum(f.result() for f in futures)
+
+    for job in jobs:
+        job.journal.clear()
+    return sent
+
+
+def run(hosts: Sequence[Host], sources: Sequence[pathlib.Path],
+        remote_path: str, max_workers: int = 8, streams: int = 4,
+        resume: bool = False,
+        connect: Callable[..., paramiko.SSHClient] = connect_client,
+        jump_fn: Optional[Callable[[Host], Sequence[Host]]] = None
+        ) -> List[TransferResult]:
+    """Upload the sources to all given hosts in parallel.
+
+    Args:
+        hosts (Sequence[Host]): hosts the files are uploaded to
+        sources (Sequence[pathlib.Path]): local files to upload
+        remote_path (str): remote file or directory
+        max_workers (int): maximum number of hosts uploaded to at once
+        streams (int): number of SFTP channels per host
+        resume (bool): resume interrupted transfers instead of starting
+        all over
+        connect (Callable): function that returns a connected
+        `paramiko.SSHClient` for a host and `jump` keyword argument
+        jump_fn (Optional[Callable]): function that returns the jump
+        chain of a host
+
+    Returns:
+        List[TransferResult]: results in the order of the hosts
+    """
+    def upload(host: Host) -> TransferResult:
+        started = time.monotonic()
+        try:
+            jump = jump_fn(host) if jump_fn else ()
+            with connect(host, jump=jump) as client:
+                sent = push(client, host.alias, sources, remote_path,
+                            streams=streams, resume=resume)
+            return TransferResult(host.alias, len(sources), sent,
+                                  time.monotonic() - started, None)
+        except (paramiko.SSHException, OSError, KeyError) as err:
+            if isinstance(err, KeyError) and err.args:
+                error = str(err.args[0])
+            else:
+                error = str(err) or type(err).__name__
+            return TransferResult(host.alias, len(sources), 0,
+                                  time.monotonic() - started, error)
+
+    if not hosts:
+        return []
+    workers = max(1, min(max_workers, len(hosts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(upload, hosts))
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TiB'
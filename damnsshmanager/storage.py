@@ -4,7 +4,7 @@ import pathlib
 import pickle
 import shutil
 import tempfile
-from typing import Any, Iterable, Optional, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 
 from loguru import logger
 
@@ -39,6 +39,18 @@ class Store(abc.ABC):
     def unique(self, key) -> Optional[Any]:
         ...
 
+    @abc.abstractmethod
+    def update(self, key, func) -> list:
+        ...
+
+    @abc.abstractmethod
+    def lookup(self, term) -> list:
+        ...
+
+    @abc.abstractmethod
+    def replace(self, objs: Iterable, sort=None):
+        ...
+
 
 class UniqueException(Exception):
     """Exception raised for unique object errors
@@ -84,7 +96,7 @@ def backup(func):
 
         run_with_backup = os.path.exists(store.object_file)
         if not run_with_backup:
-            return func(*args, **kwargs)
+            return func(store, *args, **kwargs)
 
         # if a backup is required run with all the stuff of copy
         # move, remove and so on, otherwise just call the function
@@ -107,14 +119,27 @@ class PickleStore:
     """A `Store` allows crud (create, read, update, delete) operations
     on a file to persist python objects.
 
+    Optionally an inverted index is kept next to the objects file, that
+    maps terms of all objects to their identifiers. The index is
+    rewritten on every change of the store and allows lookups without
+    loading and filtering all objects.
+
     Attributes
     ----------
     object_file : str
         Contains the file path that objects are stored in
+    index : function(object)
+        Function that returns the terms an object is indexed with
+    ident : function(object)
+        Function that returns the identifier of an object inside the index
     """
 
-    def __init__(self, object_file: pathlib.Path):
+    def __init__(self, object_file: pathlib.Path,
+                 index: Optional[Callable[[Any], Iterable[str]]] = None,
+                 ident: Optional[Callable[[Any], Any]] = None):
         self.__object_file = object_file
+        self.__index = index
+        self.__ident = ident
 
     def __empty(self):
         yield from ()
@@ -123,6 +148,10 @@ class PickleStore:
     def object_file(self):
         return self.__object_file
 
+    @property
+    def index_file(self) -> pathlib.Path:
+        return self.__object_file.with_name(self.__object_file.name + '.index')
+
     @backup
     def add(self, obj: Union[Host, LocalTunnel], sort=None):
         """Adds a new object to the store.
@@ -150,6 +179,7 @@ class PickleStore:
                 if sort:
                     objs = sorted(objs, key=sort)
                 pickle.dump(objs, f)
+            self.__write_index(objs)
         except IOError as err:
             logger.error(Config.messages.get("err.msg.dump.error",
                                              self.__object_file))
@@ -178,13 +208,125 @@ class PickleStore:
         objs = self.get()
         objs = list(objs) if objs else []
 
-        with open(self.__object_file, "wb") as f:
+        new_objects, deleted = [], []
+        for o in objs:
+            (deleted if func(o) else new_objects).append(o)
 
-            new_objects = [o for o in objs if not func(o)]
+        with open(self.__object_file, "wb") as f:
             pickle.dump(new_objects, f)
-            if len(objs) != len(new_objects):
-                return [o for o in objs if o not in new_objects]
-        return []
+        self.__write_index(new_objects)
+        return deleted
+
+    @backup
+    def update(self, key, func) -> list:
+        """Replace all objects that the given key applies to with the
+        result of func(object).
+
+        Example
+        -------
+        from damnsshmanager.storage import Store
+        store = Store('~/.damnsshmanager/hosts.pickle')
+        store.update(lambda o: o.alias == alias,
+                     lambda o: o._replace(port=2222))
+
+        Parameters
+        ----------
+        key : callable
+            Function that takes one parameter and returns True if the
+            object should be updated
+        func : callable
+            Function that takes the object and returns its replacement
+
+        Returns
+        -------
+        A list with all updated objects
+        """
+        objs = self.get()
+        objs = list(objs) if objs else []
+
+        updated = []
+        for i, obj in enumerate(objs):
+            if key(obj):
+                objs[i] = func(obj)
+                updated.append(objs[i])
+        if not updated:
+            return updated
+
+        with open(self.__object_file, "wb") as f:
+            pickle.dump(objs, f)
+        self.__write_index(objs)
+        return updated
+
+    @backup
+    def replace(self, objs: Iterable, sort=None):
+        """Replace all objects of the store with given ones at once.
+
+        Parameters
+        ----------
+        objs : Iterable
+            The new objects of the store
+        sort : function(object)
+            Function that is used by sorted(list, key=x) as key
+        """
+        objs = sorted(objs, key=sort) if sort else list(objs)
+        with open(self.__object_file, "wb") as f:
+            pickle.dump(objs, f)
+        self.__write_index(objs)
+
+    def lookup(self, term) -> list:
+        """Return the identifiers of all objects that were indexed with
+        given term. The index is rebuilt if it is missing or older than
+        the objects file.
+
+        Example
+        -------
+        from damnsshmanager.storage import Store
+        store = Store('~/.damnsshmanager/hosts.pickle',
+                      index=lambda o: o.tags, ident=lambda o: o.alias)
+        store.lookup('db')
+
+        Returns
+        -------
+        A list of identifiers, that is empty if nothing was found
+        """
+        return list(self.__read_index().get(term, ()))
+
+    def terms(self) -> List[Any]:
+        """Return all terms of the index"""
+        return sorted(self.__read_index())
+
+    def __build_index(self, objs) -> Dict[Any, list]:
+        index: Dict[Any, list] = {}
+        for obj in objs:
+            for term in self.__index(obj):
+                index.setdefault(term, []).append(self.__ident(obj))
+        return index
+
+    def __write_index(self, objs):
+        if self.__index is None:
+            return
+        with open(self.index_file, "wb") as f:
+            pickle.dump(self.__build_index(objs), f)
+
+    def __read_index(self) -> Dict[Any, list]:
+        if self.__index is None:
+            return {}
+        try:
+            stale = os.path.getmtime(self.index_file) \
+                < os.path.getmtime(self.__object_file)
+        except OSError:
+            stale = True
+        if not stale:
+            try:
+                with open(self.index_file, "rb") as f:
+                    return pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                pass
+        if not os.path.exists(self.__object_file):
+            return {}
+        objs = list(self.get())
+        self.__write_index(objs)
+        return self.__build_index(objs)
 
     def unique(self, key) -> Optional[Any]:
         """Return the one object that matches given key function(item).
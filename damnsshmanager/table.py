@@ -0,0 +1,149 @@
+"""This module renders lists of hosts and tunnels as plain text tables.
+All cells are formatted once, the width of every column is the width of
+its longest value, and the lines are written in large chunks. Output to a
+terminal that does not fit on one screen is shown by a pager.
+
+Sample usage:
+```
+columns = [Column('Alias', 'alias'), Column('Address', 'addr')]
+table.show(table.render(columns, hosts.get_all_hosts()))
+```
+"""
+import fnmatch
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+from collections import namedtuple
+from operator import attrgetter
+from typing import IO, List, Optional, Sequence
+
+PAGER_ENV = 'DSM_PAGER'
+DEFAULT_PAGER = 'less -FRX'
+
+# lines that are written at once
+CHUNK_SIZE = 4096
+
+# header of a column and the field of the rows that is shown in it
+Column = namedtuple('Column', 'header field')
+
+HOST_COLUMNS = (Column('Alias', 'alias'),
+                Column('Username', 'username'),
+                Column('Address', 'addr'),
+                Column('Port', 'port'))
+SOURCE_COLUMNS = (Column('Name', 'name'),
+                  Column('Kind', 'kind'),
+                  Column('Location', 'location'),
+                  Column('TTL', 'ttl'))
+TUNNEL_COLUMNS = (Column('Alias', 'alias'),
+                  Column('Gateway', 'gateway'),
+                  Column('Local Port', 'lport'),
+                  Column('Destination', 'destination'),
+                  Column('Remote Port', 'rport'))
+
+
+def select(rows: Sequence, pattern: Optional[str] = None,
+           sort: Optional[str] = None, reverse: bool = False) -> List:
+    """Return the rows whose alias matches a shell style pattern, sorted
+    by a field or in reverse order.
+
+    Args:
+        rows (Sequence): namedtuples with an `alias`
+        pattern (Optional[str]): pattern like `web*`, all rows if None
+        sort (Optional[str]): field the rows are sorted by
+        reverse (bool): sort descending, or reverse the given order
+
+    Returns:
+        List: the selected rows
+    """
+    if pattern:
+        rows = [r for r in rows if fnmatch.fnmatchcase(r.alias, pattern)]
+    else:
+        rows = list(rows)
+    if sort:
+        rows.sort(key=attrgetter(sort), reverse=reverse)
+    elif reverse:
+        rows.reverse()
+    return rows
+
+
+def render(columns: Sequence[Column], rows: Sequence,
+           separator: str = '  ') -> List[str]:
+    """Return the lines of a table, a header, a divider and one line per
+    row.
+
+    Args:
+        columns (Sequence[Column]): columns of the table
+        rows (Sequence): namedtuples with the fields of the columns
+        separator (str): text between two columns
+
+    Returns:
+        List[str]: lines without line breaks
+    """
+    fields = attrgetter(*(c.field for c in columns))
+    if len(columns) == 1:
+        cells = [(str(fields(row)),) for row in rows]
+    else:
+        cells = [tuple(map(str, fields(row))) for row in rows]
+    widths = [len(c.header) for c in columns]
+    for i, values in enumerate(zip(*cells)):
+        widths[i] = max(widths[i], max(map(len, values)))
+
+    # the last column is not padded, so lines have no trailing spaces
+    fmt = separator.join([f'{{:<{w:d}s}}' for w in widths[:-1]] + ['{:s}'])
+    lines = [fmt.format(*(c.header for c in columns)),
+             '-' * (sum(widths) + len(separator) * (len(widths) - 1))]
+    lines.extend(fmt.format(*row) for row in cells)
+    return lines
+
+
+def write(lines: Sequence[str], out: IO[str]):
+    """Write lines in chunks of `CHUNK_SIZE` lines."""
+    for start in range(0, len(lines), CHUNK_SIZE):
+        out.write('\n'.join(lines[start:start + CHUNK_SIZE]))
+        out.write('\n')
+    out.flush()
+
+
+def pager_command() -> List[str]:
+    """Return the pager from `DSM_PAGER` or `PAGER`, `less` by default."""
+    command = os.environ.get(PAGER_ENV) or os.environ.get('PAGER') \
+        or DEFAULT_PAGER
+    return shlex.split(command)
+
+
+def page(lines: Sequence[str], command: Optional[List[str]] = None) -> bool:
+    """Write lines into the stdin of a pager and wait until it exits.
+
+    Returns:
+        bool: False if the pager could not be started
+    """
+    try:
+        pager = subprocess.Popen(command or pager_command(),
+                                 stdin=subprocess.PIPE, text=True)
+    except OSError:
+        return False
+    try:
+        write(lines, pager.stdin)
+    except BrokenPipeError:
+        # the pager was quit before all lines were read
+        pass
+    finally:
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
+    return True
+
+
+def show(lines: Sequence[str], out: Optional[IO[str]] = None,
+         pager: bool = True):
+    """Write lines to stdout, through a pager if stdout is a terminal and
+    the lines do not fit on it."""
+    out = out or sys.stdout
+    if pager and out.isatty() and \
+            len(lines) >= shutil.get_terminal_size().lines and page(lines):
+        return
+    write(lines, out)
@@ -0,0 +1,127 @@
+"""This module contains timers around the phases of opening a connection,
+like loading the stores, resolving the address, the TCP connect, the ssh
+handshake and the allocation of the shell.
+
+Timers are only taken while a measurement was started. Otherwise every
+phase is a no-op, so the instrumented code does not pay for it. Only
+phases of the thread that started the measurement are recorded.
+
+Sample usage:
+```
+timings.start('alias')
+with timings.phase('dns'):
+    socket.getaddrinfo('example.com', 22)
+result = timings.stop()
+timings.append(result, timings.log_path())
+```
+"""
+import json
+import pathlib
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from damnsshmanager.config import Config
+
+# name of a nested phase is the path of all enclosing phases, e.g.
+# handshake/auth. Depth 0 phases add up to the total.
+Phase = namedtuple('Phase', 'name depth seconds')
+
+
+class Timings:
+    """Phases of one connection in the order they were started.
+
+    Arguments:
+        alias (str): alias of the host or tunnel that is connected to
+        provider (str): name of the provider the connection is opened with
+    """
+
+    def __init__(self, alias: str, provider: str = ''):
+        self.alias = alias
+        self.provider = provider
+        self.timestamp = time.time()
+        self.phases: List[Phase] = []
+        self._stack: List[str] = []
+        self._thread = threading.get_ident()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if threading.get_ident() != self._thread:
+            yield
+            return
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        # consecutive runs of the same phase are added up
+        if self.phases and self.phases[-1].name == path:
+            index = len(self.phases) - 1
+        else:
+            index = len(self.phases)
+            self.phases.append(Phase(path, len(self._stack) - 1, 0.0))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.phases[index] = self.phases[index]._replace(
+                seconds=self.phases[index].seconds + seconds)
+            self._stack.pop()
+
+    @property
+    def total(self) -> float:
+        return sum(p.seconds for p in self.phases if p.depth == 0)
+
+    def report(self) -> List[str]:
+        """Return one line per phase and the total of all phases."""
+        width = max([len(p.name) for p in self.phases] + [5])
+        lines = [f'{p.name:<{width}s} {p.seconds * 1000:10.2f} ms'
+                 for p in self.phases]
+        lines.append(f'{"total":<{width}s} {self.total * 1000:10.2f} ms')
+        return lines
+
+    def to_dict(self) -> dict:
+        return {'timestamp': self.timestamp, 'alias': self.alias,
+                'provider': self.provider,
+                'phases': [{'name': p.name, 'ms': round(p.seconds * 1000, 3)}
+                           for p in self.phases],
+                'total_ms': round(self.total * 1000, 3)}
+
+
+_active: Optional[Timings] = None
+
+
+def start(alias: str, provider: str = '') -> Timings:
+    """Start the measurement of a new connection."""
+    global _active
+    _active = Timings(alias, provider)
+    return _active
+
+
+def stop() -> Optional[Timings]:
+    """Stop the current measurement and return it."""
+    global _active
+    timings, _active = _active, None
+    return timings
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the enclosed block as phase of the current measurement."""
+    timings = _active
+    if timings is None:
+        yield
+    else:
+        with timings.phase(name):
+            yield
+
+
+def log_path() -> pathlib.Path:
+    return pathlib.Path(Config.app_dir, 'timings.jsonl')
+
+
+def append(timings: Timings, path: pathlib.Path):
+    """Append the timings as one JSON line to given file."""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(timings.to_dict()))
+        f.write('\n')
@@ -0,0 +1,13 @@
+import os
+import shutil
+import tempfile
+
+from damnsshmanager.config import APP_DIR_ENV
+
+_app_dir = tempfile.mkdtemp(prefix='damnsshmanager-test-')
+# the configuration is lazy, so the tests never touch the app dir of the user
+os.environ[APP_DIR_ENV] = _app_dir
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_app_dir, ignore_errors=True)
@@ -0,0 +1,97 @@
+import io
+import socket
+import time
+
+from damnsshmanager.model import Host
+from damnsshmanager.ssh import execute
+
+
+class FakeSession:
+
+    def __init__(self, output, status):
+        self.chunks = list(output)
+        self.status = status
+        self.command = None
+
+    def set_combine_stderr(self, combine):
+        pass
+
+    def exec_command(self, command):
+        self.command = command
+
+    def recv(self, nbytes):
+        return self.chunks.pop(0) if self.chunks else b''
+
+    def recv_exit_status(self):
+        return self.status
+
+
+class FakeClient:
+
+    def __init__(self, session):
+        self.session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        return self.session
+
+
+def make_hosts(*aliases):
+    return [Host(alias=a, addr=f'{a}.example.com', username='damn', port=22)
+            for a in aliases]
+
+
+def test_prefixed_output():
+    def connect(host, jump=()):
+        return FakeClient(FakeSession([b'one\ntw', b'o\nthree'], 0))
+
+    output = io.StringIO()
+    results = execute.run(make_hosts('a', 'bbb'), 'ls', output=output,
+                          connect=connect)
+
+    lines = output.getvalue().splitlines()
+    assert sorted(lines) == sorted(['a   | one', 'a   | two', 'a   | three',
+                                    'bbb | one', 'bbb | two', 'bbb | three'])
+    assert [(r.alias, r.status, r.error) for r in results] == [
+        ('a', 0, None), ('bbb', 0, None)]
+
+
+def test_exit_status_and_errors():
+    def connect(host, jump=()):
+        if host.alias == 'down':
+            raise socket.error('Connection refused')
+        return FakeClient(FakeSession([], 3))
+
+    results = execute.run(make_hosts('up', 'down'), 'false',
+                          output=io.StringIO(), connect=connect)
+    assert results[0].status == 3
+    assert results[1].status is None
+    assert results[1].error == 'Connection refused'
+
+
+def test_missing_jump_host():
+    def jump_fn(host):
+        raise KeyError('jump host missing')
+
+    results = execute.run(make_hosts('a'), 'ls', output=io.StringIO(),
+                          connect=None, jump_fn=jump_fn)
+    assert results[0].error == 'jump host missing'
+
+
+def test_parallel():
+    def connect(host, jump=()):
+        time.sleep(0.2)
+        return FakeClient(FakeSession([b'done\n'], 0))
+
+    started = time.monotonic()
+    execute.run(make_hosts(*'abcdefgh'), 'ls', output=io.StringIO(),
+                connect=connect)
+    assert time.monotonic() - started < 0.2 * 4
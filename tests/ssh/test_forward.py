@@ -0,0 +1,275 @@
+import socket
+import threading
+import time
+
+import paramiko
+import pytest
+
+from damnsshmanager.model import Host, LocalTunnel
+from damnsshmanager.ssh.forward import (GatewaySession, TunnelServer,
+                                        backoff_delay)
+from damnsshmanager.ssh.paramiko import ParamikoChannel
+
+
+class EchoTransport:
+    """Transport replacement that answers every channel with an echo"""
+
+    def __init__(self):
+        self.active = True
+        self.channels = 0
+        self.answer_after = 0.0
+
+    def is_active(self):
+        return self.active
+
+    def global_request(self, kind, wait=True):
+        time.sleep(self.answer_after)
+
+    def open_channel(self, kind, dest_addr, src_addr):
+        self.channels += 1
+        local, remote = socket.socketpair()
+
+        def echo():
+            with remote:
+                while True:
+                    data = remote.recv(1024)
+                    if not data:
+                        break
+                    remote.sendall(data)
+
+        threading.Thread(target=echo, daemon=True).start()
+        return local
+
+
+class EchoClient:
+
+    def __init__(self):
+        self.transport = EchoTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+
+@pytest.fixture
+def gateway() -> Host:
+    return Host(alias='gw', addr='localhost', username='damn', port=22)
+
+
+@pytest.fixture
+def connections():
+    return []
+
+
+@pytest.fixture
+def connect(connections):
+    def fn(host, **kwargs):
+        client = EchoClient()
+        connections.append(client)
+        return client
+    return fn
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_session_connects_lazily(gateway, connect, connections):
+    session = GatewaySession(gateway, connect=connect)
+    assert not session.connected
+    chan = session.open_channel('localhost', 80, ('127.0.0.1', 1234))
+    chan.close()
+    assert session.connected
+    assert len(connections) == 1
+
+
+def test_session_shares_connection(gateway, connect, connections):
+    session = GatewaySession(gateway, connect=connect)
+    for _ in range(3):
+        session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    assert len(connections) == 1
+    assert connections[0].transport.channels == 3
+
+
+def test_session_reap_idle(gateway, connect, connections):
+    session = GatewaySession(gateway, connect=connect, idle_timeout=10)
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    session.release()
+    assert not session.reap(now=session._idle_since + 5)
+    assert session.reap(now=session._idle_since + 10)
+    assert not session.connected
+    assert not connections[0].transport.is_active()
+
+
+def test_session_keeps_busy_connection(gateway, connect):
+    session = GatewaySession(gateway, connect=connect, idle_timeout=0)
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    assert not session.reap(now=session._idle_since + 1000)
+    assert session.connected
+
+
+def test_session_reconnects_inactive(gateway, connect, connections):
+    session = GatewaySession(gateway, connect=connect)
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    connections[0].close()
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    assert len(connections) == 2
+
+
+def test_server_forwards(gateway, connect, connections):
+    ltun = LocalTunnel(gateway='gw', alias='tun', lport=free_port(),
+                       destination='localhost', rport=80)
+    server = TunnelServer(connect=connect)
+    server.add(ltun, gateway)
+    assert not connections
+
+    thread = threading.Thread(target=server.serve_forever,
+                              kwargs={'poll_interval': 0.1})
+    thread.start()
+    try:
+        with socket.create_connection(('127.0.0.1', ltun.lport)) as sock:
+            sock.sendall(b'damn')
+            assert sock.recv(1024) == b'damn'
+        assert len(connections) == 1
+    finally:
+        server.shutdown()
+        thread.join()
+        server.close()
+
+
+def test_session_passes_jump(gateway):
+    bastion = Host(alias='bastion', addr='localhost', username='damn',
+                   port=22)
+    calls = []
+
+    def connect(host, **kwargs):
+        calls.append(kwargs)
+        return EchoClient()
+
+    session = GatewaySession(gateway, connect=connect, jump=(bastion,))
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    assert calls == [{'jump': (bastion,)}]
+
+
+def test_backoff_delay():
+    assert backoff_delay(0, base=0.5, cap=10, rand=lambda: 1.0) == 0.5
+    assert backoff_delay(3, base=0.5, cap=10, rand=lambda: 1.0) == 4.0
+    assert backoff_delay(10, base=0.5, cap=10, rand=lambda: 1.0) == 10
+    assert backoff_delay(3, base=0.5, cap=10, rand=lambda: 0.5) == 2.0
+
+
+def test_session_reconnects_with_backoff(gateway, connections):
+    failures = [OSError('refused'), paramiko.SSHException('reset')]
+
+    def connect(host, **kwargs):
+        if failures:
+            raise failures.pop(0)
+        client = EchoClient()
+        connections.append(client)
+        return client
+
+    sleeps = []
+    session = GatewaySession(gateway, connect=connect, sleep=sleeps.append)
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    assert len(sleeps) == 2
+    assert len(connections) == 1
+
+
+def test_session_gives_up(gateway):
+    def connect(host, **kwargs):
+        raise OSError('refused')
+
+    session = GatewaySession(gateway, connect=connect, reconnect_timeout=0,
+                             sleep=lambda delay: None)
+    with pytest.raises(OSError):
+        session.open_channel('localhost', 80, ('127.0.0.1', 1234))
+    assert session._clients == 0
+
+
+def test_session_auth_not_retried(gateway):
+    calls = []
+
+    def connect(host, **kwargs):
+        calls.append(host)
+        raise paramiko.AuthenticationException('denied')
+
+    session = GatewaySession(gateway, connect=connect,
+                             sleep=lambda delay: None)
+    with pytest.raises(paramiko.AuthenticationException):
+        session.open_channel('localhost', 80, ('127.0.0.1', 1234))
+    assert len(calls) == 1
+
+
+def test_probe_alive(gateway, connect, connections):
+    session = GatewaySession(gateway, connect=connect, probe_timeout=1)
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    assert session.probe()
+    assert session.connected
+
+
+def test_probe_dead(gateway, connect, connections):
+    session = GatewaySession(gateway, connect=connect, probe_timeout=0.05)
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    connections[0].transport.answer_after = 1
+    assert not session.probe()
+    assert not session.connected
+    assert not connections[0].transport.is_active()
+
+    # the next client reconnects
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    assert len(connections) == 2
+
+
+def test_check_probes_in_background(gateway, connect, connections):
+    session = GatewaySession(gateway, connect=connect, keepalive=10,
+                             probe_timeout=0.05)
+    session.open_channel('localhost', 80, ('127.0.0.1', 1234)).close()
+    connections[0].transport.answer_after = 1
+    session.check(now=session._last_probe + 5)
+    assert not session._probing
+    session.check(now=session._last_probe + 10)
+    deadline = time.monotonic() + 2
+    while session.connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not session.connected
+
+
+def test_server_keeps_listening_on_reconnect(gateway, connect, connections):
+    ltun = LocalTunnel(gateway='gw', alias='tun', lport=free_port(),
+                       destination='localhost', rport=80)
+    server = TunnelServer(connect=connect)
+    server.add(ltun, gateway)
+    thread = threading.Thread(target=server.serve_forever,
+                              kwargs={'poll_interval': 0.1})
+    thread.start()
+    try:
+        for _ in range(2):
+            with socket.create_connection(('127.0.0.1', ltun.lport)) as sock:
+                sock.sendall(b'damn')
+                assert sock.recv(1024) == b'damn'
+            connections[-1].close()
+        assert len(connections) == 2
+    finally:
+        server.shutdown()
+        thread.join()
+        server.close()
+
+
+def test_shell_tunnel_reuses_connection(gateway):
+    client = EchoClient()
+    ltun = LocalTunnel(gateway='gw', alias='tun', lport=free_port(),
+                       destination='localhost', rport=80)
+    server, thread = ParamikoChannel().open_tunnel(client, gateway, ltun)
+    try:
+        with socket.create_connection(('127.0.0.1', ltun.lport)) as sock:
+            sock.sendall(b'damn')
+            assert sock.recv(1024) == b'damn'
+        assert client.transport.channels == 1
+    finally:
+        server.shutdown()
+        thread.join()
+        server.close()
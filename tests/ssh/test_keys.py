@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from damnsshmanager.model import Host
+from damnsshmanager.ssh import keys
+from damnsshmanager.ssh.keys import KeyAuthClient, KeyCache
+
+
+@pytest.fixture(scope='module')
+def key() -> paramiko.PKey:
+    return paramiko.RSAKey.generate(1024)
+
+
+def write_key(path, key, password=None):
+    if password is None:
+        encryption = serialization.NoEncryption()
+    else:
+        encryption = serialization.BestAvailableEncryption(password.encode())
+    path.write_bytes(key.key.private_bytes(serialization.Encoding.PEM,
+                                           serialization.PrivateFormat.OpenSSH,
+                                           encryption))
+    return str(path)
+
+
+@pytest.fixture
+def key_file(tmp_path, key):
+    return write_key(tmp_path.joinpath('id_rsa'), key, password='damn')
+
+
+@pytest.fixture
+def asked():
+    return []
+
+
+@pytest.fixture
+def cache(asked) -> KeyCache:
+    def passphrase(path):
+        asked.append(path)
+        return 'damn'
+    return KeyCache(passphrase=passphrase, use_agent=False,
+                    default_identities=())
+
+
+def test_load_once(cache, key, key_file, asked):
+    assert cache.load(key_file) == key
+    assert cache.load(key_file) == key
+    assert asked == [key_file]
+
+
+def test_load_wrong_passphrase(key_file, asked):
+    cache = KeyCache(passphrase=lambda path: asked.append(path) or 'wrong',
+                     use_agent=False, default_identities=())
+    assert cache.load(key_file) is None
+    assert cache.load(key_file) is None
+    assert asked == [key_file]
+
+
+def test_load_missing(cache, tmp_path):
+    assert cache.load(str(tmp_path.joinpath('missing'))) is None
+
+
+def test_identities(cache, key, key_file, tmp_path):
+    other = paramiko.RSAKey.generate(1024)
+    default = tmp_path.joinpath('id_default')
+    write_key(default, other)
+    cache.default_identities = (str(default),
+                                str(tmp_path.joinpath('missing')))
+
+    host = Host(alias='a', addr='localhost', username='damn', port=22,
+                identity=key_file)
+    assert list(cache.identities(host)) == [key, other]
+    assert list(cache.identities(host._replace(identity=None))) == [other]
+
+
+def test_identities_lazy(cache, key_file, asked):
+    cache.default_identities = (key_file,)
+    host = Host(alias='a', addr='localhost', username='damn', port=22)
+    identities = cache.identities(host)
+    assert not asked
+    next(identities)
+    assert asked == [key_file]
+
+
+class FakeAgent:
+
+    opened = []
+
+    def __init__(self):
+        self.closed = False
+        self.opened.append(self)
+
+    def get_keys(self):
+        return ('agent key',)
+
+    def close(self):
+        self.closed = True
+
+
+def test_agent_shared_by_threads(monkeypatch):
+    monkeypatch.setattr(FakeAgent, 'opened', [])
+    monkeypatch.setattr(keys, 'SharedAgent', FakeAgent)
+    cache = KeyCache(use_agent=True, default_identities=())
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: cache.agent_keys(), range(8)))
+    assert results == [('agent key',)] * 8
+    agent, = FakeAgent.opened
+    cache.clear()
+    assert agent.closed
+    cache.agent_keys()
+    assert len(FakeAgent.opened) == 2
+
+
+class FakeConnection:
+    """Answers every request with an empty message, and fails if requests
+    of threads overlap."""
+
+    def __init__(self):
+        self.busy = threading.Lock()
+        self.pending = b''
+
+    def send(self, data):
+        assert self.busy.acquire(blocking=False), 'overlapping requests'
+        # let other threads send meanwhile
+        time.sleep(0.001)
+        self.pending = b'\x00\x00\x00\x01\x05'
+
+    def recv(self, n):
+        data, self.pending = self.pending[:n], self.pending[n:]
+        if not self.pending:
+            self.busy.release()
+        return data
+
+
+def test_shared_agent_serializes_requests(monkeypatch):
+    monkeypatch.delenv('SSH_AUTH_SOCK', raising=False)
+    agent = keys.SharedAgent()
+    agent._conn = FakeConnection()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        answers = list(pool.map(lambda _: agent._send_message(b'\x0b'),
+                                range(64)))
+    assert [code for code, msg in answers] == [5] * 64
+
+
+class FakeTransport:
+
+    def __init__(self, accepted):
+        self.accepted = accepted
+        self.offered = []
+
+    def auth_publickey(self, username, key):
+        self.offered.append(key)
+        if key is not self.accepted:
+            raise paramiko.AuthenticationException('denied')
+        return []
+
+
+def test_auth_client_offers_keys(key):
+    other = paramiko.RSAKey.generate(1024)
+    transport = FakeTransport(accepted=key)
+    client = KeyAuthClient(iter([other, key, other]))
+    client._transport = transport
+    client._auth('damn')
+    assert transport.offered == [other, key]
+
+
+def test_auth_client_denied(key):
+    client = KeyAuthClient([key])
+    client._transport = FakeTransport(accepted=None)
+    with pytest.raises(paramiko.AuthenticationException):
+        client._auth('damn')
+    client.keys = []
+    with pytest.raises(paramiko.SSHException):
+        client._auth('damn')
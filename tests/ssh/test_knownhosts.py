@@ -0,0 +1,80 @@
+import base64
+import hashlib
+import hmac
+import os
+
+import paramiko
+import pytest
+
+from damnsshmanager.ssh.knownhosts import (CachedAutoAddPolicy,
+                                           KnownHostsCache, host_key_name)
+
+
+@pytest.fixture(scope='module')
+def key() -> paramiko.PKey:
+    return paramiko.RSAKey.generate(1024)
+
+
+def hashed_name(hostname: str) -> str:
+    salt = os.urandom(20)
+    digest = hmac.new(salt, hostname.encode(), hashlib.sha1).digest()
+    return '|1|{}|{}'.format(base64.b64encode(salt).decode(),
+                             base64.b64encode(digest).decode())
+
+
+@pytest.fixture
+def known_hosts(tmp_path, key):
+    path = tmp_path.joinpath('known_hosts')
+    line = f'{key.get_name()} {key.get_base64()}\n'
+    path.write_text(f'# comment\nplain,[other]:2222 {line}'
+                    f'{hashed_name("hashed")} {line}')
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path, known_hosts) -> KnownHostsCache:
+    return KnownHostsCache([str(known_hosts)],
+                           tmp_path.joinpath('known_hosts.cache'))
+
+
+def test_host_key_name():
+    assert host_key_name('example.com', 22) == 'example.com'
+    assert host_key_name('example.com', 2222) == '[example.com]:2222'
+
+
+def test_lookup(cache, key):
+    assert cache.lookup('plain')[key.get_name()] == key
+    assert cache.lookup('[other]:2222')[key.get_name()] == key
+    assert cache.lookup('hashed')[key.get_name()] == key
+    assert cache.lookup('unknown') == {}
+
+
+def test_lookup_persisted(tmp_path, cache, known_hosts, key):
+    cache.lookup('hashed')
+    other = KnownHostsCache([str(known_hosts)], cache.cache_file)
+    other._build = None  # the stored index must be used
+    assert other.lookup('hashed')[key.get_name()] == key
+
+
+def test_lookup_invalidated(cache, known_hosts, key):
+    assert cache.lookup('new') == {}
+    with open(known_hosts, 'a') as f:
+        f.write(f'new {key.get_name()} {key.get_base64()}\n')
+    assert cache.lookup('new')[key.get_name()] == key
+
+
+def test_missing_file(tmp_path):
+    cache = KnownHostsCache([str(tmp_path.joinpath('missing'))],
+                            tmp_path.joinpath('cache'))
+    assert cache.lookup('plain') == {}
+
+
+def test_policy_appends(tmp_path, cache, known_hosts, key):
+    client = paramiko.SSHClient()
+    CachedAutoAddPolicy(cache).missing_host_key(client, '[added]:2222', key)
+    assert client.get_host_keys().lookup('[added]:2222')
+    assert known_hosts.read_text().endswith(
+        f'[added]:2222 {key.get_name()} {key.get_base64()}\n')
+    other = KnownHostsCache([str(known_hosts)], cache.cache_file)
+    other._build = None
+    assert other.lookup('[added]:2222')[key.get_name()] == key
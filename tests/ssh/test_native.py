@@ -0,0 +1,58 @@
+import os
+import subprocess
+
+import pytest
+
+from damnsshmanager.model import Host, LocalTunnel, TransportProfile
+from damnsshmanager.ssh.native import NativeChannel, ssh_command, ssh_options
+
+
+def test_ssh_options():
+    profile = TransportProfile(ciphers=('aes128-ctr', 'aes256-ctr'),
+                               macs=('hmac-sha2-256',), compression=False,
+                               window_size=16777216, keepalive=30)
+    assert ssh_options(profile) == ['-o', 'Ciphers=aes128-ctr,aes256-ctr',
+                                    '-o', 'MACs=hmac-sha2-256',
+                                    '-o', 'Compression=no',
+                                    '-o', 'ServerAliveInterval=30']
+
+
+def test_ssh_options_empty():
+    assert ssh_options(TransportProfile()) == []
+
+
+def test_ssh_command():
+    jump = Host(alias='b', addr='bastion', username='hop', port=2222)
+    host = Host(alias='db', addr='db host; rm -rf /', username='damn',
+                port=22, identity='/keys/id work',
+                transport=TransportProfile(keepalive=15))
+    ltun = LocalTunnel(gateway='db', alias='t', lport=50000,
+                       destination='localhost', rport=5432)
+    assert ssh_command(host, ltun, [jump]) == [
+        'ssh', '-p', '22', '-i', '/keys/id work',
+        '-o', 'ServerAliveInterval=15', '-J', 'hop@bastion:2222',
+        '-L', '50000:localhost:5432', '--', 'damn@db host; rm -rf /']
+
+
+def test_open_runs_argv(monkeypatch):
+    calls = []
+    monkeypatch.setattr(subprocess, 'run',
+                        lambda *args, **kwargs: calls.append((args, kwargs)))
+    host = Host(alias='db', addr='db', username='damn', port=22)
+    NativeChannel().open(host)
+    assert calls == [((ssh_command(host),), {'check': True})]
+
+
+def test_open_replace(monkeypatch):
+    calls = []
+
+    def execvp(*args):
+        # a successful exec never returns
+        calls.append(args)
+        raise SystemExit
+
+    monkeypatch.setattr(os, 'execvp', execvp)
+    host = Host(alias='db', addr='db', username='damn', port=22)
+    with pytest.raises(SystemExit):
+        NativeChannel(replace=True).open(host)
+    assert calls == [('ssh', ssh_command(host))]
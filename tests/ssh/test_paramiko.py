@@ -1,5 +1,10 @@
+import fcntl
 import os
+import signal
+import socket
+import struct
 import tempfile
+import termios
 import time
 from threading import Thread
 
@@ -7,7 +12,10 @@ import pytest
 from paramiko import RSAKey
 
 from damnsshmanager.hosts import Host
-from damnsshmanager.ssh.paramiko import ParamikoChannel
+from damnsshmanager.model import TransportProfile
+from damnsshmanager.ssh.paramiko import (DefaultChannel, JumpCache,
+                                         ParamikoChannel, PosixChannel,
+                                         disabled_algorithms, tune_transport)
 
 
 @pytest.fixture
@@ -31,3 +39,222 @@ def test_connect(private_key_file: str):
         t.start()
         time.sleep(5)
         connector.channel.send('logout\x0a')
+
+
+class FakeTransport:
+
+    def __init__(self, host):
+        self.host = host
+        self.active = True
+        self.opened = []
+
+    def is_active(self):
+        return self.active
+
+    def open_channel(self, kind, dest_addr, src_addr):
+        self.opened.append(dest_addr)
+        return (self.host.alias, dest_addr)
+
+
+class FakeClient:
+
+    def __init__(self, host, sock):
+        self.host = host
+        self.sock = sock
+        self.transport = FakeTransport(host)
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+
+def make_hosts(*aliases):
+    return [Host(alias=a, addr=f'{a}.example.com', username='damn', port=22)
+            for a in aliases]
+
+
+def test_nested_channels():
+    clients = []
+
+    def connect(host, sock=None):
+        clients.append(FakeClient(host, sock))
+        return clients[-1]
+
+    outer, inner, target = make_hosts('outer', 'inner', 'target')
+    cache = JumpCache()
+    chan = cache.open_channel([outer, inner], target, connect)
+
+    assert [c.host.alias for c in clients] == ['outer', 'inner']
+    assert clients[0].sock is None
+    assert clients[1].sock == ('outer', ('inner.example.com', 22))
+    assert chan == ('inner', ('target.example.com', 22))
+
+
+def test_shared_bastion():
+    clients = []
+
+    def connect(host, sock=None):
+        clients.append(FakeClient(host, sock))
+        return clients[-1]
+
+    bastion, a, b = make_hosts('bastion', 'a', 'b')
+    cache = JumpCache()
+    cache.open_channel([bastion], a, connect)
+    cache.open_channel([bastion], b, connect)
+    assert len(clients) == 1
+
+    clients[0].close()
+    cache.open_channel([bastion], a, connect)
+    assert len(clients) == 2
+
+    cache.close()
+    assert not clients[1].transport.is_active()
+
+
+def test_posix_channel_bytes():
+    master, slave = os.openpty()
+    out_r, out_w = os.pipe()
+    local, remote = socket.socketpair()
+    received = []
+
+    def remote_side():
+        remote.sendall(b'\xc3')
+        remote.sendall(b'\xa4 split')
+        received.append(remote.recv(1024))
+        remote.shutdown(socket.SHUT_WR)
+
+    def terminal():
+        # the channel writes output once the terminal is in raw mode
+        output = os.read(out_r, 1024)
+        os.write(master, b'paste \xc3\xa4 at once')
+        received.append(output)
+
+    threads = [Thread(target=remote_side), Thread(target=terminal)]
+    with os.fdopen(slave, 'r') as input_src, \
+            os.fdopen(out_w, 'wb') as output_dst, local, remote:
+        for t in threads:
+            t.start()
+        PosixChannel(local, input_src, output_dst).open()
+        for t in threads:
+            t.join()
+
+    os.close(master)
+    os.close(out_r)
+    assert b'paste \xc3\xa4 at once' in received
+    assert any(r.startswith(b'\xc3') for r in received)
+
+
+class FakeChannel:
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sizes = []
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def recv(self, nbytes):
+        return self.sock.recv(nbytes)
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def resize_pty(self, width, height):
+        self.sizes.append((width, height))
+
+    def shutdown_write(self):
+        self.sock.shutdown(socket.SHUT_WR)
+
+
+def test_posix_channel_resize():
+    master, slave = os.openpty()
+    fcntl.ioctl(master, termios.TIOCSWINSZ, struct.pack('HHHH', 50, 132, 0, 0))
+    out_r, out_w = os.pipe()
+    local, remote = socket.socketpair()
+    chan = FakeChannel(local)
+
+    def remote_side():
+        remote.sendall(b'prompt')
+        # wait for the terminal to be resized
+        remote.recv(1024)
+        remote.shutdown(socket.SHUT_WR)
+
+    def terminal():
+        os.read(out_r, 1024)
+        os.kill(os.getpid(), signal.SIGWINCH)
+        time.sleep(0.1)
+        os.write(master, b'done')
+
+    threads = [Thread(target=remote_side), Thread(target=terminal)]
+    with os.fdopen(slave, 'r') as input_src, \
+            os.fdopen(out_w, 'wb') as output_dst, local, remote:
+        for t in threads:
+            t.start()
+        PosixChannel(chan, input_src, output_dst).open()
+        for t in threads:
+            t.join()
+
+    os.close(master)
+    os.close(out_r)
+    assert chan.sizes == [(132, 50)]
+    assert signal.getsignal(signal.SIGWINCH) == signal.SIG_DFL
+
+
+def test_default_channel_input_eof():
+    in_r, in_w = os.pipe()
+    local, remote = socket.socketpair()
+    received = []
+
+    def remote_side():
+        with remote:
+            while True:
+                data = remote.recv(1024)
+                if not data:
+                    break
+                received.append(data)
+            remote.sendall(b'\xc3\xa4 logout')
+
+    os.write(in_w, b'exit\n')
+    os.close(in_w)
+    thread = Thread(target=remote_side)
+    thread.start()
+    with os.fdopen(in_r, 'r') as input_src, \
+            tempfile.TemporaryFile('w+') as output_dst, local:
+        DefaultChannel(FakeChannel(local), input_src, output_dst).open()
+        thread.join()
+        output_dst.seek(0)
+        output = output_dst.buffer.read()
+
+    assert b''.join(received) == b'exit\n'
+    assert b'\xc3\xa4 logout' in output
+
+
+def test_disabled_algorithms():
+    profile = TransportProfile(ciphers=('aes256-ctr', 'unknown'))
+    disabled = disabled_algorithms(profile)
+    assert list(disabled) == ['ciphers']
+    assert 'aes256-ctr' not in disabled['ciphers']
+    assert 'aes128-ctr' in disabled['ciphers']
+    assert disabled_algorithms(TransportProfile()) == {}
+
+
+def test_tune_transport():
+    class Transport:
+        default_window_size = 2097152
+        default_max_packet_size = 32768
+        keepalive = 0
+
+        def set_keepalive(self, interval):
+            self.keepalive = interval
+
+    transport = Transport()
+    tune_transport(transport, TransportProfile(window_size=16777216,
+                                               keepalive=30))
+    assert transport.default_window_size == 16777216
+    assert transport.default_max_packet_size == 32768
+    assert transport.keepalive == 30
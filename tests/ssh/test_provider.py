@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+import pytest
+
+from damnsshmanager.ssh.native import NativeChannel
+from damnsshmanager.ssh.provider import create_channel, provider
+
+
+def test_create_channel():
+    assert provider() == ['system', 'application']
+    assert isinstance(create_channel('system'), NativeChannel)
+
+
+def test_create_unknown_channel():
+    with pytest.raises(ValueError):
+        create_channel('unknown')
+
+
+def test_cli_does_not_import_paramiko():
+    code = ('import sys, damnsshmanager.cli; '
+            'print(*[m for m in sys.modules if m.startswith("paramiko")])')
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True)
+    assert result.stdout.strip() == ''
@@ -0,0 +1,182 @@
+import os
+import pathlib
+import stat
+
+import paramiko
+import pytest
+
+from damnsshmanager.ssh import transfer
+
+
+class FakeFile:
+
+    def __init__(self, files, path):
+        self.files = files
+        self.path = path
+        self.pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def set_pipelined(self, pipelined):
+        pass
+
+    def seek(self, pos):
+        self.pos = pos
+
+    def write(self, data):
+        content = self.files[self.path]
+        end = self.pos + len(data)
+        if len(content) < end:
+            content.extend(b'\0' * (end - len(content)))
+        content[self.pos:end] = data
+        self.pos = end
+
+    def close(self):
+        pass
+
+
+class FakeSFTP:
+
+    def __init__(self, files, dirs=()):
+        self.files = files
+        self.dirs = dirs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def stat(self, path):
+        if path in self.dirs:
+            return paramiko.SFTPAttributes.from_stat(os.stat('/'))
+        if path not in self.files:
+            raise IOError(path)
+        attrs = paramiko.SFTPAttributes()
+        attrs.st_mode = stat.S_IFREG
+        attrs.st_size = len(self.files[path])
+        return attrs
+
+    def open(self, path, mode):
+        if mode == 'w':
+            self.files[path] = bytearray()
+        elif path not in self.files:
+            raise IOError(path)
+        return FakeFile(self.files, path)
+
+
+class FakeClient:
+
+    def get_transport(self):
+        return None
+
+
+@pytest.fixture
+def remote_files(monkeypatch):
+    files = {}
+    monkeypatch.setattr(paramiko.SFTPClient, 'from_transport',
+                        lambda transport: FakeSFTP(files))
+    return files
+
+
+@pytest.fixture
+def journals(monkeypatch, tmp_path):
+    def journal_path(alias, remote_path):
+        return tmp_path / f'{alias}-{remote_path.replace("/", "_")}.json'
+    monkeypatch.setattr(transfer, 'journal_path', journal_path)
+    return journal_path
+
+
+@pytest.fixture
+def local_file(tmp_path) -> pathlib.Path:
+    path = tmp_path / 'artifact.bin'
+    path.write_bytes(os.urandom(10 * 1024 + 17))
+    return path
+
+
+def test_remote_targets(tmp_path):
+    sftp = FakeSFTP({}, dirs=('/opt',))
+    a, b = tmp_path / 'a', tmp_path / 'b'
+    assert transfer.remote_targets(sftp, [a], '/tmp/x') == [(a, '/tmp/x')]
+    assert transfer.remote_targets(sftp, [a], '/tmp/') == [(a, '/tmp/a')]
+    assert transfer.remote_targets(sftp, [a], '/opt') == [(a, '/opt/a')]
+    assert transfer.remote_targets(sftp, [a, b], '/tmp') == [
+        (a, '/tmp/a'), (b, '/tmp/b')]
+
+
+def test_push(remote_files, journals, local_file):
+    sent = transfer.push(FakeClient(), 'a', [local_file], '/tmp/x',
+                         streams=3, segment_size=1024)
+    assert sent == local_file.stat().st_size
+    assert bytes(remote_files['/tmp/x']) == local_file.read_bytes()
+    assert not journals('a', '/tmp/x').exists()
+
+
+def test_resume_from_journal(remote_files, journals, local_file):
+    content = local_file.read_bytes()
+    info = local_file.stat()
+    journal = transfer.Journal(journals('a', '/tmp/x'), info.st_size,
+                               info.st_mtime)
+    journal.add(0)
+    journal.add(2048)
+    remote_files['/tmp/x'] = bytearray(content[:1024]) + bytearray(1024) \
+        + bytearray(content[2048:3072])
+
+    sent = transfer.push(FakeClient(), 'a', [local_file], '/tmp/x',
+                         resume=True, segment_size=1024)
+    assert sent == info.st_size - 2048
+    assert bytes(remote_files['/tmp/x']) == content
+
+
+def test_resume_without_journal(remote_files, journals, local_file):
+    content = local_file.read_bytes()
+    # written by parallel streams, the start may still be a hole
+    remote_files['/tmp/x'] = bytearray(1024) + bytearray(content[1024:2500])
+
+    sent = transfer.push(FakeClient(), 'a', [local_file], '/tmp/x',
+                         resume=True, segment_size=1024)
+    assert sent == len(content)
+    assert bytes(remote_files['/tmp/x']) == content
+
+
+def test_resume_complete_without_journal(remote_files, journals, local_file):
+    remote_files['/tmp/x'] = bytearray(local_file.read_bytes())
+    sent = transfer.push(FakeClient(), 'a', [local_file], '/tmp/x',
+                         resume=True, segment_size=1024)
+    assert sent == local_file.stat().st_size
+
+
+def test_resume_changed_local_file(remote_files, journals, local_file,
+                                   monkeypatch):
+    add = transfer.Journal.add
+
+    def interrupt_after_two(journal, offset):
+        add(journal, offset)
+        if len(journal.done) == 2:
+            raise OSError('connection lost')
+
+    monkeypatch.setattr(transfer.Journal, 'add', interrupt_after_two)
+    with pytest.raises(OSError):
+        transfer.push(FakeClient(), 'a', [local_file], '/tmp/x',
+                      streams=1, resume=True, segment_size=1024)
+    monkeypatch.setattr(transfer.Journal, 'add', add)
+    assert journals('a', '/tmp/x').exists()
+
+    content = os.urandom(local_file.stat().st_size)
+    local_file.write_bytes(content)
+    info = local_file.stat()
+    os.utime(local_file, ns=(info.st_atime_ns, info.st_mtime_ns + 10 ** 9))
+
+    sent = transfer.push(FakeClient(), 'a', [local_file], '/tmp/x',
+                         streams=1, resume=True, segment_size=1024)
+    assert sent == len(content)
+    assert bytes(remote_files['/tmp/x']) == content
+
+
+def test_format_size():
+    assert transfer.format_size(512) == '512.0 B'
+    assert transfer.format_size(3 * 1024 * 1024) == '3.0 MiB'
@@ -0,0 +1,150 @@
+import argparse
+import os
+import threading
+
+import pytest
+
+import damnsshmanager.hosts as hosts
+import damnsshmanager.localtunnel as lt
+from damnsshmanager import catalog, cli
+from damnsshmanager.config import Config
+from damnsshmanager.storage import PickleStore
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, '_app_dir', str(tmp_path))
+    monkeypatch.setattr(hosts, '_store',
+                        hosts._create_store(tmp_path / 'hosts.pickle'))
+    monkeypatch.setattr(lt, '_store', PickleStore(tmp_path / 'tunnels.pickle'))
+    hosts.add(alias='bastion', addr='10.0.0.1', tags='prod')
+    hosts.add(alias='web-1', addr='10.0.0.2', jump='bastion',
+              tags='prod,http')
+    hosts.add(alias='web-2', addr='10.0.0.3', port=2222, tags='http')
+    lt.add(alias='db', gateway='bastion', remote_port=5432,
+           destination='localhost', local_port=15432)
+    return tmp_path
+
+
+@pytest.fixture
+def daemon(stores):
+    server = catalog.CatalogServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.close()
+    thread.join(5)
+
+
+def test_catalog(stores):
+    cat = catalog.Catalog()
+    assert cat.refresh()
+    assert not cat.refresh()
+    assert cat.host('web-2').port == 2222
+    assert cat.host('missing') is None
+    assert cat.tunnel('db').lport == 15432
+    assert [h.alias for h in cat.search('web-*')] == ['web-1', 'web-2']
+    assert [h.alias for h in cat.search(tags=['prod', 'http'])] == ['web-1']
+    assert cat.search(tags=['prod', 'none']) == []
+    assert [h.alias for h in cat.jump_chain('web-1')] == ['bastion']
+    with pytest.raises(KeyError):
+        cat.jump_chain('missing')
+
+
+def test_catalog_reloads_changed_store(stores):
+    cat = catalog.Catalog()
+    cat.refresh()
+    hosts.delete('web-2')
+    assert cat.answer(['host', 'web-2']) == (True, None)
+    assert cat.answer(['search', '*', []])[1] == hosts.get_all_hosts()
+
+
+def test_catalog_list(stores):
+    cat = catalog.Catalog()
+    cat.refresh()
+    lines = cat.list('host', ['http'], None, 'port', True)
+    assert [line.split()[0] for line in lines[2:]] == ['web-2', 'web-1']
+    assert cat.list('ltun')[2].split()[:3] == ['db', 'bastion', '15432']
+    with pytest.raises(KeyError):
+        cat.list('host', sort='gateway')
+
+
+@pytest.mark.parametrize('request_', [None, [], ['unknown'], {'op': 'host'},
+                                      ['host', 'a', 'b']])
+def test_answer_invalid(stores, request_):
+    ok, _ = catalog.Catalog().answer(request_)
+    assert not ok
+
+
+def test_query(daemon):
+    assert catalog.query('ping') == os.getpid()
+    assert catalog.query('host', 'web-1') == hosts.get_host('web-1')
+    assert catalog.query('search', 'web-*', ['prod']) == \
+        [hosts.get_host('web-1')]
+    with pytest.raises(KeyError):
+        catalog.query('jump', 'missing')
+    hosts.add(alias='web-3', addr='10.0.0.4')
+    assert catalog.query('host', 'web-3').addr == '10.0.0.4'
+
+
+def test_query_without_daemon(stores):
+    with pytest.raises(OSError):
+        catalog.query('ping')
+
+
+def test_socket_is_private(daemon):
+    assert os.stat(daemon.path).st_mode & 0o777 == 0o600
+
+
+def test_second_daemon(daemon):
+    with pytest.raises(OSError):
+        catalog.CatalogServer()
+    assert catalog.query('ping') == os.getpid()
+
+
+def test_stale_socket(stores):
+    catalog.CatalogServer().close()
+    server = catalog.CatalogServer()
+    # left behind by a daemon that died
+    server._server.server_close()
+    server = catalog.CatalogServer()
+    server.close()
+    assert not catalog.socket_path().exists()
+
+
+def test_stop(daemon):
+    assert catalog.query('stop') is None
+    daemon._closed.wait(5)
+    with pytest.raises(OSError):
+        catalog.query('ping', timeout=0.5)
+
+
+def list_args(**kwargs):
+    defaults = dict(type='host', tag=None, filter=None, sort=None,
+                    reverse=False, pager=False)
+    return argparse.Namespace(**{**defaults, **kwargs})
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'tag': ['http'], 'sort': 'port'},
+                                    {'filter': 'web-*', 'reverse': True},
+                                    {'type': 'ltun'}])
+def test_list_with_and_without_daemon(stores, capsys, monkeypatch, kwargs):
+    cli.list_objects(list_args(**kwargs))
+    direct = capsys.readouterr().out
+    server = catalog.CatalogServer()
+
+    def no_store(*args):
+        raise AssertionError('the store was read')
+
+    for module, name in ((hosts, 'get_all_hosts'),
+                         (hosts, 'get_hosts_by_tags'),
+                         (lt, 'get_all_tunnels')):
+        monkeypatch.setattr(module, name, no_store)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        cli.list_objects(list_args(**kwargs))
+    finally:
+        server.close()
+        thread.join(5)
+    assert capsys.readouterr().out == direct
@@ -0,0 +1,75 @@
+import shlex
+
+import pytest
+
+from damnsshmanager import cli, hosts
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host
+from damnsshmanager.ssh import execute
+
+WEB = Host(alias='web', addr='10.0.0.1', username='damn', port=22,
+           tags=('prod',))
+TEST = Host(alias='web-test', addr='10.0.0.2', username='damn', port=22)
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    runs = []
+
+    def run(matches, command, max_workers, **kwargs):
+        runs.append((matches, command, max_workers))
+        return []
+
+    monkeypatch.setattr(hosts, 'find_hosts', lambda pattern: [WEB, TEST])
+    monkeypatch.setattr(hosts, 'get_hosts_by_tags', lambda tags: [
+        h for h in (WEB, TEST) if set(tags) <= set(h.tags)])
+    monkeypatch.setattr(execute, 'run', run)
+    return runs
+
+
+def dsm(*argv):
+    args = cli.parse_args(cli.create_parser(), argv)
+    args.func(args)
+
+
+def test_exec_keeps_quoting(runs):
+    argv = ['sh', '-c', 'echo "a b"; ls *.log']
+    dsm('exec', 'web*', '--', *argv)
+    [(_, command, _)] = runs
+    assert shlex.split(command) == argv
+
+
+def test_exec_options_after_pattern(runs):
+    dsm('exec', 'web*', '-w', '4', '--', 'grep', '-w', '--', 'x')
+    [(_, command, workers)] = runs
+    assert workers == 4
+    assert shlex.split(command) == ['grep', '-w', '--', 'x']
+
+
+@pytest.mark.parametrize('argv', [
+    ('exec', 'web*', '-T', 'prod', '--', 'uptime'),
+    ('exec', '-T', 'prod', 'web*', '--', 'uptime'),
+    ('exec', 'web*', '--tag', 'prod', '-w', '2', '--', 'uptime')])
+def test_exec_tag_limits_hosts(runs, argv):
+    dsm(*argv)
+    [(matches, command, _)] = runs
+    assert matches == [WEB]
+    assert command == 'uptime'
+
+
+def test_dashes_of_other_commands():
+    with pytest.raises(SystemExit):
+        cli.parse_args(cli.create_parser(), ['list', '--', 'x'])
+
+
+@pytest.mark.parametrize('argv, key', [
+    (('c', 'web', '-p', 'system', '--exec', '--timings'),
+     'err.msg.exec.timings'),
+    (('c', 'web', '-p', 'application', '--exec'), 'err.msg.exec.provider')])
+def test_connect_exec_conflicts(monkeypatch, argv, key):
+    errors = []
+    monkeypatch.setattr(cli.logger, 'error', errors.append)
+    monkeypatch.setattr(cli, 'open_shell', lambda *args: pytest.fail(
+        'a connection was opened'))
+    dsm(*argv)
+    assert errors == [Config.messages.get(key, 'system')]
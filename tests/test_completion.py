@@ -0,0 +1,110 @@
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import damnsshmanager.hosts as hosts
+import damnsshmanager.localtunnel as tun
+from damnsshmanager import completion
+from damnsshmanager.cli import create_parser
+from damnsshmanager.config import Config
+from damnsshmanager.storage import PickleStore
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, '_app_dir', str(tmp_path))
+    hosts._store = hosts._create_store(tmp_path.joinpath('hosts.pickle'))
+    tun._store = PickleStore(tmp_path.joinpath('localtunnels.pickle'))
+    hosts.add(alias='db1', addr='localhost')
+    hosts.add(alias='db2', addr='localhost')
+    hosts.add(alias='web', addr='localhost')
+    tun.add(gateway='db1', alias='dbtun', remote_port=5432,
+            destination='localhost')
+    yield tmp_path
+
+
+def test_alias_files_written(stores):
+    assert completion.read_aliases(completion.HOSTS) == ['db1', 'db2', 'web']
+    assert completion.read_aliases(completion.TUNNELS) == ['dbtun']
+    hosts.delete('db2')
+    tun.delete('dbtun')
+    assert completion.read_aliases(completion.HOSTS) == ['db1', 'web']
+    assert completion.read_aliases(completion.TUNNELS) == []
+
+
+def test_alias_files_rebuilt(stores):
+    os.remove(completion.alias_file(completion.HOSTS))
+    os.remove(completion.alias_file(completion.TUNNELS))
+    assert completion.read_aliases(completion.TUNNELS) == ['dbtun']
+    assert os.path.exists(completion.alias_file(completion.HOSTS))
+
+
+@pytest.mark.parametrize('line,expected', [
+    ('dsm ', list(completion.COMMANDS)),
+    ('dsm t', ['tag', 'tune']),
+    ('dsm --p', ['--profile']),
+    ('dsm --profile c w', ['web']),
+    ('dsm c db', ['db1', 'db2', 'dbtun']),
+    ('dsm c -t host db', ['db1', 'db2', 'dbtun']),
+    ('dsm c -t ', ['host', 'ltun']),
+    ('dsm c --ti', ['--timings']),
+    ('dsm c db1 ', []),
+    ('dsm serve dbtun ', ['dbtun']),
+    ('dsm ltun x ', ['db1', 'db2', 'web']),
+    ('dsm add x y -J w', ['web']),
+    ('dsm tune web --compression ', ['yes', 'no']),
+    ('dsm exec db* -- ', []),
+    ('dsm completion z', ['zsh']),
+    ('dsm unknown ', []),
+])
+def test_complete(stores, line, expected):
+    words = line.split(' ')
+    assert completion.complete(words, len(words) - 1) == expected
+
+
+def test_commands_match_parser():
+    parser = create_parser()
+    sub_parsers = next(a for a in parser._actions
+                       if isinstance(a, argparse._SubParsersAction))
+    assert set(completion.COMMANDS) == set(sub_parsers.choices)
+    assert {o for a in parser._actions for o in a.option_strings} == {
+        '-h', '--help', *completion.FLAGS}
+    for name, sub_parser in sub_parsers.choices.items():
+        command = completion.COMMANDS[name]
+        options, flags = set(), set()
+        for action in sub_parser._actions:
+            if isinstance(action, argparse._HelpAction):
+                continue
+            target = flags if action.nargs == 0 else options
+            target.update(action.option_strings)
+            if action.choices and action.option_strings:
+                source = command.options[action.option_strings[0]]
+                assert list(source()) == list(action.choices)
+        assert options == set(command.options), name
+        assert flags == set(command.flags), name
+
+
+@pytest.mark.parametrize('shell', completion.SHELLS)
+def test_script(shell):
+    assert 'dsm --complete' in completion.script(shell)
+
+
+def test_main_skips_cli(stores):
+    code = ('import sys; sys.argv = ["dsm", "--complete", "2", "dsm", "c",'
+            ' "w"]\n'
+            'from damnsshmanager.__main__ import main\n'
+            'try:\n'
+            '    main()\n'
+            'except SystemExit:\n'
+            '    pass\n'
+            'print(*sorted(m for m in ("damnsshmanager.cli", "loguru")'
+            ' if m in sys.modules))\n')
+    env = dict(os.environ, DSM_APP_DIR=str(stores))
+    result = subprocess.run([sys.executable, '-c', code], env=env,
+                            capture_output=True, text=True, check=True,
+                            cwd=pathlib.Path(__file__).parents[1])
+    assert result.stdout.splitlines() == ['web', '']
@@ -1,5 +1,5 @@
 import os
-from damnsshmanager.config import Config
+from damnsshmanager.config import APP_DIR_ENV, Config
 
 
 def test_valid_config_dir_exists():
@@ -12,3 +12,22 @@ def test_valid_config_dir():
 
 def test_valid_config_dir_writeable():
     assert os.access(Config.app_dir, os.W_OK)
+
+
+def test_app_dir_from_env():
+    assert Config.app_dir == os.environ[APP_DIR_ENV]
+
+
+def test_lazy_app_dir(tmp_path, monkeypatch):
+    app_dir = tmp_path.joinpath('app')
+    monkeypatch.setenv(APP_DIR_ENV, str(app_dir))
+    config = type(Config)()
+    assert not app_dir.exists()
+    assert config.app_dir == str(app_dir)
+    assert app_dir.is_dir()
+
+
+def test_configure(tmp_path):
+    config = type(Config)()
+    config.configure(str(tmp_path.joinpath('app')))
+    assert config.app_dir == str(tmp_path.joinpath('app'))
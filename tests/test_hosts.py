@@ -1,16 +1,16 @@
 import os
+import pathlib
 import tempfile
 import pytest
 
 import damnsshmanager.hosts as hosts
-from damnsshmanager.storage import Store
 
 
 @pytest.fixture(scope="function")
 def store():
     with tempfile.TemporaryDirectory() as tmpdir:
         storage_file = os.path.join(tmpdir, 'damnsshmanager.test.store')
-        hosts._store = Store(storage_file)
+        hosts._store = hosts._create_store(pathlib.Path(storage_file))
         yield hosts._store
 
 
@@ -60,3 +60,112 @@ def test_delete_unknown(store):
     hosts.delete('b')
     all_hosts = hosts.get_all_hosts()
     assert len(all_hosts) == 1
+
+
+def test_add_jump(store):
+    hosts.add(alias='bastion', addr='127.0.0.1')
+    hosts.add(alias='a', addr='10.0.0.1', jump='bastion')
+    assert hosts.get_host('a').jump == ('bastion',)
+
+
+def test_add_identity(store):
+    hosts.add(alias='a', addr='10.0.0.1', identity='~/.ssh/id_a')
+    assert hosts.get_host('a').identity == os.path.expanduser('~/.ssh/id_a')
+    hosts.add(alias='b', addr='10.0.0.2')
+    assert hosts.get_host('b').identity is None
+
+
+def test_add_missing_jump(store):
+    with pytest.raises(KeyError):
+        hosts.add(alias='a', addr='10.0.0.1', jump='bastion')
+
+
+def test_add_self_jump(store):
+    with pytest.raises(KeyError):
+        hosts.add(alias='a', addr='10.0.0.1', jump='a')
+
+
+def test_jump_chain(store):
+    hosts.add(alias='outer', addr='127.0.0.1')
+    hosts.add(alias='inner', addr='10.0.0.1', jump='outer')
+    hosts.add(alias='db', addr='10.0.0.2')
+    hosts.add(alias='a', addr='10.0.1.1', jump='inner,db')
+    chain = hosts.get_jump_chain(hosts.get_host('a'))
+    assert [h.alias for h in chain] == ['outer', 'inner', 'db']
+
+
+def test_jump_chain_missing(store):
+    hosts.add(alias='bastion', addr='127.0.0.1')
+    hosts.add(alias='a', addr='10.0.0.1', jump='bastion')
+    hosts.delete('bastion')
+    with pytest.raises(KeyError):
+        hosts.get_jump_chain(hosts.get_host('a'))
+
+
+def test_find_hosts(store):
+    hosts.add(alias='web-1', addr='10.0.0.1')
+    hosts.add(alias='web-2', addr='10.0.0.2')
+    hosts.add(alias='db-1', addr='10.0.0.3')
+    assert [h.alias for h in hosts.find_hosts('web-*')] == ['web-1', 'web-2']
+    assert not hosts.find_hosts('mail*')
+
+
+def test_add_tags(store):
+    hosts.add(alias='a', addr='10.0.0.1', tags='prod,db')
+    assert hosts.get_host('a').tags == ('db', 'prod')
+    assert hosts.get_tags() == ['db', 'prod']
+
+
+def test_get_hosts_by_tags(store):
+    hosts.add(alias='a', addr='10.0.0.1', tags='prod,db')
+    hosts.add(alias='b', addr='10.0.0.2', tags='prod,web')
+    hosts.add(alias='c', addr='10.0.0.3', tags='test,db')
+    assert [h.alias for h in hosts.get_hosts_by_tags(['prod'])] == ['a', 'b']
+    assert [h.alias for h in hosts.get_hosts_by_tags(['db', 'prod'])] == ['a']
+    assert not hosts.get_hosts_by_tags(['mail'])
+
+
+def test_tag(store):
+    hosts.add(alias='a', addr='10.0.0.1', tags='prod')
+    hosts.tag('a', ['db'])
+    assert hosts.get_host('a').tags == ('db', 'prod')
+    hosts.tag('a', ['prod'], remove=True)
+    assert [h.alias for h in hosts.get_hosts_by_tags(['db'])] == ['a']
+    assert not hosts.get_hosts_by_tags(['prod'])
+
+
+def test_tags_removed_with_host(store):
+    hosts.add(alias='a', addr='10.0.0.1', tags='prod')
+    hosts.delete('a')
+    assert not hosts.get_hosts_by_tags(['prod'])
+
+
+def test_add_transport(store):
+    hosts.add(alias='a', addr='10.0.0.1', ciphers='aes128-ctr,aes256-ctr',
+              compression=False, window_size=16777216)
+    profile = hosts.get_host('a').transport
+    assert profile.ciphers == ('aes128-ctr', 'aes256-ctr')
+    assert profile.compression is False
+    assert profile.window_size == 16777216
+    assert profile.keepalive is None
+    hosts.add(alias='b', addr='10.0.0.2')
+    assert hosts.get_host('b').transport is None
+
+
+def test_add_invalid_transport(store):
+    with pytest.raises(KeyError):
+        hosts.add(alias='a', addr='10.0.0.1', window_size=0)
+    assert hosts.get_host('a') is None
+
+
+def test_tune(store):
+    hosts.add(alias='a', addr='10.0.0.1', keepalive=30)
+    hosts.tune('a', max_packet_size=32768)
+    profile = hosts.get_host('a').transport
+    assert (profile.keepalive, profile.max_packet_size) == (30, 32768)
+    hosts.tune('a', reset=True, macs='hmac-sha2-256')
+    profile = hosts.get_host('a').transport
+    assert profile.keepalive is None
+    assert profile.macs == ('hmac-sha2-256',)
+    hosts.tune('a', reset=True)
+    assert hosts.get_host('a').transport is None
@@ -0,0 +1,145 @@
+import json
+import sys
+import time
+
+import pytest
+
+import damnsshmanager.hosts as hosts
+import damnsshmanager.inventory as inventory
+from damnsshmanager.config import Config
+from damnsshmanager.model import Host, InventorySource
+from damnsshmanager.storage import PickleStore
+
+ENTRIES = [{'alias': 'web', 'addr': '10.0.0.1', 'username': 'deploy',
+            'tags': ['prod', 'http']},
+           {'alias': 'db', 'addr': '10.0.0.2', 'port': 2222,
+            'jump': 'web', 'transport': {'keepalive': 15}}]
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, '_app_dir', str(tmp_path))
+    monkeypatch.setattr(hosts, '_store',
+                        hosts._create_store(tmp_path / 'hosts.pickle'))
+    monkeypatch.setattr(inventory, '_store',
+                        PickleStore(tmp_path / 'inventories.pickle'))
+    return tmp_path
+
+
+@pytest.fixture
+def source(stores):
+    path = stores / 'inventory.json'
+    path.write_text(json.dumps({'hosts': ENTRIES}))
+    inventory.add(name='cmdb', location=str(path))
+    return inventory.get_source('cmdb')
+
+
+def test_parse_hosts():
+    web, db = inventory.parse_hosts(ENTRIES, 'cmdb')
+    assert web == Host(alias='web', addr='10.0.0.1', username='deploy',
+                       port=22, tags=('http', 'prod'), source='cmdb')
+    assert db.jump == ('web',)
+    assert db.port == 2222
+    assert db.username == hosts.default_username()
+    assert db.transport.keepalive == 15
+
+
+@pytest.mark.parametrize('data', [{'hosts': 'web'}, [{'alias': 'web'}],
+                                  [{'alias': 'web', 'addr': 'a',
+                                    'port': 'ssh'}]])
+def test_parse_invalid(data):
+    with pytest.raises(KeyError):
+        inventory.parse_hosts(data, 'cmdb')
+
+
+def test_add_syncs_nothing_twice(source):
+    [(_, result)] = inventory.sync_all()
+    assert [h.alias for h in result.added] == ['web', 'db']
+    assert hosts.get_host('web').source == 'cmdb'
+    # the file did not change
+    assert list(inventory.sync_all()) == [(source, None)]
+
+
+def test_sync_diff(source, stores):
+    list(inventory.sync_all())
+    hosts.add(alias='manual', addr='10.0.0.9')
+    mtime = (stores / 'hosts.pickle').stat().st_mtime_ns
+    changed = [dict(ENTRIES[0], port=2200), {'alias': 'new', 'addr': 'n'},
+               {'alias': 'manual', 'addr': 'x'}]
+    (stores / 'inventory.json').write_text(json.dumps(changed))
+    [(_, result)] = inventory.sync_all()
+    assert [h.alias for h in result.added] == ['new']
+    assert [h.port for h in result.updated] == [2200]
+    assert [h.alias for h in result.removed] == ['db']
+    assert result.conflicts == ['manual']
+    assert [h.alias for h in hosts.get_all_hosts()] == ['manual', 'new',
+                                                        'web']
+    assert hosts.get_host('manual').source is None
+    assert (stores / 'hosts.pickle').stat().st_mtime_ns != mtime
+
+
+def test_sync_unchanged_not_written(source, stores):
+    list(inventory.sync_all())
+    mtime = (stores / 'hosts.pickle').stat().st_mtime_ns
+    [(_, result)] = inventory.sync_all(force=True)
+    assert result == ([], [], [], [])
+    assert (stores / 'hosts.pickle').stat().st_mtime_ns == mtime
+
+
+def test_yaml_source(stores):
+    pytest.importorskip('yaml')
+    path = stores / 'inventory.yaml'
+    path.write_text('- alias: web\n  addr: 10.0.0.1\n')
+    inventory.add(name='yaml', location=str(path))
+    list(inventory.sync_all())
+    assert hosts.get_host('web').addr == '10.0.0.1'
+
+
+def test_command_source_ttl(stores):
+    command = f'{sys.executable} -c "print(\'[{{\\"alias\\": \\"cmd\\", ' \
+        '\\"addr\\": \\"10.0.0.3\\"}]\')"'
+    inventory.add(name='cmd', kind='command', location=command, ttl=60)
+    [(source, result)] = inventory.sync_all()
+    assert [h.alias for h in result.added] == ['cmd']
+    state = inventory._read_state()
+    assert not inventory.is_stale(source, state)
+    assert inventory.is_stale(source, state, now=time.time() + 61)
+
+
+def test_broken_source_retried_on_change(source, stores):
+    (stores / 'inventory.json').write_text('{')
+    assert list(inventory.sync_all()) == []
+    state = inventory._read_state()
+    assert not inventory.is_stale(source, state)
+    (stores / 'inventory.json').write_text('[]')
+    assert inventory.is_stale(source, state)
+
+
+def test_delete_source(source):
+    list(inventory.sync_all())
+    hosts.add(alias='manual', addr='10.0.0.9')
+    inventory.delete('cmdb')
+    assert inventory.get_all_sources() == []
+    assert [h.alias for h in hosts.get_all_hosts()] == ['manual']
+
+
+def test_invalid_kind(stores):
+    with pytest.raises(KeyError):
+        inventory.add(name='x', kind='ldap', location='x')
+
+
+def test_refresh_stale(source, monkeypatch):
+    started = []
+    monkeypatch.setattr(inventory.subprocess, 'Popen',
+                        lambda argv, **kwargs: started.append(argv))
+    assert inventory.refresh_stale()
+    list(inventory.sync_all())
+    assert not inventory.refresh_stale()
+    assert started[0][-1] == 'sync'
+
+
+def test_stale_file_source():
+    missing = InventorySource(name='x', kind='file', location='/nonexistent',
+                              ttl=300)
+    assert inventory.is_stale(missing, {})
+    assert not inventory.is_stale(missing, {'x': (None, 0.0)})
@@ -1,4 +1,5 @@
 import os
+import pathlib
 import socket
 import tempfile
 
@@ -18,8 +19,8 @@ def stores():
         tun_storage_file = os.path.join(
             tmpdir, 'damnsshmanager.tun.test.store')
 
-        hosts._store = storage.Store(hosts_storage_file)
-        tun._store = storage.Store(tun_storage_file)
+        hosts._store = storage.PickleStore(pathlib.Path(hosts_storage_file))
+        tun._store = storage.PickleStore(pathlib.Path(tun_storage_file))
 
         hosts.add(alias='a', addr='localhost')
         yield hosts._store, tun._store
@@ -1,3 +1,7 @@
+import pytest
+
+from damnsshmanager import messages
+from damnsshmanager.config import Config
 from damnsshmanager.messages import Messages
 
 
@@ -22,3 +26,42 @@ def test_missing_section():
 def test_missing_message():
     m = Messages()
     assert m.get('missing') is None
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path.joinpath('messages.ini')
+    path.write_text('[DEFAULT]\nplain = Some {{braces}}\n'
+                    'greeting = Hello {:s}\n')
+    return path
+
+
+def test_load_catalog_cached(source, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path.joinpath('cache'))
+    catalog = messages.load_catalog(source, cache_dir)
+    assert catalog['DEFAULT']['greeting'] == 'Hello {:s}'
+
+    def fail(content):
+        raise AssertionError('catalog was parsed again')
+    monkeypatch.setattr(messages, 'compile_catalog', fail)
+    assert messages.load_catalog(source, cache_dir) == catalog
+
+
+def test_load_catalog_changed(source, tmp_path):
+    cache_dir = str(tmp_path.joinpath('cache'))
+    messages.load_catalog(source, cache_dir)
+    source.write_text('[DEFAULT]\ngreeting = Hi {:s}, welcome\n')
+    catalog = messages.load_catalog(source, cache_dir)
+    assert catalog['DEFAULT']['greeting'] == 'Hi {:s}, welcome'
+
+
+def test_format(source, tmp_path):
+    m = Messages(messages.load_catalog(source, str(tmp_path)))
+    assert m.get('greeting', 'damn') == 'Hello damn'
+    assert m.get('plain') == 'Some {braces}'
+
+
+def test_load_catalog_in_app_dir(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, '_app_dir', str(tmp_path.joinpath('app')))
+    messages.load_catalog(source)
+    assert tmp_path.joinpath('app', 'cache', 'messages.marshal').exists()
@@ -0,0 +1,138 @@
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from damnsshmanager import metrics
+from damnsshmanager.model import Host
+from damnsshmanager.ssh import test as ssh_test
+
+UP = Host(alias='web', addr='10.0.0.1', username='damn', port=22)
+DOWN = Host(alias='db "main"', addr='10.0.0.2', username='damn', port=2222)
+
+
+def fake_test(host: Host) -> float:
+    if host is DOWN:
+        raise OSError('down')
+    return 0.25
+
+
+def test_connection_latency():
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen()
+        host = UP._replace(addr='127.0.0.1', port=server.getsockname()[1])
+        assert ssh_test.test_connection(host) >= 0
+    with pytest.raises(OSError):
+        ssh_test.test_connection(host)
+
+
+def test_check():
+    results = metrics.check([UP, DOWN], test_fn=fake_test)
+    assert [(r.host, r.up, r.latency) for r in results] == [
+        (UP, True, 0.25), (DOWN, False, None)]
+    assert metrics.check([]) == []
+
+
+def test_render():
+    results = [metrics.CheckResult(UP, True, 0.25, 1700000000.5),
+               metrics.CheckResult(DOWN, False, None, 1700000001.0)]
+    lines = metrics.render(results).splitlines()
+    assert 'dsm_host_up{alias="web",addr="10.0.0.1",port="22"} 1' in lines
+    assert 'dsm_host_up{alias="db \\"main\\"",addr="10.0.0.2",' \
+        'port="2222"} 0' in lines
+    assert [line for line in lines
+            if line.startswith('dsm_host_connect_seconds')] == [
+        'dsm_host_connect_seconds{alias="web",addr="10.0.0.1",port="22"}'
+        ' 0.25']
+    assert 'dsm_host_last_check_timestamp_seconds{alias="web",' \
+        'addr="10.0.0.1",port="22"} 1700000000.5' in lines
+    assert lines[0] == '# TYPE dsm_host_up gauge'
+    assert lines[-1] == '# EOF'
+
+
+def test_write(tmp_path):
+    path = tmp_path / 'dsm.prom'
+    path.write_text('old')
+    metrics.write([metrics.CheckResult(UP, True, 0.25, 1.0)], str(path))
+    assert path.read_text() == metrics.render(
+        [metrics.CheckResult(UP, True, 0.25, 1.0)])
+    assert [p.name for p in tmp_path.iterdir()] == ['dsm.prom']
+
+
+def test_server(tmp_path):
+    checked = threading.Event()
+    checks = []
+
+    def check_fn(all_hosts):
+        checks.append(list(all_hosts))
+        return metrics.check(checks[-1], test_fn=fake_test)
+
+    server = metrics.MetricsServer(lambda: [UP, DOWN], port=0, interval=60,
+                                   metrics_file=str(tmp_path / 'dsm.prom'),
+                                   check_fn=check_fn)
+    thread = threading.Thread(
+        target=server.serve_forever,
+        kwargs=dict(on_refresh=lambda results: checked.set()))
+    thread.start()
+    try:
+        assert checked.wait(5)
+        host, port = server.address[:2]
+        url = f'http://{host}:{port}'
+        for _ in range(3):
+            with urllib.request.urlopen(f'{url}/metrics') as response:
+                body = response.read().decode()
+                assert response.headers['Content-Type'] == \
+                    metrics.CONTENT_TYPE
+        # scrapes are answered from the results of the last check
+        assert len(checks) == 1
+        assert body == (tmp_path / 'dsm.prom').read_text()
+        assert 'dsm_host_up{alias="web",addr="10.0.0.1",port="22"} 1' \
+            in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f'{url}/other')
+    finally:
+        server.close()
+        thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_check_unresolvable_address():
+    host = UP._replace(addr='a..b')
+    [result] = metrics.check([host], test_fn=ssh_test.test_connection)
+    assert not result.up
+    assert result.latency is None
+
+
+def test_server_survives_failed_refresh(tmp_path):
+    checked = threading.Event()
+    refreshes = []
+
+    def on_refresh(results):
+        refreshes.append(results)
+        checked.set()
+
+    # the directory of the metrics file does not exist
+    server = metrics.MetricsServer(lambda: [UP], port=0, interval=0.05,
+                                   metrics_file=str(tmp_path / 'x' / 'p'),
+                                   check_fn=lambda all_hosts: metrics.check(
+                                       all_hosts, test_fn=fake_test))
+    thread = threading.Thread(target=server.serve_forever,
+                              kwargs=dict(on_refresh=on_refresh))
+    thread.start()
+    try:
+        time.sleep(0.2)
+        assert thread.is_alive()
+        assert not refreshes
+        (tmp_path / 'x').mkdir()
+        assert checked.wait(5)
+        host, port = server.address[:2]
+        with urllib.request.urlopen(f'http://{host}:{port}/metrics') as r:
+            assert b'dsm_host_up{alias="web"' in r.read()
+    finally:
+        server.close()
+        thread.join(5)
+    assert not thread.is_alive()
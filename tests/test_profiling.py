@@ -0,0 +1,42 @@
+import pstats
+
+import pytest
+
+from damnsshmanager import profiling
+
+
+def work():
+    return sum(i * i for i in range(10000))
+
+
+def test_requested(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    assert not profiling.requested()
+    assert profiling.requested(True)
+    monkeypatch.setenv(profiling.PROFILE_ENV, '0')
+    assert not profiling.requested()
+    monkeypatch.setenv(profiling.PROFILE_ENV, '1')
+    assert profiling.requested()
+
+
+def test_profile(tmp_path):
+    result = profiling.Profile('work', tmp_path / 'profiles')
+    with result:
+        work()
+    report = result.report(top=5)
+    assert len(report) == 6
+    assert any('work' in line for line in report[1:])
+    path = result.save()
+    assert path.parent == tmp_path / 'profiles'
+    assert path.name.startswith('work-')
+    stats = pstats.Stats(str(path))
+    assert any(func == 'work' for _, _, func in stats.stats)
+
+
+def test_profile_interrupted(tmp_path):
+    result = profiling.Profile('work', tmp_path)
+    with pytest.raises(KeyboardInterrupt):
+        with result:
+            work()
+            raise KeyboardInterrupt
+    assert any('work' in line for line in result.report())
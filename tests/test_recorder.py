@@ -0,0 +1,52 @@
+import gzip
+import json
+import pathlib
+import tempfile
+
+import pytest
+
+from damnsshmanager.recorder import SessionRecorder
+
+
+@pytest.fixture
+def cast_file():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield pathlib.Path(tmpdir, 'session.cast.gz')
+
+
+def read_cast(path: pathlib.Path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_header(cast_file):
+    with SessionRecorder(cast_file, width=132, height=50, term='xterm'):
+        pass
+    header, = read_cast(cast_file)
+    assert header['version'] == 2
+    assert header['width'] == 132
+    assert header['height'] == 50
+    assert header['env'] == {'TERM': 'xterm'}
+
+
+def test_output_events(cast_file):
+    with SessionRecorder(cast_file, flush_interval=0.01) as recorder:
+        recorder.output(b'$ ls\r\n')
+        recorder.output(b'\xc3')
+        recorder.output(b'\xa4\r\n')
+    _, *events = read_cast(cast_file)
+    assert [e[1] for e in events] == ['o', 'o']
+    assert ''.join(e[2] for e in events) == '$ ls\r\nä\r\n'
+    assert events[0][0] <= events[1][0]
+
+
+def test_dropped_chunks(cast_file):
+    recorder = SessionRecorder(cast_file, capacity=2)
+    for i in range(5):
+        recorder.output(str(i).encode())
+    assert recorder.dropped == 3
+
+    recorder.start()
+    recorder.close()
+    _, *events = read_cast(cast_file)
+    assert [e[2] for e in events] == ['3', '4']
@@ -1,14 +1,15 @@
 import os
+import pathlib
 import tempfile
 import pytest
-from damnsshmanager.storage import Store, UniqueException
+from damnsshmanager.storage import PickleStore, Store, UniqueException
 
 
 @pytest.fixture
 def store():
     with tempfile.TemporaryDirectory() as tmpdir:
         storage_file = os.path.join(tmpdir, 'damnsshmanager.test.store')
-        s = Store(storage_file)
+        s = PickleStore(pathlib.Path(storage_file))
         yield s
 
 
@@ -20,7 +21,7 @@ def test_unique_exception():
 def test_empty_storage():
 
     fd, name = tempfile.mkstemp()
-    s = Store(name)
+    s = PickleStore(pathlib.Path(name))
     objs = list(s.get(key=lambda: True))
     os.remove(name)
     assert not objs
@@ -74,3 +75,36 @@ def test_delete(store: Store):
     store.delete(key_func)
     stored_obj = list(store.get(key=key_func))
     assert not stored_obj
+
+
+@pytest.fixture
+def indexed_store():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage_file = os.path.join(tmpdir, 'damnsshmanager.test.store')
+        yield PickleStore(pathlib.Path(storage_file),
+                          index=lambda o: o['tags'],
+                          ident=lambda o: o['alias'])
+
+
+def test_lookup(indexed_store: PickleStore):
+    indexed_store.add({'alias': 'a', 'tags': ['x', 'y']})
+    indexed_store.add({'alias': 'b', 'tags': ['y']})
+    assert indexed_store.lookup('x') == ['a']
+    assert indexed_store.lookup('y') == ['a', 'b']
+    assert indexed_store.lookup('z') == []
+    assert indexed_store.terms() == ['x', 'y']
+
+
+def test_lookup_rebuilds_missing_index(indexed_store: PickleStore):
+    indexed_store.add({'alias': 'a', 'tags': ['x']})
+    os.remove(indexed_store.index_file)
+    assert indexed_store.lookup('x') == ['a']
+    assert os.path.exists(indexed_store.index_file)
+
+
+def test_update(store: PickleStore):
+    store.add({'a': 'localhost'})
+    store.add({'b': '127.0.0.1'})
+    updated = store.update(lambda o: 'a' in o, lambda o: {'a': '::1'})
+    assert updated == [{'a': '::1'}]
+    assert list(store.get(key=lambda o: 'a' in o)) == [{'a': '::1'}]
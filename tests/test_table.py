@@ -0,0 +1,78 @@
+import io
+import sys
+
+from damnsshmanager import table
+from damnsshmanager.model import Host
+
+COLUMNS = (table.Column('Alias', 'alias'), table.Column('Address', 'addr'),
+           table.Column('Port', 'port'))
+HOSTS = [Host(alias='a', addr='a-very-long-host-name.example.com',
+              username='damn', port=22),
+         Host(alias='long-alias', addr='10.0.0.1', username='damn',
+              port=2222)]
+
+
+class Terminal(io.StringIO):
+
+    def isatty(self):
+        return True
+
+
+def test_render():
+    assert table.render(COLUMNS, HOSTS) == [
+        'Alias       Address                            Port',
+        '-' * 51,
+        'a           a-very-long-host-name.example.com  22',
+        'long-alias  10.0.0.1                           2222',
+    ]
+
+
+def test_render_empty():
+    assert table.render(COLUMNS, []) == ['Alias  Address  Port',
+                                         '--------------------']
+
+
+def test_render_single_column():
+    assert table.render(COLUMNS[:1], HOSTS)[2:] == ['a', 'long-alias']
+
+
+def test_write_chunks(monkeypatch):
+    monkeypatch.setattr(table, 'CHUNK_SIZE', 2)
+    out = io.StringIO()
+    table.write(['1', '2', '3'], out)
+    assert out.getvalue() == '1\n2\n3\n'
+
+
+def test_page(tmp_path):
+    path = tmp_path / 'paged'
+    command = [sys.executable, '-c',
+               f'import sys; open({str(path)!r}, "w").write(sys.stdin.read())']
+    assert table.page(['1', '2'], command)
+    assert path.read_text() == '1\n2\n'
+    assert not table.page(['1'], [str(tmp_path / 'missing')])
+
+
+def test_show_without_pager(monkeypatch):
+    monkeypatch.setattr(table, 'page', lambda lines: False)
+    out = Terminal()
+    table.show(['line'] * 500, out)
+    assert out.getvalue() == 'line\n' * 500
+
+
+def test_show_pages_terminal(monkeypatch):
+    paged = []
+    monkeypatch.setattr(table, 'page', lambda lines: paged.append(lines)
+                        or True)
+    out = Terminal()
+    table.show(['line'] * 500, out)
+    table.show(['line'] * 500, out, pager=False)
+    table.show(['line'] * 500, io.StringIO())
+    assert len(paged) == 1
+    assert out.getvalue() == 'line\n' * 500
+
+
+def test_select():
+    assert table.select(HOSTS, 'long-*') == HOSTS[1:]
+    assert table.select(HOSTS, sort='port', reverse=True) == HOSTS[::-1]
+    assert table.select(HOSTS, reverse=True) == HOSTS[::-1]
+    assert table.select(HOSTS) == HOSTS
@@ -0,0 +1,76 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from damnsshmanager import timings
+from damnsshmanager.ssh.paramiko import open_socket
+
+
+@pytest.fixture
+def measurement():
+    result = timings.start('alias', 'application')
+    yield result
+    timings.stop()
+
+
+def test_phase_inactive():
+    timings.stop()
+    with timings.phase('store'):
+        pass
+    assert timings.stop() is None
+
+
+def test_nested_phases(measurement):
+    with timings.phase('handshake'):
+        with timings.phase('auth'):
+            pass
+    with timings.phase('shell'):
+        pass
+    assert [(p.name, p.depth) for p in measurement.phases] == [
+        ('handshake', 0), ('handshake/auth', 1), ('shell', 0)]
+    handshake, auth, shell = measurement.phases
+    assert handshake.seconds >= auth.seconds
+    assert measurement.total == handshake.seconds + shell.seconds
+    assert measurement.report()[-1].startswith('total')
+
+
+def test_consecutive_phases_added(measurement):
+    for _ in range(3):
+        with timings.phase('store'):
+            pass
+    assert [p.name for p in measurement.phases] == ['store']
+
+
+def test_other_thread_ignored(measurement):
+    def work():
+        with timings.phase('store'):
+            pass
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    assert not measurement.phases
+
+
+def test_open_socket_phases(measurement):
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen()
+        with open_socket('127.0.0.1', server.getsockname()[1]):
+            pass
+    assert [p.name for p in measurement.phases] == ['dns', 'tcp']
+
+
+def test_append(tmp_path, measurement):
+    with timings.phase('store'):
+        pass
+    path = tmp_path.joinpath('timings.jsonl')
+    timings.append(measurement, path)
+    timings.append(measurement, path)
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    record = json.loads(lines[0])
+    assert record['alias'] == 'alias'
+    assert record['provider'] == 'application'
+    assert [p['name'] for p in record['phases']] == ['store']